@@ -0,0 +1,47 @@
+'''Compression ratio and throughput of ArchiveWriter/ArchiveReader on simulator-generated frames.
+
+usage: python benchmarks/archive_benchmark.py [--frames 512] [--raw-size 16388]
+'''
+import argparse
+import os
+import tempfile
+import time
+from ksoc_connection.archive import ArchiveWriter, ArchiveReader
+from ksoc_connection.packet import parse_multi_results
+from ksoc_connection.simulator import KKTSimulator
+
+def simulated_frames(count:int, raw_size:int):
+    device = KKTSimulator()
+    device.collection = {'actions': 0b1, 'raw_size': raw_size, 'reg_address': []}
+    for _ in range(count):
+        packet = device.frame()
+        yield parse_multi_results(packet[7:-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=512)
+    parser.add_argument('--raw-size', type=int, default=(8192 + 2) * 2)
+    args = parser.parse_args()
+
+    frames = list(simulated_frames(args.frames, args.raw_size))
+    size = sum(len(data) for frame in frames for data in frame.values()) / 1e6
+    print(f'{args.frames} frames, {size:.1f} MB raw')
+    print(f'{"codec":<12}{"ratio":>8}{"write MB/s":>12}{"read MB/s":>12}')
+    for codec, level, delta in (('zlib', 1, ()), ('zlib', 1, (0,)), ('zlib', 6, (0,)), ('lzma', 0, (0,))):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'capture.ksa')
+            start = time.perf_counter()
+            with ArchiveWriter(path, codec=codec, level=level, delta_actions=delta) as writer:
+                for frame in frames:
+                    writer.write(frame)
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ArchiveReader(path) as reader:
+                assert sum(1 for _ in reader) == len(frames)
+            read_time = time.perf_counter() - start
+            name = f'{codec}-{level}{"+delta" if delta else ""}'
+            print(f'{name:<12}{writer.ratio:>8.2f}{size / write_time:>12.1f}{size / read_time:>12.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+'''Throughput and recovery time of CDCCollection under transport faults injected by FaultyPorto.
+
+usage: python benchmarks/framer_benchmark.py [--frames 2000] [--raw-size 2052] [--seed 0] [--checksum full]
+'''
+import argparse
+import time
+from typing import Any, Dict, List
+from ksoc_connection.engine import CDCCollection, CHECKSUM_POLICIES
+from ksoc_connection.faults import FaultyPorto
+from ksoc_connection.simulator import KKTSimulator
+
+MODES:Dict[str, Dict[str, Any]] = {
+    'clean': {},
+    'fragment-1': {'fragment': 1},
+    'fragment-7': {'fragment': 7},
+    'fragment-rand': {'fragment': (1, 1024)},
+    'garbage': {'fragment': (1, 1024), 'garbage': 0.05},
+    'drop': {'fragment': (1, 1024), 'drop': 0.05},
+    'duplicate': {'fragment': (1, 1024), 'duplicate': 0.05},
+    'corrupt': {'fragment': (1, 1024), 'corrupt': 0.05},
+}
+
+def faulted_reads(stream:bytes, seed:int, faults:Dict[str, Any])->FaultyPorto:
+    '''run stream through FaultyPorto once, reads are kept in porto.reads so that only the framer is timed'''
+    device = KKTSimulator(max_wait=0, chunk_size=1 << 20)
+    device.write_out(stream)
+    porto = FaultyPorto(device, seed=seed, **faults)
+    porto.reads: List[bytes] = []
+    data = porto.recv(8192)
+    while data:
+        porto.reads.append(data)
+        data = porto.recv(8192)
+    return porto
+
+def run(porto:FaultyPorto, checksum:str)->Dict[str, float]:
+    collection = CDCCollection()
+    collection.set_checksum_policy(checksum)
+    faults = [offset for offset, kind in porto.faults]
+    pending = 0 # index of first fault not recovered yet
+    fault_time = {} # fault index -> time its bytes were fed
+    recovery_time:List[float] = []
+    recovery_bytes:List[int] = []
+    packets = 0
+    fed = 0
+    start = time.perf_counter()
+    for data in porto.reads:
+        now = time.perf_counter()
+        fed += len(data)
+        for index in range(len(fault_time) + pending, len(faults)):
+            if faults[index] >= fed:
+                break
+            fault_time[index] = now
+        packet = collection.collect(data)
+        while packet is not None:
+            packets += 1
+            end = fed - len(collection.temp_bytes)
+            # a fault is recovered by the first good packet starting after it
+            while pending < len(faults) and pending in fault_time and faults[pending] <= end - len(packet):
+                recovery_time.append(time.perf_counter() - fault_time.pop(pending))
+                recovery_bytes.append(end - faults[pending])
+                pending += 1
+            packet = collection.collect(b'')
+    elapsed = time.perf_counter() - start
+    return {
+        'MB_per_second': fed / elapsed / 1e6,
+        'packets_per_second': packets / elapsed,
+        'packets': packets,
+        'faults': len(faults),
+        'recovery_us': sum(recovery_time) / len(recovery_time) * 1e6 if recovery_time else 0.0,
+        'recovery_bytes': sum(recovery_bytes) / len(recovery_bytes) if recovery_bytes else 0.0,
+        'resyncs': collection.metrics.resync_events,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--raw-size', type=int, default=(1024 + 2) * 2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--checksum', choices=CHECKSUM_POLICIES, default='full')
+    args = parser.parse_args()
+
+    device = KKTSimulator()
+    device.collection = {'actions': 0b1, 'raw_size': args.raw_size, 'reg_address': []}
+    stream = b''.join(device.frame() for _ in range(args.frames))
+    run(faulted_reads(stream[:len(stream) // 10], args.seed, {}), args.checksum) # warm up, numpy checksum is imported lazily
+    print(f'{args.frames} frames, {len(stream) / 1e6:.1f} MB, checksum {args.checksum}')
+    print(f'{"mode":<15}{"reads":>8}{"MB/s":>9}{"pkt/s":>10}{"packets":>9}{"faults":>8}{"resyncs":>9}{"recov us":>10}{"recov B":>9}')
+    for mode, faults in MODES.items():
+        porto = faulted_reads(stream, args.seed, faults)
+        result = run(porto, args.checksum)
+        print(f'{mode:<15}{len(porto.reads):>8}{result["MB_per_second"]:>9.1f}{result["packets_per_second"]:>10.0f}'
+              f'{result["packets"]:>9}{result["faults"]:>8}{result["resyncs"]:>9}'
+              f'{result["recovery_us"]:>10.1f}{result["recovery_bytes"]:>9.0f}')
+
+if __name__ == '__main__':
+    main()
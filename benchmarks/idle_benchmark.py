@@ -0,0 +1,67 @@
+'''CPU use and wake-up latency of engine read loop per idle strategy, on the simulator.
+
+usage: python benchmarks/idle_benchmark.py [--wakeups 200] [--idle-seconds 1] [--stream-seconds 1]
+'''
+import argparse
+import random
+import time
+from threading import Event
+from typing import Dict, List
+from ksoc_connection import KKTIntegration, KKTSimulatorConnection
+from ksoc_connection.idle import IDLE_MODES
+
+MULTI_RESULTS = 0xAB
+
+def cpu_utilization(integration:KKTIntegration, seconds:float)->float:
+    metrics = integration.connection.engine.metrics
+    metrics.snapshot()
+    time.sleep(seconds)
+    return metrics.snapshot()['loop']['cpu_utilization']
+
+def wakeup_latency(integration:KKTIntegration, count:int)->List[float]:
+    '''seconds from device writing a frame after idle to engine composing it'''
+    device = integration.connection.device
+    device.collection = {'actions': 0b1, 'raw_size': 64, 'reg_address': []}
+    arrived = Event()
+    stamps:List[int] = []
+    def on_frame(packet):
+        stamps.append(packet.timestamp)
+        arrived.set()
+    registration = integration.connection.engine.on(MULTI_RESULTS, on_frame)
+    latencies = []
+    for _ in range(count):
+        time.sleep(random.uniform(0.005, 0.02)) # idle gap, hybrid goes back to blocking
+        arrived.clear()
+        frame = device.frame()
+        written = time.monotonic_ns()
+        device.write_out(frame)
+        arrived.wait(1)
+        latencies.append((stamps[-1] - written) / 1e9)
+    integration.connection.engine.off(registration)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--wakeups', type=int, default=200)
+    parser.add_argument('--idle-seconds', type=float, default=1.0)
+    parser.add_argument('--stream-seconds', type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f'{"mode":<10}{"idle CPU":>10}{"stream CPU":>12}{"wake p50 us":>13}{"wake p99 us":>13}')
+    for mode in IDLE_MODES:
+        integration = KKTIntegration(KKTSimulatorConnection(frame_period=0.01))
+        integration.connectDevice()
+        try:
+            integration.connection.engine.set_idle_strategy(mode)
+            idle = cpu_utilization(integration, args.idle_seconds)
+            latencies = sorted(wakeup_latency(integration, args.wakeups))
+            integration.switchCollectionOfMultiResults(actions=0b1, raw_size=(8192 + 2) * 2)
+            stream = cpu_utilization(integration, args.stream_seconds)
+            integration.switchCollectionOfMultiResults(actions=0)
+        finally:
+            integration.disconnectDevice()
+        p50, p99 = latencies[len(latencies) // 2], latencies[min(int(0.99 * len(latencies)), len(latencies) - 1)]
+        print(f'{mode:<10}{idle:>10.1%}{stream:>12.1%}{p50 * 1e6:>13.1f}{p99 * 1e6:>13.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,9 @@
 from dataclasses import dataclass
-import win32file
-import win32con
-import win32api
-import win32event
-import serial
-import serial.tools.list_ports
 from typing import Optional
 from .logger import log
 
+# pywin32 and pyserial are imported on first use, so that importing this module is cheap and works on every platform
+
 @dataclass
 class VirtualInfo:
     name: str
@@ -24,10 +20,13 @@ class KKTVComPort:
     def __init__(self):
         log.info('KKTVComPort init')
         self.py_handle = None
+        self._win32file = None # pywin32 module, imported once by connect
 
         pass
 
     def connect(self, port: str):
+        import win32file, win32con, win32event
+        self._win32file = win32file
         self.py_handle = win32file.CreateFile(
             f"//./{port}",
             win32file.GENERIC_READ | win32file.GENERIC_WRITE,
@@ -60,12 +59,14 @@ class KKTVComPort:
             log.info('serial com port closed')
 
     def send(self, data: bytes):
+        win32file = self._win32file
         if self.py_handle.handle:
             err_code, data_len = win32file.WriteFile(self.py_handle, data)
             if err_code != 0:
                 raise Exception(f'WriteFile error code = {err_code}')
 
     def clear_RX_queue(self):
+        win32file = self._win32file
         if self.py_handle.handle:
             # win32file.PurgeComm(self.py_handle, win32con.PURGE_RXCLEAR)
             err_code, com_state = win32file.ClearCommError(self.py_handle)
@@ -80,6 +81,7 @@ class KKTVComPort:
         return False
 
     def recv(self, size: int = 4096, time_out: int = 0) -> bytes:
+        win32file = self._win32file
         if self.py_handle.handle == 0:
             raise Exception('py_handle is None')
 
@@ -90,8 +92,8 @@ class KKTVComPort:
 
             size = min(com_state.cbInQue, 4096)
 
-            if size == 0:
-                raise Exception(f'com_state.cbInQue = {com_state.cbInQue}')
+            if size == 0: # poll of idle link, not an error
+                return b''
 
             err_code, data = win32file.ReadFile(self.py_handle, size)
             if err_code != 0:
@@ -106,16 +108,9 @@ class KKTVComPort:
 
     @staticmethod
     def get_com_port_list() -> list:
-        ports = serial.tools.list_ports.comports()
-        KKT_ports = []
-        for port in sorted(ports):
-            for info in KKTVComPort.info_list:
-                if info.vid == port.vid and info.pid == port.pid:
-                    log.debug(f"{port.device}: {port.description} [{port.hwid}]")
-                    KKT_ports.append(port)
-                    break
-        return KKT_ports
-
+        '''KKT ports sorted by device, from the cache of the shared PortDiscovery (rescanned unless it is watching)'''
+        from .discovery import get_discovery
+        return get_discovery().get_ports()
 
 if __name__ == '__main__':
     import numpy as np
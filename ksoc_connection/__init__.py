@@ -1 +1,72 @@
-from .ksoc_connection import *
\ No newline at end of file
+'''Public API of ksoc_connection.
+
+Names are resolved on first attribute access (PEP 562), so `import ksoc_connection` stays cheap and platform
+specific transports (pywin32), pyserial and NumPy are only imported by the code paths that need them.
+'''
+from importlib import import_module
+from typing import Any, List
+
+# public name -> submodule
+_exports = {
+    'KKTIntegration': '.ksoc_connection',
+    'KKTClassStatus': '.ksoc_connection',
+    'KKTConnection': '.connection',
+    'KKTVComPortConnection': '.connection',
+    'KKTWIFIConnection': '.connection',
+    'KKTSimulatorConnection': '.connection',
+    'KKTConnectionException': '.connection',
+    'TimeoutException': '.connection',
+    'Packet': '.packet',
+    'Command': '.packet',
+    'Direction': '.packet',
+    'get_CDC_packet': '.packet',
+    'calculate_checksum': '.packet',
+    'parse_multi_results': '.packet',
+    'ThreadServerEngine': '.engine',
+    'CDCCollection': '.engine',
+    'EngineMetrics': '.metrics',
+    'MetricsServer': '.metrics',
+    'FrameHandler': '.dispatch',
+    'FrameBus': '.fanout',
+    'FrameSubscriber': '.fanout',
+    'ReceivePipeline': '.stages',
+    'StageFrame': '.stages',
+    'BatchProcessor': '.batch',
+    'BurstDrain': '.burst',
+    'BurstTiming': '.burst',
+    'ArchiveWriter': '.archive',
+    'ArchiveReader': '.archive',
+    'IdleStrategy': '.idle',
+    'TxPriority': '.tx',
+    'TxScheduler': '.tx',
+    'AllocationProfiler': '.allocations',
+    'AllocationReport': '.allocations',
+    'TraceRing': '.trace',
+    'TraceEvent': '.trace',
+    'KKTGateway': '.gateway',
+    'KKTVComPort': '.VComPort',
+    'PortDiscovery': '.discovery',
+    'PortInfo': '.discovery',
+    'KKTSocket': '.tcp',
+    'KKTSimulator': '.simulator',
+    'FaultyPorto': '.faults',
+    'RegisterCache': '.registers',
+    'RegisterProfile': '.profile',
+    'ProfileResult': '.profile',
+    'RegisterSubscription': '.subscription',
+    'RegisterSeries': '.subscription',
+    'log': '.logger',
+}
+
+__all__ = list(_exports)
+
+def __getattr__(name:str)->Any:
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value # cache, next access does not go through __getattr__
+    return value
+
+def __dir__()->List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,175 @@
+import ast
+import bisect
+import os
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Optional, Dict, List, Tuple
+
+__all__ = ['AllocationProfiler', 'AllocationReport', 'STAGES']
+
+_PACKAGE = os.path.dirname(os.path.abspath(__file__))
+
+# pipeline stage of top-level function or class, other allocations are grouped by module name
+STAGES:Dict[str, str] = {
+    'CDCCollection': 'framer',
+    'StampedPacket': 'framer',
+    'packet_checksum': 'framer',
+    'ThreadServerEngine': 'dispatch',
+    'Packet': 'parse',
+    'get_CDC_packet': 'parse',
+    'parse_multi_results': 'parse',
+    'KKTConnection': 'receive',
+    'KKTIntegration': 'api',
+}
+
+@dataclass
+class AllocationReport:
+    '''Memory allocated by ksoc_connection and still held at the end of a profiling window, by pipeline stage.
+
+    Attributes:
+        frames (int): frames received in the window.
+        stages (Dict[str, Tuple[int, int]]): stage -> (bytes, blocks) held at the end minus held at the start.
+        lines (List[Tuple[str, int, int]]): ('file:line', bytes, blocks) of the largest allocation sites.
+        peak (int): peak traced memory of the whole process in the window, in bytes.
+    '''
+    frames:int = 0
+    stages:Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    lines:List[Tuple[str, int, int]] = field(default_factory=list)
+    peak:int = 0
+
+    def per_frame(self)->Dict[str, Dict[str, float]]:
+        '''stage -> {'bytes', 'blocks'} per frame'''
+        frames = max(self.frames, 1)
+        return {stage: {'bytes': size / frames, 'blocks': count / frames} for stage, (size, count) in self.stages.items()}
+
+    @property
+    def total(self)->Tuple[int, int]:
+        '''(bytes, blocks) of all stages'''
+        return sum(size for size, _ in self.stages.values()), sum(count for _, count in self.stages.values())
+
+    def format(self)->str:
+        frames = max(self.frames, 1)
+        lines = [f'{self.frames} frames, peak {self.peak / 1e6:.2f} MB',
+                 f'{"stage":<12}{"bytes":>10}{"blocks":>8}{"B/frame":>10}{"blk/frame":>11}']
+        for stage, (size, count) in sorted(self.stages.items(), key=lambda item: -abs(item[1][0])):
+            lines.append(f'{stage:<12}{size:>10}{count:>8}{size / frames:>10.1f}{count / frames:>11.2f}')
+        for where, size, count in self.lines:
+            lines.append(f'  {where}: {size} B in {count} blocks')
+        return '\n'.join(lines)
+
+class AllocationProfiler:
+    '''Opt-in allocation profiling of ksoc_connection by tracemalloc snapshots.
+
+    Memory held at `stop` minus memory held at `start` is attributed to the innermost ksoc_connection frame
+    of each allocation, and grouped by pipeline stage (see STAGES), so queue growth made by the engine thread
+    counts for dispatch and a dict kept by the caller counts for the parser that built it.
+    tracemalloc slows allocations several times, do not leave it on in production.
+
+    usage:
+        with AllocationProfiler(engine) as profiler:
+            ...
+        print(profiler.report.format())
+    '''
+    def __init__(self, engine:Any=None, *, depth:int=16, top:int=10):
+        '''
+        Args:
+            engine (Any, optional): engine whose metrics.frames_received counts frames of the window.
+            depth (int, optional): frames kept per traceback, deep enough to reach ksoc_connection from stdlib code.
+            top (int, optional): allocation sites kept in report. Defaults to 10.
+        '''
+        self.engine = engine
+        self.depth = depth
+        self.top = top
+        self.report:Optional[AllocationReport] = None
+        self._snapshot:Optional[tracemalloc.Snapshot] = None
+        self._frames = 0
+        self._started_tracing = False
+        self._functions:Dict[str, Tuple[List[int], List[Tuple[int, str]]]] = {}
+
+    def start(self)->None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.depth)
+            self._started_tracing = True
+        if hasattr(tracemalloc, 'reset_peak'): # Python 3.9+
+            tracemalloc.reset_peak()
+        self._frames = self.engine.metrics.frames_received if self.engine is not None else 0
+        self._snapshot = self._take()
+
+    def stop(self, frames:Optional[int]=None)->AllocationReport:
+        '''end profiling window
+
+        Args:
+            frames (Optional[int], optional): frames processed in the window, counted by engine if None.
+        '''
+        assert self._snapshot is not None, 'profiler is not started'
+        snapshot = self._take()
+        peak = tracemalloc.get_traced_memory()[1]
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if frames is None:
+            frames = self.engine.metrics.frames_received - self._frames if self.engine is not None else 0
+        stages:Dict[str, List[int]] = {}
+        sites:Dict[str, List[int]] = {}
+        for diff in snapshot.compare_to(self._snapshot, 'traceback'):
+            if not diff.size_diff and not diff.count_diff:
+                continue
+            where = self._innermost(diff.traceback)
+            if where is None:
+                continue
+            filename, lineno = where
+            stage = self._stage(filename, lineno)
+            totals = stages.setdefault(stage, [0, 0])
+            totals[0] += diff.size_diff
+            totals[1] += diff.count_diff
+            site = sites.setdefault(f'{os.path.relpath(filename, _PACKAGE)}:{lineno}', [0, 0])
+            site[0] += diff.size_diff
+            site[1] += diff.count_diff
+        lines = sorted(((where, size, count) for where, (size, count) in sites.items()), key=lambda line: -abs(line[1]))
+        self.report = AllocationReport(frames, {stage: (size, count) for stage, (size, count) in stages.items()},
+                                       lines[:self.top], peak)
+        self._snapshot = None
+        return self.report
+
+    def _take(self)->tracemalloc.Snapshot:
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces([tracemalloc.Filter(True, os.path.join(_PACKAGE, '*'), all_frames=True),
+                                       tracemalloc.Filter(False, __file__, all_frames=True)])
+
+    @staticmethod
+    def _innermost(traceback:tracemalloc.Traceback)->Optional[Tuple[str, int]]:
+        for frame in reversed(traceback): # most recent first
+            if frame.filename.startswith(_PACKAGE):
+                return frame.filename, frame.lineno
+        return None
+
+    def _stage(self, filename:str, lineno:int)->str:
+        functions = self._functions.get(filename)
+        if functions is None:
+            functions = self._functions[filename] = self._top_level(filename)
+        starts, names = functions
+        index = bisect.bisect_right(starts, lineno) - 1
+        if index >= 0:
+            end, name = names[index]
+            if lineno <= end and name in STAGES:
+                return STAGES[name]
+        return os.path.splitext(os.path.basename(filename))[0]
+
+    @staticmethod
+    def _top_level(filename:str)->Tuple[List[int], List[Tuple[int, str]]]:
+        '''start lines and (end line, name) of top-level classes and functions of module'''
+        try:
+            with open(filename, encoding='utf-8') as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError):
+            return [], []
+        nodes = [node for node in tree.body if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))]
+        return ([node.lineno for node in nodes],
+                [(getattr(node, 'end_lineno', None) or node.lineno, node.name) for node in nodes])
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
@@ -0,0 +1,265 @@
+import os
+import struct
+from bisect import bisect_right
+from queue import Queue
+from threading import Thread
+from typing import Any, Optional, Dict, List, Tuple, Iterator
+import numpy as np
+from .logger import log
+
+__all__ = ['ArchiveWriter', 'ArchiveReader']
+
+# File layout:
+#   file header  : MAGIC, version (u16), codec (u8), reserved (u8)
+#   chunk        : CHUNK_MAGIC, first frame (u64), frames (u32), raw length (u32), compressed length (u32), data
+#   index        : entries of first frame (u64), frames (u32), chunk offset (u64)
+#   footer       : index offset (u64), entries (u32), INDEX_MAGIC
+# Chunk data is frames concatenated then compressed, a frame is timestamp (u64), blocks (u16) and per block
+# action number (i8), delta flag (u8), length (u32), data. uint16 sample blocks are delta encoded.
+MAGIC = b'KSOCARC1'
+CHUNK_MAGIC = b'CHNK'
+INDEX_MAGIC = b'KSOCIDX1'
+VERSION = 1
+FILE_HEADER = struct.Struct('<8sHBB')
+CHUNK_HEADER = struct.Struct('<4sQIII')
+INDEX_ENTRY = struct.Struct('<QIQ')
+FOOTER = struct.Struct('<QI8s')
+FRAME_HEADER = struct.Struct('<QH')
+BLOCK_HEADER = struct.Struct('<bBI')
+CODECS = {'zlib': 1, 'lzma': 2, 'none': 0}
+
+def _compress(codec:int, data:bytes, level:int)->bytes:
+    if codec == 1:
+        import zlib
+        return zlib.compress(data, level)
+    if codec == 2:
+        import lzma
+        return lzma.compress(data, preset=level)
+    return data
+
+def _decompress(codec:int, data:bytes)->bytes:
+    if codec == 1:
+        import zlib
+        return zlib.decompress(data)
+    if codec == 2:
+        import lzma
+        return lzma.decompress(data)
+    return data
+
+def _encode_frame(frame:Dict[int, bytes], timestamp:int, delta_actions:Tuple[int, ...])->bytes:
+    parts = [FRAME_HEADER.pack(timestamp, len(frame))]
+    for action_num, data in frame.items():
+        delta = action_num in delta_actions and len(data) % 2 == 0
+        if delta: # uint16 samples -> differences, wrap around keeps it lossless
+            samples = np.frombuffer(data, dtype='<u2')
+            data = np.diff(samples, prepend=np.uint16(0)).astype('<u2').tobytes()
+        parts.append(BLOCK_HEADER.pack(action_num, delta, len(data)))
+        parts.append(bytes(data))
+    return b''.join(parts)
+
+def _decode_frames(data:bytes, count:int)->List[Tuple[int, Dict[int, bytes]]]:
+    frames = []
+    offset = 0
+    for _ in range(count):
+        timestamp, blocks = FRAME_HEADER.unpack_from(data, offset)
+        offset += FRAME_HEADER.size
+        frame:Dict[int, bytes] = {}
+        for _ in range(blocks):
+            action_num, delta, length = BLOCK_HEADER.unpack_from(data, offset)
+            offset += BLOCK_HEADER.size
+            block = data[offset:offset + length]
+            offset += length
+            if delta:
+                block = np.cumsum(np.frombuffer(block, dtype='<u2'), dtype=np.uint16).astype('<u2').tobytes()
+            frame[action_num] = block
+        frames.append((timestamp, frame))
+    return frames
+
+class ArchiveWriter:
+    '''Write getMultiResults frames into chunked compressed archive.
+
+    Frames are grouped in chunks of `frames_per_chunk`, compression and file I/O run on a background thread,
+    so `write` only appends to the current chunk and never blocks capture.
+    '''
+    def __init__(self, path:str, *, codec:str='zlib', level:int=6, frames_per_chunk:int=64,
+                 delta_actions:Tuple[int, ...]=(0,), background:bool=True):
+        '''
+        Args:
+            path (str): archive file path.
+            codec (str, optional): 'zlib', 'lzma' or 'none'. Defaults to 'zlib'.
+            level (int, optional): compression level (zlib level or lzma preset). Defaults to 6.
+            frames_per_chunk (int, optional): frames per compressed chunk, unit of random access. Defaults to 64.
+            delta_actions (Tuple[int, ...], optional): action numbers holding uint16 samples to delta encode. Defaults to raw data (0).
+            background (bool, optional): compress on background thread. Defaults to True.
+        '''
+        assert codec in CODECS, f'codec must be one of {list(CODECS)}, but got {codec}'
+        self.codec = CODECS[codec]
+        self.level = level
+        self.frames_per_chunk = frames_per_chunk
+        self.delta_actions = tuple(delta_actions)
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, self.codec, 0))
+        self.index:List[Tuple[int, int, int]] = [] # (first frame, frames, offset)
+        self.frames = 0 # frames written
+        self.raw_bytes = 0 # bytes before compression
+        self.compressed_bytes = 0
+        self._chunk:List[Tuple[Dict[int, bytes], int]] = []
+        self._first = 0
+        self._queue:Optional[Queue] = None
+        self._thread:Optional[Thread] = None
+        if background:
+            self._queue = Queue()
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def write(self, frame:Dict[int, bytes], timestamp:int=0)->None:
+        '''append a frame (data dict of getMultiResults)
+
+        Args:
+            frame (Dict[int, bytes]): action number -> data.
+            timestamp (int, optional): receive time in ns, stored with frame. Defaults to 0.
+        '''
+        self._chunk.append((frame, timestamp))
+        self.frames += 1
+        if len(self._chunk) >= self.frames_per_chunk:
+            self._flush_chunk()
+
+    def _flush_chunk(self)->None:
+        if not self._chunk:
+            return
+        chunk, first = self._chunk, self._first
+        self._chunk, self._first = [], self.frames
+        if self._queue is not None:
+            self._queue.put((first, chunk))
+        else:
+            self._write_chunk(first, chunk)
+
+    def _write_chunk(self, first:int, chunk:List[Tuple[Dict[int, bytes], int]])->None:
+        raw = b''.join(_encode_frame(frame, timestamp, self.delta_actions) for frame, timestamp in chunk)
+        data = _compress(self.codec, raw, self.level)
+        offset = self.file.tell()
+        self.file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, first, len(chunk), len(raw), len(data)))
+        self.file.write(data)
+        self.index.append((first, len(chunk), offset))
+        self.raw_bytes += len(raw)
+        self.compressed_bytes += len(data)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._write_chunk(*item)
+
+    @property
+    def ratio(self)->float:
+        '''compression ratio of written chunks'''
+        return self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0.0
+
+    def close(self)->None:
+        '''flush pending frames, write index and close file'''
+        if self.file.closed:
+            return
+        self._flush_chunk()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+        index_offset = self.file.tell()
+        for entry in self.index:
+            self.file.write(INDEX_ENTRY.pack(*entry))
+        self.file.write(FOOTER.pack(index_offset, len(self.index), INDEX_MAGIC))
+        self.file.close()
+        log.info('archive closed: %d frames, ratio %.2f', self.frames, self.ratio)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+class ArchiveReader:
+    '''Random access reader of archive written by ArchiveWriter, only chunks of requested frames are decoded.'''
+    def __init__(self, path:str):
+        self.file = open(path, 'rb')
+        magic, version, self.codec, _ = FILE_HEADER.unpack(self.file.read(FILE_HEADER.size))
+        assert magic == MAGIC, f'not an archive file: {path}'
+        assert version == VERSION, f'archive version {version} not supported'
+        self.index = self._read_index()
+        self._firsts = [first for first, _, _ in self.index]
+        self._cached:Tuple[int, List[Tuple[int, Dict[int, bytes]]]] = (-1, [])
+
+    def _read_index(self)->List[Tuple[int, int, int]]:
+        size = self.file.seek(0, os.SEEK_END)
+        if size >= FILE_HEADER.size + FOOTER.size:
+            self.file.seek(size - FOOTER.size)
+            index_offset, entries, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+            if magic == INDEX_MAGIC:
+                self.file.seek(index_offset)
+                data = self.file.read(entries * INDEX_ENTRY.size)
+                return [INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size) for i in range(entries)]
+        # writer did not close, rebuild index by scanning chunk headers
+        log.warning('archive index not found, scanning chunks')
+        index = []
+        offset = FILE_HEADER.size
+        while offset + CHUNK_HEADER.size <= size:
+            self.file.seek(offset)
+            magic, first, frames, _, length = CHUNK_HEADER.unpack(self.file.read(CHUNK_HEADER.size))
+            if magic != CHUNK_MAGIC or offset + CHUNK_HEADER.size + length > size:
+                break
+            index.append((first, frames, offset))
+            offset += CHUNK_HEADER.size + length
+        return index
+
+    def __len__(self)->int:
+        if not self.index:
+            return 0
+        first, frames, _ = self.index[-1]
+        return first + frames
+
+    def _chunk(self, i:int)->List[Tuple[int, Dict[int, bytes]]]:
+        if self._cached[0] == i:
+            return self._cached[1]
+        _, frames, offset = self.index[i]
+        self.file.seek(offset)
+        _, _, _, _, length = CHUNK_HEADER.unpack(self.file.read(CHUNK_HEADER.size))
+        decoded = _decode_frames(_decompress(self.codec, self.file.read(length)), frames)
+        self._cached = (i, decoded)
+        return decoded
+
+    def records(self, start:int=0, stop:Optional[int]=None)->List[Tuple[int, Dict[int, bytes]]]:
+        '''(timestamp, frame) of frames [start, stop)'''
+        stop = len(self) if stop is None else min(stop, len(self))
+        result = []
+        n = start
+        while n < stop:
+            i = bisect_right(self._firsts, n) - 1
+            first, frames, _ = self.index[i]
+            chunk = self._chunk(i)
+            result.extend(chunk[n - first:min(stop, first + frames) - first])
+            n = first + frames
+        return result
+
+    def read(self, start:int=0, stop:Optional[int]=None)->List[Dict[int, bytes]]:
+        '''frames [start, stop) as data dicts of getMultiResults'''
+        return [frame for _, frame in self.records(start, stop)]
+
+    def __getitem__(self, n:int)->Dict[int, bytes]:
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError(n)
+        return self.read(n, n + 1)[0]
+
+    def __iter__(self)->Iterator[Dict[int, bytes]]:
+        for i, (first, frames, _) in enumerate(self.index):
+            for _, frame in self._chunk(i):
+                yield frame
+
+    def close(self)->None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
@@ -0,0 +1,171 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+from queue import Queue, Empty
+from typing import Any, Union, Optional, Dict, List, Tuple, Deque, Callable, Sequence
+import numpy as np
+from .stages import RAW_ACTION, HEADER_WORDS
+from .logger import log
+
+__all__ = ['BatchProcessor']
+
+_attached:Dict[str, shared_memory.SharedMemory] = {} # blocks attached by this worker process, by name
+
+def _process_batch(function:Callable[[np.ndarray], Any], name:str, shape:Tuple[int, int], dtype:str,
+                   count:int, frame_shape:Optional[Tuple[int, ...]])->Any:
+    '''run in worker process, only block name and shape cross the process boundary'''
+    block = _attached.get(name)
+    if block is None:
+        block = _attached[name] = shared_memory.SharedMemory(name=name)
+    batch = np.ndarray(shape, dtype=dtype, buffer=block.buf)[:count]
+    if frame_shape is not None:
+        batch = batch.reshape((count,) + tuple(frame_shape))
+    return function(batch)
+
+class BatchProcessor:
+    '''Process raw frames on a process pool in batches held in shared memory.
+
+    `feed` copies the raw samples of a frame into a row of a shared memory block, a full block is handed to a
+    worker by name, so frame data is never pickled. The user function gets a read/write (frames, samples)
+    array, or (frames, *frame_shape), and should be vectorized over frames. Its return value is pickled back.
+
+    There are `max_batches` blocks. When all of them are filling or in flight, `feed` waits for a block
+    (backpressure on the stream consumer) or drops the frame after timeout. Results are returned by `get`
+    in frame order.
+    '''
+    def __init__(self, function:Callable[[np.ndarray], Any], *, batch_frames:int=32, workers:Optional[int]=None,
+                 max_batches:Optional[int]=None, frame_shape:Optional[Sequence[int]]=None, action:int=RAW_ACTION,
+                 header_words:int=HEADER_WORDS, dtype:str='<u2'):
+        '''
+        Args:
+            function (Callable[[np.ndarray], Any]): picklable (module level) function of a batch.
+            batch_frames (int, optional): frames per batch. Defaults to 32.
+            workers (Optional[int], optional): worker processes. Defaults to CPU count.
+            max_batches (Optional[int], optional): shared memory blocks, filling or in flight. Defaults to 2 * workers.
+            frame_shape (Optional[Sequence[int]], optional): reshape samples of a frame, e.g. (chirps, samples).
+            action (int, optional): action number of raw data in multi results. Defaults to RAW_ACTION.
+            header_words (int, optional): uint16 words in front of raw samples, not copied. Defaults to HEADER_WORDS.
+            dtype (str, optional): sample type. Defaults to little-endian uint16.
+        '''
+        self.function = function
+        self.batch_frames = batch_frames
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batches = max_batches or 2 * self.workers
+        self.frame_shape = tuple(frame_shape) if frame_shape is not None else None
+        self.action = action
+        self.header_words = header_words
+        self.dtype = np.dtype(dtype)
+        self.executor = ProcessPoolExecutor(self.workers)
+        self.frame_size = 0 # samples per frame, known from first frame
+        self.blocks:List[shared_memory.SharedMemory] = []
+        self._views:List[np.ndarray] = []
+        self._free:'Queue[int]' = Queue() # index of blocks ready to be filled
+        self._inflight:Deque[Tuple[int, Future]] = deque() # (index of first frame, result) in frame order
+        self._current:Optional[int] = None # block being filled
+        self._filled = 0
+        self.frames = 0 # frames fed
+        self.batches = 0 # batches submitted
+        self.dropped = 0 # frames dropped by feed timeout
+
+    def _samples(self, frame:Union[Dict[int, bytes], bytes, np.ndarray])->np.ndarray:
+        if isinstance(frame, np.ndarray):
+            return frame.reshape(-1)
+        if isinstance(frame, dict):
+            frame = frame[self.action]
+        return np.frombuffer(frame, dtype=self.dtype)[self.header_words:]
+
+    def _allocate(self, frame_size:int)->None:
+        self.frame_size = frame_size
+        for index in range(self.max_batches):
+            block = shared_memory.SharedMemory(create=True, size=self.batch_frames * frame_size * self.dtype.itemsize)
+            self.blocks.append(block)
+            self._views.append(np.ndarray((self.batch_frames, frame_size), dtype=self.dtype, buffer=block.buf))
+            self._free.put(index)
+        log.debug('batch processor: %d blocks of %d bytes', self.max_batches, self.blocks[0].size)
+
+    def feed(self, frame:Union[Dict[int, bytes], bytes, np.ndarray], timeout:Optional[float]=None)->bool:
+        '''add one frame
+
+        Args:
+            frame (Union[Dict[int, bytes], bytes, np.ndarray]): data dict of getMultiResults, raw block bytes
+                (header words included) or samples array.
+            timeout (Optional[float], optional): seconds to wait for a free block, None to wait forever.
+
+        Returns:
+            bool: False if frame was dropped because no block was free in time.
+        '''
+        samples = self._samples(frame)
+        if not self.blocks:
+            self._allocate(samples.size)
+        elif samples.size != self.frame_size:
+            raise ValueError(f'frame has {samples.size} samples, but batch holds {self.frame_size}')
+        if self._current is None:
+            try:
+                self._current = self._free.get(timeout=timeout)
+            except Empty:
+                self.dropped += 1
+                return False
+            self._filled = 0
+        self._views[self._current][self._filled] = samples
+        self._filled += 1
+        self.frames += 1
+        if self._filled == self.batch_frames:
+            self._submit()
+        return True
+
+    def _submit(self)->None:
+        index, count = self._current, self._filled
+        future = self.executor.submit(_process_batch, self.function, self.blocks[index].name,
+                                      (self.batch_frames, self.frame_size), self.dtype.str, count, self.frame_shape)
+        future.add_done_callback(lambda future: self._free.put(index)) # block reusable once worker is done
+        self._inflight.append((self.frames - count, future))
+        self._current = None
+        self.batches += 1
+
+    def flush(self)->None:
+        '''submit partially filled batch'''
+        if self._current is not None and self._filled:
+            self._submit()
+
+    @property
+    def pending(self)->int:
+        '''batches submitted but not returned by get'''
+        return len(self._inflight)
+
+    def get(self, timeout:Optional[float]=None)->Tuple[int, Any]:
+        '''next batch result in frame order
+
+        Returns:
+            Tuple[int, Any]: index of first frame of the batch, function result.
+
+        Raises queue.Empty if no batch is in flight or the next one is not done in timeout,
+        exception of the function is raised here.
+        '''
+        if not self._inflight:
+            raise Empty()
+        first, future = self._inflight[0]
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            raise Empty()
+        except Exception:
+            self._inflight.popleft()
+            raise
+        self._inflight.popleft()
+        return first, result
+
+    def close(self)->None:
+        '''wait for submitted batches, stop workers and free shared memory, collect results by get before'''
+        self.executor.shutdown(wait=True)
+        self._views = []
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
@@ -0,0 +1,164 @@
+import time
+from dataclasses import dataclass
+from threading import Event, Lock
+from typing import Any, Optional
+import numpy as np
+from .packet import Command
+from .stages import RAW_ACTION, HEADER_WORDS
+
+__all__ = ['BurstDrain', 'BurstTiming']
+
+MULTI_RESULTS = Command.GET_COLLECTION_OF_MULTI_RESULTS.value
+
+@dataclass
+class BurstTiming:
+    '''Timing of a drained burst, times are time.monotonic_ns().
+
+    Attributes:
+        frames (int): frames collected.
+        armed (int): drain registered on engine.
+        first (int): first frame composed, 0 if none arrived.
+        last (int): last frame composed.
+        done (int): burst complete, or given up.
+    '''
+    frames:int = 0
+    armed:int = 0
+    first:int = 0
+    last:int = 0
+    done:int = 0
+
+    @property
+    def wait(self)->float:
+        '''seconds from arming to first frame'''
+        return (self.first - self.armed) / 1e9 if self.frames else 0.0
+
+    @property
+    def duration(self)->float:
+        '''seconds from first to last frame of the burst'''
+        return (self.last - self.first) / 1e9 if self.frames else 0.0
+
+    @property
+    def frame_interval(self)->float:
+        '''mean seconds between frames of the burst'''
+        return self.duration / (self.frames - 1) if self.frames > 1 else 0.0
+
+class BurstDrain:
+    '''Copy a burst of MULTI_RESULTS frames (sniff mode, frame_setting) into a preallocated array.
+
+    Runs as engine handler on the engine thread: the data block of every frame is copied once, from the
+    received packet straight into its row of `out`; no queue, no packet object and no parsed dict per frame.
+    The block offset is found in the first frame and checked on the next ones, so a burst costs one lookup.
+    `done` is set when `out` is full, `wait` also ends a shorter burst when no frame arrived for `gap`.
+    A frame is copied and counted under a lock which also guards finishing, so once `wait` or `close` returned
+    the engine thread no longer writes `out`, and `frames` and `timing` are final.
+
+    usage:
+        drain = BurstDrain(engine, out)
+        ... trigger burst ...
+        frames = drain.wait(timeout=1.0)
+        out[:frames]
+    '''
+    def __init__(self, engine:Any, out:np.ndarray, *, epoch:Optional[int]=None, action:int=RAW_ACTION,
+                 header_words:int=HEADER_WORDS):
+        '''
+        Args:
+            engine (Any): ThreadServerEngine whose MULTI_RESULTS frames are collected.
+            epoch (Optional[int], optional): first collection epoch collected, frames of earlier settings are ignored.
+                Defaults to current epoch of engine.
+            out (np.ndarray): (frames, samples) or (frames, *frame_shape) array, C contiguous, filled in frame order.
+            action (int, optional): action number of block copied. Defaults to RAW_ACTION.
+            header_words (int, optional): words in front of samples, not copied. Defaults to HEADER_WORDS.
+        '''
+        assert out.flags.c_contiguous, 'out must be C contiguous'
+        self.engine = engine
+        self.out = out
+        self.rows = out.reshape(out.shape[0], -1)
+        self.action = action
+        self.skip = header_words * out.dtype.itemsize
+        self.size = self.rows.shape[1] * out.dtype.itemsize # bytes copied per frame
+        self.epoch = engine.epoch if epoch is None else epoch
+        self.frames = 0
+        self.ignored = 0 # frames of earlier epoch or after out was full
+        self.error:Optional[str] = None
+        self.done = Event()
+        self._started = Event() # first frame arrived
+        self.timing = BurstTiming(armed=time.monotonic_ns())
+        self._offset = -1 # offset of block data in packet, found in first frame
+        self._lock = Lock() # engine thread copying a frame against caller finishing, see close
+        self._registration = engine.on(MULTI_RESULTS, self._on_frame)
+
+    def _find(self, packet:bytes)->int:
+        '''offset of block data in packet, -1 if packet has no such block'''
+        end = 7 + int.from_bytes(packet[5:7], byteorder='big')
+        offset = 12 # $K< cmd, 1 byte, 2 bytes length, 5 bytes header of actions
+        while offset + 4 <= end:
+            length = int.from_bytes(packet[offset + 2:offset + 4], byteorder='big')
+            if packet[offset + 1] == self.action:
+                return offset + 4 if length == self.skip + self.size else -1
+            offset += 4 + length
+        return -1
+
+    def _on_frame(self, packet:bytes)->None:
+        with self._lock:
+            self._copy(packet)
+
+    def _copy(self, packet:bytes)->None:
+        if self.done.is_set() or getattr(packet, 'epoch', self.epoch) < self.epoch:
+            self.ignored += 1
+            return
+        offset = self._offset
+        if offset < 0 or packet[offset - 3] != self.action or len(packet) < offset + self.skip + self.size + 1:
+            offset = self._offset = self._find(packet) # first frame, or layout changed
+            if offset < 0:
+                self.error = f'frame has no block of action {self.action} with {self.skip + self.size} bytes'
+                self._finish()
+                return
+        self.rows[self.frames] = np.frombuffer(packet, dtype=self.out.dtype, count=self.rows.shape[1], offset=offset + self.skip)
+        timestamp = getattr(packet, 'timestamp', 0) or time.monotonic_ns()
+        if not self.frames:
+            self.timing.first = timestamp
+            self._started.set()
+        self.timing.last = timestamp
+        self.frames += 1
+        if self.frames == len(self.rows):
+            self._finish()
+
+    def _finish(self)->None:
+        '''unregister and set done once, called with _lock held'''
+        if self.done.is_set():
+            return
+        if self._registration is not None: # later frames go to the response only queue again
+            self.engine.off(self._registration)
+            self._registration = None
+        self.timing.frames = self.frames
+        self.timing.done = time.monotonic_ns()
+        self._started.set()
+        self.done.set()
+
+    def wait(self, timeout:Optional[float]=None, *, gap:Optional[float]=0.05)->int:
+        '''wait for the burst and unregister from engine
+
+        Args:
+            timeout (Optional[float], optional): max seconds to wait for the first frame, None to wait forever.
+            gap (Optional[float], optional): a burst with fewer frames than out ends after this many seconds
+                without a frame, None to wait until out is full.
+
+        Returns:
+            int: number of frames in out.
+        '''
+        try:
+            if self._started.wait(timeout):
+                if gap is None:
+                    self.done.wait()
+                else:
+                    frames = -1
+                    while frames != self.frames and not self.done.wait(gap): # frames still arriving
+                        frames = self.frames
+        finally:
+            self.close()
+        return self.frames
+
+    def close(self)->None:
+        '''stop collecting, later frames go to the response only queue again'''
+        with self._lock: # waits for a frame being copied
+            self._finish()
@@ -1,11 +1,12 @@
-import socket
+import logging
 from typing import Any, Union, Optional
-from .VComPort import KKTVComPort
 from .engine import ThreadServerEngine as Engine
 from queue import Queue, Empty
 from .packet import Packet, get_CDC_packet
 from abc import abstractmethod, ABCMeta
 from .logger import log
+from .trace import TraceEvent
+from .tx import TxPriority
 
 class TimeoutException(Exception):
     pass
@@ -35,18 +36,20 @@ class KKTConnection(metaclass=ABCMeta):
         '''Connect to KKT device.'''
         ...
 
-    def sendCDCPacket(self, packet: Union[bytearray, bytes]) -> None:
+    def sendCDCPacket(self, packet: Union[bytearray, bytes], *, priority:TxPriority=TxPriority.CONTROL) -> None:
         '''Send CDC packet (bytes) to KKT device.
 
         Args:
             packet (Union[bytearray, bytes]): CDC packet in bytes.
+            priority (TxPriority, optional): TX priority class. Defaults to CONTROL.
 
         '''
         if not self.is_connected:
             raise KKTConnectionException('Connection is not established.')
-        log.debug(f'===== ====== =====')
-        log.debug(f'send: {packet.hex(" ")}')
-        self.engine.send(packet, cmd=packet[3])
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('===== ====== =====')
+            log.debug(f'send: {packet.hex(" ")}')
+        self.engine.send(packet, cmd=packet[3], priority=priority)
 
     def receiveCDCPacket(self,* ,cmd: int = 0x00, response_only: bool = False) -> bytes:
         '''Receive CDC packet (bytes) from KKT device.
@@ -61,8 +64,10 @@ class KKTConnection(metaclass=ABCMeta):
             try:
                 response = self.engine.recv(response_only=response_only, time_out=0.5)
             except Empty as error:
-                log.debug(f'retry to receive CDC packet response: {i+1} time')
+                log.debug('retry to receive CDC packet response: %d time', i+1)
                 continue
+            if self.engine.trace is not None:
+                self.engine.trace.record(TraceEvent.DEQUEUE, response[3], len(response))
             # check cmd
             if (response[3] == cmd) or (cmd == 0x00):
                 # print(f'recv: {response.hex(" ")}')
@@ -70,21 +75,22 @@ class KKTConnection(metaclass=ABCMeta):
 
         raise KKTConnectionException(f'response timeout')
 
-    def sendCDCPacketWithResponse(self, request:Packet) -> Packet:
+    def sendCDCPacketWithResponse(self, request:Packet, *, priority:TxPriority=TxPriority.CONTROL) -> Packet:
         '''Send CDC packet (bytes) to KKT device and receive response.
 
         Args:
             request (Packet): CDC packet in Packet class.
+            priority (TxPriority, optional): TX priority class, BULK for batched or scripted transfers. Defaults to CONTROL.
         '''
         request.update_checksum()
         for i in range(100):
-            self.sendCDCPacket(request.CDC_packet)
+            self.sendCDCPacket(request.CDC_packet, priority=priority)
             try:
                 response = self.receiveCDCPacket(cmd=request.command)
                 response = get_CDC_packet(response)
                 return response
             except TimeoutException as error:
-                log.debug(f'retry {i+1} time')
+                log.debug('retry %d time', i+1)
                 continue
         raise TimeoutException(f'retry timeout')
 
@@ -114,9 +120,10 @@ class KKTConnection(metaclass=ABCMeta):
 
 
 class KKTWIFIConnection(KKTConnection):
-    '''Implement KKTConnection for websocket connection.'''
+    '''Implement KKTConnection for TCP socket connection, to KKT device on network or KKTGateway.'''
     def __init__(self, timeout:Optional[float]=None):
-        self.engine = Engine(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
+        from .tcp import KKTSocket
+        self.engine = Engine(KKTSocket())
         self.is_connected = False
 
     def connect(self, host:str, port:int, **kwargs)->None:
@@ -126,12 +133,13 @@ class KKTWIFIConnection(KKTConnection):
             host (str): IP address of KKT device.
             port (int): Port of KKT device.
         '''
-        self.engine.connect(__address=(host, port))
+        self.engine.connect(host, port)
         self.is_connected = True
 
 class KKTVComPortConnection(KKTConnection):
     '''Implement KKTConnection for serial port connection (WinAPI).'''
     def __init__(self, timeout:Optional[float]=None):
+        from .VComPort import KKTVComPort # WinAPI transport, loaded only when used
         self.engine = Engine(KKTVComPort())
         self.is_connected = False
 
@@ -139,9 +147,28 @@ class KKTVComPortConnection(KKTConnection):
     def connect(self, **kwargs)->None:
         '''Connect to KKT device.
         '''
-        ports = KKTVComPort.get_com_port_list()
+        ports = self.engine.porto.get_com_port_list()
+        if not ports:
+            raise KKTConnectionException('no KKT serial port found')
         self.engine.connect(port=ports[0].device)
         log.info(f'connected to {ports[0].device}')
         self.is_connected = True
 
 
+
+class KKTSimulatorConnection(KKTConnection):
+    '''Implement KKTConnection for in-process simulated KKT device, for tests and benchmarks without hardware.'''
+    def __init__(self, timeout:Optional[float]=None, **kwargs):
+        '''
+        Args:
+            **kwargs: passed to KKTSimulator, e.g. frame_period, chunk_size.
+        '''
+        from .simulator import KKTSimulator
+        self.device = KKTSimulator(**kwargs)
+        self.engine = Engine(self.device)
+        self.is_connected = False
+
+    def connect(self, **kwargs)->None:
+        '''Connect to simulated KKT device.'''
+        self.engine.connect()
+        self.is_connected = True
@@ -0,0 +1,183 @@
+import os
+import re
+import sys
+from dataclasses import dataclass
+from threading import Thread, Event, Lock
+from typing import Optional, Dict, List, Tuple, Callable, Iterable
+from .logger import log
+
+__all__ = ['PortInfo', 'PortDiscovery', 'get_discovery', 'ATTACH', 'DETACH']
+
+ATTACH = 'attach'
+DETACH = 'detach'
+
+@dataclass(frozen=True)
+class PortInfo:
+    '''Serial port of a KKT device.'''
+    device: str # e.g. /dev/ttyACM0 or COM3
+    vid: int
+    pid: int
+    name: str = '' # device name of matched VID/PID, e.g. Nu_Dongle
+    description: str = ''
+
+PortListener = Callable[[str, PortInfo], None]
+
+def _natural_key(device:str)->List[object]:
+    '''sort key comparing digit runs as numbers, COM3 < COM10 and ttyACM2 < ttyACM10, as pyserial orders ports'''
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', device)]
+
+def _read(path:str)->str:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+class PortDiscovery:
+    '''Cache of serial ports matching known VID/PID, optionally kept up to date by a hotplug watcher.
+
+    On Linux ports are found from /sys/class/tty, only tty entries not seen before are resolved to VID/PID,
+    so a refresh costs one directory listing. Other platforms enumerate with pyserial.
+    Listeners get (ATTACH or DETACH, PortInfo) on the thread that refreshed.
+    '''
+    def __init__(self, ids:Dict[Tuple[int, int], str], *, sysfs:Optional[str]=None, dev:str='/dev'):
+        '''
+        Args:
+            ids (Dict[Tuple[int, int], str]): (vid, pid) -> device name of ports to keep.
+            sysfs (Optional[str], optional): tty class directory, None for /sys/class/tty on Linux and pyserial elsewhere.
+            dev (str, optional): directory of device nodes (Linux). Defaults to /dev.
+        '''
+        self.ids = dict(ids)
+        if sysfs is None and sys.platform.startswith('linux') and os.path.isdir('/sys/class/tty'):
+            sysfs = '/sys/class/tty'
+        self.sysfs = sysfs
+        self.dev = dev
+        self.ports:Dict[str, PortInfo] = {} # device -> port, matching ports only
+        self._seen:Dict[str, Optional[PortInfo]] = {} # tty name -> port or None if not matching (sysfs)
+        self.listeners:List[PortListener] = []
+        self.scans = 0 # refresh count
+        self._lock = Lock()
+        self._watcher:Optional[Thread] = None
+        self._stop = Event()
+
+    @property
+    def watching(self)->bool:
+        return self._watcher is not None and self._watcher.is_alive()
+
+    def add_listener(self, listener:PortListener)->None:
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener:PortListener)->None:
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def get_ports(self, *, refresh:Optional[bool]=None)->List[PortInfo]:
+        '''matching ports sorted by device, numbers in names compared by value (COM3 before COM10)
+
+        Args:
+            refresh (Optional[bool], optional): scan before returning, None to scan only if watcher is not running.
+        '''
+        if refresh or (refresh is None and not self.watching):
+            self.refresh()
+        return sorted(self.ports.values(), key=lambda port: _natural_key(port.device))
+
+    def refresh(self)->Tuple[List[PortInfo], List[PortInfo]]:
+        '''scan ports, update cache and notify listeners
+
+        Returns:
+            Tuple[List[PortInfo], List[PortInfo]]: attached ports, detached ports.
+        '''
+        with self._lock:
+            self.scans += 1
+            found = self._scan_sysfs() if self.sysfs is not None else self._scan_pyserial()
+            attached = [port for device, port in found.items() if device not in self.ports]
+            detached = [port for device, port in self.ports.items() if device not in found]
+            self.ports = found
+        for port in attached:
+            log.info(f'port attached: {port.device} ({port.name})')
+            self._notify(ATTACH, port)
+        for port in detached:
+            log.info(f'port detached: {port.device} ({port.name})')
+            self._notify(DETACH, port)
+        return attached, detached
+
+    def _notify(self, event:str, port:PortInfo)->None:
+        for listener in list(self.listeners):
+            try:
+                listener(event, port)
+            except Exception as error:
+                log.warning(f'port listener failed: {error}')
+
+    def _scan_sysfs(self)->Dict[str, PortInfo]:
+        try:
+            names = os.listdir(self.sysfs)
+        except OSError:
+            names = []
+        seen = {name: self._seen[name] if name in self._seen else self._resolve(name) for name in names}
+        self._seen = seen # forget removed ttys, a replugged device is resolved again
+        return {port.device: port for port in seen.values() if port is not None}
+
+    def _resolve(self, name:str)->Optional[PortInfo]:
+        '''VID/PID of tty from its USB device directory, None if not a matching USB port'''
+        path = os.path.join(self.sysfs, name, 'device')
+        if not os.path.exists(path):
+            return None
+        path = os.path.realpath(path)
+        for _ in range(4): # interface directory, USB device directory is a parent
+            vid = _read(os.path.join(path, 'idVendor'))
+            if vid:
+                pid = _read(os.path.join(path, 'idProduct'))
+                key = (int(vid, 16), int(pid, 16)) if pid else None
+                if key not in self.ids:
+                    return None
+                return PortInfo(os.path.join(self.dev, name), key[0], key[1], self.ids[key], _read(os.path.join(path, 'product')))
+            path = os.path.dirname(path)
+        return None
+
+    def _scan_pyserial(self)->Dict[str, PortInfo]:
+        import serial.tools.list_ports
+        found = {}
+        for port in serial.tools.list_ports.comports():
+            name = self.ids.get((port.vid, port.pid))
+            if name is not None:
+                log.debug(f'{port.device}: {port.description} [{port.hwid}]')
+                found[port.device] = PortInfo(port.device, port.vid, port.pid, name, port.description)
+        return found
+
+    def start(self, interval:float=1.0)->None:
+        '''watch hotplug by refreshing every interval seconds on a background thread'''
+        if self.watching:
+            return
+        self._stop.clear()
+        self.refresh()
+        self._watcher = Thread(target=self._watch, args=(interval,), daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval:float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as error:
+                log.warning(f'port discovery failed: {error}')
+
+    def stop(self)->None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+_discovery:Optional[PortDiscovery] = None
+
+def get_discovery(ids:Optional[Iterable[Tuple[int, int, str]]]=None)->PortDiscovery:
+    '''shared PortDiscovery of KKT devices, created on first call
+
+    Args:
+        ids (Optional[Iterable[Tuple[int, int, str]]], optional): (vid, pid, name) of first call, KKTVComPort.info_list if None.
+    '''
+    global _discovery
+    if _discovery is None:
+        if ids is None:
+            from .VComPort import KKTVComPort
+            ids = [(info.vid, info.pid, info.name) for info in KKTVComPort.info_list]
+        _discovery = PortDiscovery({(vid, pid): name for vid, pid, name in ids})
+    return _discovery
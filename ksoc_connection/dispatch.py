@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import Executor, Future
+from threading import Lock
+from typing import Any, Optional, Dict, Callable, Tuple
+from .metrics import Histogram
+from .logger import log
+
+__all__ = ['FrameHandler', 'HANDLER_BUCKETS']
+
+# execution time bucket bounds in seconds (1us ... 1s), handlers are usually much faster than responses
+HANDLER_BUCKETS:Tuple[float, ...] = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 0.0001, 0.00025, 0.0005,
+                                     0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+class FrameHandler:
+    '''Function called with every received packet of a command, registered by `engine.on`.
+
+    Without executor the function runs inline on the engine thread, so it must be short and must not block.
+    With an executor (thread or process pool) the engine only submits the packet; `time` then measures
+    submit to completion, queueing in the pool included. Functions for a process pool must be picklable.
+    '''
+    def __init__(self, command:int, function:Callable[[bytes], Any], executor:Optional[Executor]=None):
+        self.command = command
+        self.function = function
+        self.executor = executor
+        self.calls = 0
+        self.errors = 0
+        self.pending = 0 # submitted to executor but not finished
+        self.time = Histogram(HANDLER_BUCKETS) # execution time in seconds
+        self._lock = Lock() # pool callbacks may finish on several threads
+
+    def __call__(self, packet:bytes)->None:
+        '''run or submit handler, called by engine thread'''
+        self.calls += 1
+        start = time.perf_counter()
+        if self.executor is None:
+            try:
+                self.function(packet)
+            except Exception as error:
+                self.errors += 1
+                log.warning('handler %s of command %#x failed: %s', self.name, self.command, error)
+            self.time.observe(time.perf_counter() - start)
+            return
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self.executor.submit(self.function, packet)
+        except Exception as error: # pool shut down or broken, or packet not picklable
+            with self._lock:
+                self.pending -= 1
+                self.errors += 1
+            log.warning('handler %s of command %#x not submitted: %s', self.name, self.command, error)
+            return
+        future.add_done_callback(lambda future: self._done(future, start))
+
+    def _done(self, future:Future, start:float)->None:
+        elapsed = time.perf_counter() - start
+        error = future.exception() if not future.cancelled() else None
+        with self._lock:
+            self.pending -= 1
+            self.time.observe(elapsed)
+            if error is not None or future.cancelled():
+                self.errors += 1
+        if error is not None:
+            log.warning('handler %s of command %#x failed: %s', self.name, self.command, error)
+
+    @property
+    def name(self)->str:
+        return getattr(self.function, '__qualname__', repr(self.function))
+
+    def stats(self)->Dict[str, Any]:
+        with self._lock:
+            snapshot = self.time.snapshot()
+            pending = self.pending
+        return {'command': self.command, 'handler': self.name, 'calls': self.calls, 'errors': self.errors,
+                'pending': pending, 'time': snapshot}
@@ -1,71 +1,153 @@
 import sys
 from multiprocessing import Process
-from queue import Queue,LifoQueue
+from queue import Queue,LifoQueue,Empty
 from threading import Thread, Event
 import socket
 import time
-from typing import Any, Union, Optional, Dict, Tuple
+import logging
+from concurrent.futures import Executor
+from typing import Any, Union, Optional, Dict, List, Tuple, Container, Callable
 from .logger import log
+from .metrics import EngineMetrics, MetricsServer
+from .trace import TraceRing, TraceEvent
+from .fanout import FrameBus, FrameSubscriber
+from .packet import StampedPacket, Command, packet_checksum
+from .tx import TxScheduler, TxPriority, TxItem
+from .dispatch import FrameHandler
+from .idle import IdleStrategy
+CHECKSUM_POLICIES = ('off', 'sampled', 'full')
+_REJECTED = object() # packet dropped by checksum validation
+_SWITCH_COLLECTION = Command.SWITCH_COLLECTION_OF_MULTI_RESULTS.value
+
 class CDCCollection:
     '''CDC packet Composer'''
-    def __init__(self):
+    def __init__(self, metrics:Optional[EngineMetrics]=None):
         super().__init__()
         self._buffer:Optional[bytearray] = None
         self.temp_bytes = b'' # buffered bytes to compose CDC packet
         self.offset = 0 # pointer of start frame
         self.byte_without_payload = 11
+        self.metrics = metrics if metrics is not None else EngineMetrics() # discarded bytes and resync counters
+        self.checksum_policy = 'off'
+        self.verify_every = 0 # validate 1 in verify_every packets, 0 for off
+        self._unverified = 0
 
     def init(self):
         '''reset temp_bytes and byte_without_payload'''
         self.temp_bytes = b''
         self.byte_without_payload = 11
 
+    def set_checksum_policy(self, policy:str, *, sample_every:int=16)->None:
+        '''set checksum validation of composed packets
+
+        Args:
+            policy (str): 'off', 'sampled' (1 in sample_every packets) or 'full'.
+            sample_every (int, optional): sampling interval of 'sampled'. Defaults to 16.
+        '''
+        assert policy in CHECKSUM_POLICIES, f'policy must be one of {CHECKSUM_POLICIES}, but got {policy}'
+        assert sample_every >= 1, f'sample_every must be >= 1, but got {sample_every}'
+        self.checksum_policy = policy
+        self.verify_every = {'off': 0, 'sampled': sample_every, 'full': 1}[policy]
+        self._unverified = 0
+
     def collect(self, data:bytes)->Optional[bytes]:
-        '''collect and compose CDC packet from data'''
-        # check if data is a complete packet, return packet if true
-        is_packet, packet = self.check_is_packet(data)
-        if is_packet:
-            log.debug(f'put packet length : {len(packet)}')
-            return packet
-
-        # if data is not a complete packet, append data to temp_bytes
+        '''collect and compose CDC packet from data
+
+        Only one packet is returned per call, bytes after it are kept in temp_bytes,
+        call again with b'' until None to get the other packets of the same read.
+        Packets are StampedPacket, timestamp is taken when the packet is complete.
+        A packet failing checksum validation is not returned, composer resyncs from the byte after its start frame.
+        '''
+        # fast path, data is exactly one complete packet
+        if not self.temp_bytes:
+            is_packet, packet = self.check_is_packet(data)
+            if is_packet and len(packet) == len(data):
+                if self._verify(packet):
+                    log.debug('put packet length : %d', len(packet))
+                    return StampedPacket(packet, time.monotonic_ns())
+                self.temp_bytes = packet
+                self._reject()
+                data = b''
+
+        # append data to temp_bytes
         self.temp_bytes += data
-        data_length = len(self.temp_bytes)
-        log.debug(f'temp_bytes_length = {data_length}')
+        while True:
+            packet = self._compose()
+            if packet is not _REJECTED:
+                return packet
+
+    def _verify(self, packet:bytes)->bool:
+        '''True if packet passes checksum policy'''
+        every = self.verify_every
+        if not every:
+            return True
+        if every > 1:
+            self._unverified += 1
+            if self._unverified < every:
+                return True
+            self._unverified = 0
+        self.metrics.checksum_checked += 1
+        return packet_checksum(packet) == packet[-1]
+
+    def _reject(self)->None:
+        '''drop start frame of corrupt packet at head of temp_bytes, next start frame is searched in the rest'''
+        log.debug('checksum error, cmd = %#x', self.temp_bytes[3])
+        self.metrics.on_checksum_error()
+        self.metrics.on_discard(1)
+        self.metrics.on_resync()
+        self.temp_bytes = self.temp_bytes[1:]
+
+    def _compose(self)->Any:
+        '''compose next packet from temp_bytes, None if incomplete, _REJECTED if checksum failed'''
+        if not self.temp_bytes:
+            return None
+        log.debug('temp_bytes_length = %d', len(self.temp_bytes))
 
         # find start frame in temp_bytes ($K<)
         offset = self.temp_bytes.find(b'$K<')
-        # print(offset)
 
-        # if start frame not found in temp_bytes, clear temp_bytes and return
+        # if start frame not found, drop temp_bytes but keep tail which may be a split start frame
         if offset == -1:
-            log.debug(f'start frame not found, data[0:3] == {self.temp_bytes[offset:3]}')
-            log.debug(f'data = {self.temp_bytes.hex(" ")}')
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(f'start frame not found, data[0:3] == {self.temp_bytes[:3]}')
+                log.debug(f'data = {self.temp_bytes.hex(" ")}')
+            keep = 2 if self.temp_bytes.endswith(b'$K') else 1 if self.temp_bytes.endswith(b'$') else 0
+            discarded = len(self.temp_bytes) - keep
+            if discarded:
+                self.metrics.on_discard(discarded)
+                self.metrics.on_resync()
+            temp = self.temp_bytes[discarded:]
             self.init()
-            return
+            self.temp_bytes = temp
+            return None
 
         # if start frame found, move pointer to start frame
-        self.temp_bytes = self.temp_bytes[offset:]
-        # print('0 get start frame')
-        # offset = 0
+        if offset > 0:
+            self.metrics.on_discard(offset)
+            self.metrics.on_resync()
+            self.temp_bytes = self.temp_bytes[offset:]
 
-        # just double check if start frame is correct, not necessary
-        if self.temp_bytes[:3] != b'$K<':
-            raise Exception(f'header[0:3] invalid, data[0:3] == {self.temp_bytes[:3]}')
+        data_length = len(self.temp_bytes)
+        if data_length < 7: # header + cmd + payload length not enough
+            return None
 
         # get payload length
         payload_length = int.from_bytes(self.temp_bytes[5:7], byteorder='big', signed=False)
-        # print(f'payload_length = {payload_length}')
 
         # if data_length >= 8 + payload_length, packet should be complete
         if data_length >= 8 + payload_length:
-            # print('data_length >= 8 + payload_length')
-            CDC_packet = self.temp_bytes[:8 + payload_length]
-            log.debug(f'get packet len : {len(CDC_packet)}')
+            view = memoryview(self.temp_bytes)[:8 + payload_length]
+            if not self._verify(view): # validated in place, before copy
+                view.release()
+                self._reject()
+                return _REJECTED
+            CDC_packet = StampedPacket(view, time.monotonic_ns())
+            log.debug('get packet len : %d', len(CDC_packet))
             temp = self.temp_bytes[8 + payload_length:]
             self.init()
             self.temp_bytes = temp
             return CDC_packet
+        return None
 
     def check_is_packet(self, data:bytes)->Tuple[bool, Optional[bytes]]:
         '''check if data is a complete CDC packet'''
@@ -108,20 +190,22 @@ class ServerEngine(Process):
         self.CDC_response_only = Queue()
         self.CDC_request_response = Queue()
         self.response_cmd = set([])
+        self.idle = IdleStrategy('hybrid') # read loop wait, was a busy poll
 
     def run(self):
         CDC_collection = CDCCollection()
         while self.is_alive():
-            recv_data = self.porto.recv(4096 * 2)
+            recv_data = self.porto.recv(4096 * 2, time_out=self.idle.timeout())
             if recv_data == b'':
                 continue
+            self.idle.on_traffic()
             packet = CDC_collection.collect(recv_data)
             if packet is not None:
                 if packet[3] in self.response_cmd:
-                    log.debug(f'to request response queue, cmd = {packet[3]}')
+                    log.debug('to request response queue, cmd = %d', packet[3])
                     self.CDC_request_response.put(packet)
                 else:
-                    log.debug(f'to response only queue, cmd = {packet[3]}')
+                    log.debug('to response only queue, cmd = %d', packet[3])
                     self.CDC_response_only.put(packet)
         print('process stop')
 
@@ -159,46 +243,221 @@ class ThreadServerEngine(Thread):
         self.CDC_request_response = Queue() # queue for request response packet
         self.response_cmd = set([]) # set of cmd that need response
         self.active = Event()
+        self.metrics = EngineMetrics() # always-on counters, read by `metrics.snapshot()`
+        self.metrics_server:Optional[MetricsServer] = None
+        self.trace:Optional[TraceRing] = None # per-packet trace ring, disabled by default
+        self.frame_bus = FrameBus() # fan-out of response only packets to subscribers
+        self.queue_response_only = True # False if response only packets are consumed by subscribers only
+        self.pipeline:Optional[Callable[[bytes], Optional[bytes]]] = None # receive stages, see add_stage
+        self.tx = TxScheduler(porto.send, on_write=self._on_tx_write) # single writer of porto, see send
+        self.CDC_collection = CDCCollection(self.metrics) # packet composer of event loop
+        self.handlers:Dict[int, List[FrameHandler]] = {} # response only packets handled by callbacks, see on
+        self.epoch = 0 # collection epoch, advanced by every SWITCH_COLLECTION_OF_MULTI_RESULTS response
+        self.idle = IdleStrategy() # wait of read loop, see set_idle_strategy
+
     def start(self):
         '''start thread'''
         self.active.set()
+        self.tx.start()
         super().start()
 
     def run(self):
         '''Event loop'''
-        CDC_collection = CDCCollection()
+        metrics = self.metrics
+        CDC_collection = self.CDC_collection
+        cpu_start = time.thread_time()
         while self.active.is_set():
+            idle = self.idle
             try:
-                recv_data = self.porto.recv(4096*2, time_out=10)
+                recv_data = self.porto.recv(4096*2, time_out=idle.timeout())
             except Exception as error:
                 log.warning(error)
-                self.stop()
+                self.active.clear() # porto broken, stop event loop
+                break
 
+            metrics.on_read(len(recv_data), time.thread_time() - cpu_start)
             if recv_data == b'':
                 continue
+            idle.on_traffic()
+            metrics.on_recv(len(recv_data))
+            trace = self.trace
+            if trace is not None and not CDC_collection.temp_bytes: # first bytes of a new packet
+                command = recv_data[3] if recv_data[:3] == b'$K<' and len(recv_data) > 3 else 0
+                trace.record(TraceEvent.RX_FIRST_BYTE, command, len(recv_data))
 
             packet = CDC_collection.collect(recv_data)
-
-            if packet is not None:
-                if packet[3] in self.response_cmd:
-                    log.debug(f'to request response queue, cmd = {hex(packet[3])}')
-                    self.CDC_request_response.put(packet)
-                else:
-                    log.debug(f'to response only queue, cmd = {hex(packet[3])}')
-                    self.CDC_response_only.put(packet)
+            while packet is not None: # several packets may arrive in one read
+                self._dispatch(packet)
+                packet = CDC_collection.collect(b'')
 
         log.info('event loop stopped')
 
-    def send(self, data:bytes, *, cmd:Optional[int]=None):
-        '''send data (cdc packet in bytes) to porto
+    def _dispatch(self, packet:bytes)->None:
+        '''route complete packet to request response queue, or to receive stages, subscribers and response only queue'''
+        metrics = self.metrics
+        trace = self.trace
+        metrics.on_frame(packet[3])
+        if trace is not None:
+            trace.record(TraceEvent.FRAME_COMPLETE, packet[3], len(packet))
+        if packet[3] in self.response_cmd:
+            if packet[3] == _SWITCH_COLLECTION: # stream packets after this response belong to the new configuration
+                self.epoch += 1
+            log.debug('to request response queue, cmd = %#x', packet[3])
+            self.CDC_request_response.put(packet)
+            metrics.on_queue('request_response', self.CDC_request_response.qsize())
+        else:
+            timestamp = packet.timestamp
+            metrics.on_stream_frame(packet[3], timestamp)
+            if self.pipeline is not None:
+                packet = self.pipeline(packet)
+                if packet is None: # dropped by stage
+                    return
+                if not isinstance(packet, StampedPacket): # recomposed by stage, keep receive time
+                    packet = StampedPacket(packet, timestamp)
+            packet.epoch = self.epoch
+            if self.frame_bus.subscribers:
+                self.frame_bus.publish(packet)
+            handlers = self.handlers.get(packet[3])
+            if handlers:
+                for handler in handlers:
+                    handler(packet)
+            elif self.queue_response_only and not self.frame_bus.exclusive:
+                log.debug('to response only queue, cmd = %#x', packet[3])
+                self.CDC_response_only.put(packet)
+                metrics.on_queue('response_only', self.CDC_response_only.qsize())
+        if trace is not None:
+            trace.record(TraceEvent.ENQUEUE, packet[3], len(packet))
+
+    def send(self, data:bytes, *, cmd:Optional[int]=None, priority:TxPriority=TxPriority.CONTROL):
+        '''queue data (cdc packet in bytes) to be written to porto by TX thread
 
         Args:
             data (bytes): cdc packet in bytes
             cmd (Optional[int], optional): command of packet. Defaults is None. If cmd is not None, add cmd which need response to Set "response_cmd".
+            priority (TxPriority, optional): CONTROL packets are written before BULK packets. Defaults to CONTROL.
+
+        Raises:
+            Exception: error of porto.send, if an earlier queued packet failed to be written.
         '''
         if cmd is not None:
             self.response_cmd.add(cmd)
-        self.porto.send(data)
+        self.tx.submit(data, cmd, priority)
+
+    def _on_tx_write(self, batch:List[TxItem])->None:
+        '''metrics and trace of packets written by TX thread in one write'''
+        metrics = self.metrics
+        trace = self.trace
+        now = time.perf_counter_ns()
+        metrics.on_tx_write()
+        for data, cmd, priority, enqueued in batch:
+            metrics.on_send(len(data), cmd)
+            metrics.on_tx_delay(priority.name.lower(), (now - enqueued) / 1e9)
+            if trace is not None:
+                trace.record(TraceEvent.TX_WRITE, data[3] if len(data) > 3 else 0, len(data)) # raw bytes may be shorter than a header
+
+    def set_checksum_policy(self, policy:str, *, sample_every:int=16)->None:
+        '''validate checksum of received packets, corrupt packets are dropped and counted in metrics.checksum_errors
+
+        Args:
+            policy (str): 'off' (default), 'sampled' (1 in sample_every packets) or 'full'.
+            sample_every (int, optional): sampling interval of 'sampled'. Defaults to 16.
+        '''
+        self.CDC_collection.set_checksum_policy(policy, sample_every=sample_every)
+
+    def set_idle_strategy(self, mode:str, **kwargs)->IdleStrategy:
+        '''set wait of read loop, CPU use is in `metrics.snapshot()['loop']`
+
+        Args:
+            mode (str): 'busy' (lowest latency, one core busy), 'blocking' (no CPU when idle) or
+                'hybrid' (poll shortly after traffic, then block).
+            **kwargs: spin, block_timeout of IdleStrategy.
+        '''
+        self.idle = IdleStrategy(mode, **kwargs)
+        return self.idle
+
+    def enable_trace(self, capacity:int=1 << 16)->TraceRing:
+        '''enable per-packet trace ring, dump it by `engine.trace.dump(path)`
+
+        Args:
+            capacity (int, optional): number of records kept, must be power of 2. Defaults to 65536.
+        '''
+        if self.trace is None:
+            self.trace = TraceRing(capacity)
+        return self.trace
+
+    def disable_trace(self)->None:
+        '''disable per-packet trace ring'''
+        self.trace = None
+
+    def subscribe(self, *, commands:Optional[Container[int]]=None, from_latest:bool=True,
+                  exclusive:bool=False)->FrameSubscriber:
+        '''subscribe response only packets (e.g. multi results frames), every subscriber reads the same frames
+
+        Args:
+            commands (Optional[Container[int]], optional): only packets of these commands, all if None.
+            from_latest (bool, optional): start after newest frame, False to start from oldest frame kept in bus.
+            exclusive (bool, optional): frames are read by subscribers only (recorder, visualizer, ...), so while an
+                exclusive subscriber is attached no response only packet is put in the unbounded response only queue
+                and recv(response_only=True) gets nothing. Defaults to False, frames are queued for recv too.
+
+        A slow subscriber never blocks engine or other subscribers, it drops its oldest frames instead (see `stats()`).
+        '''
+        return self.frame_bus.subscribe(commands=commands, from_latest=from_latest, exclusive=exclusive)
+
+    def on(self, command:int, handler:Callable[[bytes], Any], *, executor:Optional[Executor]=None)->FrameHandler:
+        '''call handler with every response only packet of command, instead of putting it in response only queue
+
+        Args:
+            command (int): command code, e.g. Command.GET_COLLECTION_OF_MULTI_RESULTS.value.
+            handler (Callable[[bytes], Any]): called with the CDC packet (StampedPacket).
+            executor (Optional[Executor], optional): thread or process pool to run handler, None to run it inline on
+                engine thread (lowest latency, must not block). Defaults to None.
+
+        Returns:
+            FrameHandler: registration, pass to `off` to remove, `stats()` for calls, errors and execution time.
+        '''
+        registration = FrameHandler(command, handler, executor)
+        self.handlers[command] = self.handlers.get(command, []) + [registration] # copy, engine thread may iterate
+        return registration
+
+    def off(self, registration:FrameHandler)->None:
+        '''remove handler registered by `on`, packets of a command without handlers are queued again'''
+        handlers = [handler for handler in self.handlers.get(registration.command, []) if handler is not registration]
+        if handlers:
+            self.handlers[registration.command] = handlers
+        else:
+            self.handlers.pop(registration.command, None)
+
+    def handler_stats(self)->List[Dict[str, Any]]:
+        return [handler.stats() for handlers in list(self.handlers.values()) for handler in handlers]
+
+    def add_stage(self, stage:Callable)->None:
+        '''append receive stage run on multi results packets before they are queued or published
+
+        Args:
+            stage (Callable[[StageFrame], Optional[StageFrame]]): e.g. stages.Decimate, stages.ChirpAverage,
+                returns frame to keep it or None to drop it.
+        '''
+        from .stages import ReceivePipeline
+        if self.pipeline is None:
+            self.pipeline = ReceivePipeline()
+        self.pipeline.stages.append(stage)
+
+    def clear_stages(self)->None:
+        '''remove all receive stages'''
+        self.pipeline = None
+
+    def serve_metrics(self, host:str='127.0.0.1', port:int=9464)->MetricsServer:
+        '''serve engine metrics in Prometheus text format on http://host:port/metrics
+
+        Args:
+            host (str, optional): bind address. Defaults to localhost only.
+            port (int, optional): bind port, 0 for any free port. Defaults to 9464.
+        '''
+        if self.metrics_server is None:
+            self.metrics_server = MetricsServer(self.metrics, host=host, port=port)
+            self.metrics_server.start()
+        return self.metrics_server
 
     def get_recv_queue(self,* ,response_only:bool=False)->Queue:
         '''
@@ -217,17 +476,55 @@ class ThreadServerEngine(Thread):
     def recv(self,* ,response_only:bool=False, time_out:Optional[float]=None)->bytes:
         '''get response cdc packet (bytes)
 
+        Response only packets of a previous collection epoch are dropped, one by one as they are dequeued,
+        so switching collection does not need to drain the queue.
+
         Args:
             response_only (bool, optional): True for response packet only, False for request response packet. Defaults to False.
             time_out (Optional[float], optional): timeout in seconds. If None, wait forever. Defaults to None.
         '''
-        return self.get_recv_queue(response_only=response_only).get(timeout=time_out)
+        queue = self.get_recv_queue(response_only=response_only)
+        if not response_only:
+            try:
+                return queue.get(timeout=time_out)
+            except Empty:
+                self.tx.check() # request was lost in a failed write, raise its error instead of a timeout
+                raise
+        deadline = None if time_out is None else time.monotonic() + time_out
+        while True:
+            packet = queue.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            if getattr(packet, 'epoch', self.epoch) >= self.epoch:
+                return packet
+            self.metrics.on_stale_frame()
+
+    def drop_stale(self)->int:
+        '''drop response only packets of earlier collection epochs from the front of the queue, without waiting
+
+        recv drops them as they are dequeued, this releases them when nobody reads, e.g. after collection is switched off.
+
+        Returns:
+            int: number of packets dropped.
+        '''
+        queue = self.CDC_response_only
+        dropped = 0
+        with queue.mutex: # peek, a packet of the current epoch stays queued
+            while queue.queue and getattr(queue.queue[0], 'epoch', self.epoch) < self.epoch:
+                queue.queue.popleft()
+                dropped += 1
+        self.metrics.on_stale_frame(dropped)
+        return dropped
 
     def stop(self):
         '''stop thread'''
         self.active.clear()
         self.join()
+        self.tx.stop() # queued packets are written before porto closes
         self.porto.close()
+        for subscriber in list(self.frame_bus.subscribers):
+            subscriber.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
     def connect(self, *args, **kwargs):
         '''connect to injected porto'''
         self.porto.connect(*args, **kwargs)
@@ -0,0 +1,114 @@
+import time
+from queue import Empty
+from threading import Condition
+from typing import Any, Optional, Dict, List, Iterator, Container
+
+__all__ = ['FrameBus', 'FrameSubscriber']
+
+class FrameBus:
+    '''Shared ring of frames published by the engine and read by many subscribers.
+
+    Every frame is stored once and handed to each subscriber by reference (bytes are immutable, no copy).
+    Publishing never waits for subscribers: a subscriber lagging more than `capacity` frames loses the
+    oldest ones and counts them as dropped.
+    '''
+    def __init__(self, capacity:int=256):
+        self.capacity = capacity
+        self._slots:List[Optional[bytes]] = [None] * capacity
+        self.head = 0 # sequence number of next published frame
+        self._cond = Condition()
+        self.subscribers:List['FrameSubscriber'] = []
+        self.exclusive = 0 # exclusive subscribers, frames are not queued for recv while any is attached
+
+    def publish(self, frame:bytes)->None:
+        '''store frame and wake up waiting subscribers, called by engine thread'''
+        with self._cond:
+            self._slots[self.head % self.capacity] = frame
+            self.head += 1
+            self._cond.notify_all()
+
+    def subscribe(self, *, commands:Optional[Container[int]]=None, from_latest:bool=True,
+                  exclusive:bool=False)->'FrameSubscriber':
+        '''create subscriber cursor
+
+        Args:
+            commands (Optional[Container[int]], optional): only frames of these commands, all if None.
+            from_latest (bool, optional): start after newest frame, False to start from oldest frame kept in ring.
+            exclusive (bool, optional): frames are consumed by subscribers only, counted in `exclusive`.
+        '''
+        with self._cond:
+            start = self.head if from_latest else max(0, self.head - self.capacity)
+            subscriber = FrameSubscriber(self, start, commands, exclusive)
+            self.subscribers.append(subscriber)
+            self.exclusive += exclusive
+        return subscriber
+
+    def unsubscribe(self, subscriber:'FrameSubscriber')->None:
+        with self._cond:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+                self.exclusive -= subscriber.exclusive
+            self._cond.notify_all()
+
+    def stats(self)->List[Dict[str, Any]]:
+        return [subscriber.stats() for subscriber in list(self.subscribers)]
+
+class FrameSubscriber:
+    '''Cursor of one consumer over FrameBus, use `get` or iterate.'''
+    def __init__(self, bus:FrameBus, start:int, commands:Optional[Container[int]]=None, exclusive:bool=False):
+        self.bus = bus
+        self.cursor = start # sequence number of next frame to read
+        self.commands = commands
+        self.exclusive = exclusive
+        self.received = 0
+        self.dropped = 0 # frames overwritten before read
+        self.closed = False
+
+    @property
+    def lag(self)->int:
+        '''frames published but not read yet'''
+        return self.bus.head - self.cursor
+
+    def get(self, timeout:Optional[float]=None)->bytes:
+        '''get next frame, wait up to timeout seconds (forever if None), raise queue.Empty on timeout'''
+        bus = self.bus
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with bus._cond:
+            while True:
+                if self.closed:
+                    raise Empty('subscriber closed')
+                oldest = bus.head - bus.capacity
+                if self.cursor < oldest: # overwritten by publisher
+                    self.dropped += oldest - self.cursor
+                    self.cursor = oldest
+                if self.cursor < bus.head:
+                    frame = bus._slots[self.cursor % bus.capacity]
+                    self.cursor += 1
+                    if self.commands is not None and frame[3] not in self.commands:
+                        continue
+                    self.received += 1
+                    return frame
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty()
+                bus._cond.wait(remaining)
+
+    def __iter__(self)->Iterator[bytes]:
+        while not self.closed:
+            try:
+                yield self.get()
+            except Empty:
+                return
+
+    def close(self)->None:
+        self.closed = True
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def stats(self)->Dict[str, Any]:
+        return {'received': self.received, 'dropped': self.dropped, 'lag': self.lag}
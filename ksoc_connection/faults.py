@@ -0,0 +1,141 @@
+import random
+import time
+from typing import Any, Union, Optional, Dict, List, Tuple
+
+__all__ = ['FaultyPorto']
+
+_GARBAGE = bytes(b for b in range(256) if b != 0x24) # garbage never contains '$', so it never looks like a start frame
+
+class FaultyPorto:
+    '''Porto wrapper injecting transport faults into received bytes, for framer tests and benchmarks.
+
+    Received bytes are split into CDC packets, each packet may be dropped, duplicated, corrupted (one byte
+    changed) or preceded by garbage, then the stream is handed out in fragments. All other porto methods
+    are passed through. Faults of packets and fragment sizes come from separate generators of one seed,
+    so the faulted packet sequence does not depend on how the inner porto happens to chunk its reads.
+
+    Attributes:
+        delivered (List[bytes]): packets passed on intact, in order, duplicates included (if record).
+        faults (List[Tuple[int, str]]): (stream offset, kind) of every fault, offset counts bytes handed out by recv.
+        stats (Dict[str, int]): packets seen and faults injected per kind.
+    '''
+    def __init__(self, porto:Any, *, seed:Optional[int]=None, fragment:Union[None, int, Tuple[int, int]]=None,
+                 corrupt:float=0.0, drop:float=0.0, duplicate:float=0.0, garbage:float=0.0,
+                 latency:Union[float, Tuple[float, float]]=0.0, record:bool=False):
+        '''
+        Args:
+            porto (Any): wrapped porto (connect/send/recv/close).
+            seed (Optional[int], optional): seed of fault and fragment generators, None for random.
+            fragment (Union[None, int, Tuple[int, int]], optional): bytes per recv, fixed or random in [min, max],
+                None to return what the inner porto read.
+            corrupt (float, optional): probability of a packet having one byte changed.
+            drop (float, optional): probability of a packet being lost.
+            duplicate (float, optional): probability of a packet being sent twice.
+            garbage (float, optional): probability of 1 to 16 garbage bytes in front of a packet.
+            latency (Union[float, Tuple[float, float]], optional): seconds added to every non-empty recv, fixed or random in [min, max].
+            record (bool, optional): keep delivered packets, for comparing with framer output.
+        '''
+        self.porto = porto
+        self.random = random.Random(seed)
+        self.fragment_random = random.Random(self.random.random())
+        self.fragment = fragment
+        self.corrupt = corrupt
+        self.drop = drop
+        self.duplicate = duplicate
+        self.garbage = garbage
+        self.latency = latency
+        self.delivered:Optional[List[bytes]] = [] if record else None
+        self.faults:List[Tuple[int, str]] = []
+        self.stats:Dict[str, int] = {'packets': 0, 'dropped': 0, 'duplicated': 0, 'corrupted': 0, 'garbage': 0}
+        self.offset = 0 # bytes handed out by recv
+        self._pending = bytearray() # received bytes not split into packets yet
+        self._out = bytearray() # faulted bytes waiting to be handed out
+
+    def __getattr__(self, name:str)->Any:
+        if name == 'porto': # not set yet, e.g. while unpickling
+            raise AttributeError(name)
+        return getattr(self.porto, name)
+
+    def connect(self, *args, **kwargs):
+        return self.porto.connect(*args, **kwargs)
+
+    def send(self, data:bytes):
+        return self.porto.send(data)
+
+    def close(self):
+        return self.porto.close()
+
+    def recv(self, size:int=4096, time_out:Optional[float]=None)->bytes:
+        if not self._out:
+            data = self.porto.recv(size, time_out)
+            if data:
+                self.feed(data)
+            if not self._out:
+                return b''
+        latency = self._draw(self.latency)
+        if latency:
+            time.sleep(latency)
+        fragment = self._draw(self.fragment) if self.fragment is not None else len(self._out)
+        data = bytes(self._out[:min(fragment, size)])
+        del self._out[:len(data)]
+        self.offset += len(data)
+        return data
+
+    def _draw(self, value:Union[int, float, Tuple[Any, Any]])->Any:
+        if not isinstance(value, tuple):
+            return value
+        low, high = value
+        if isinstance(low, int) and isinstance(high, int):
+            return self.fragment_random.randint(low, high)
+        return self.fragment_random.uniform(low, high)
+
+    def feed(self, data:bytes)->None:
+        '''split data into packets and queue them with faults, bytes outside packets are passed on unchanged'''
+        pending = self._pending
+        pending += data
+        while True:
+            start = pending.find(b'$K<')
+            if start == -1:
+                keep = 2 if pending.endswith(b'$K') else 1 if pending.endswith(b'$') else 0
+                self._out += pending[:len(pending) - keep]
+                del pending[:len(pending) - keep]
+                return
+            if start:
+                self._out += pending[:start]
+                del pending[:start]
+            if len(pending) < 7:
+                return
+            end = 8 + int.from_bytes(pending[5:7], byteorder='big')
+            if len(pending) < end:
+                return
+            packet = bytes(pending[:end])
+            del pending[:end]
+            self._inject(packet)
+
+    def _fault(self, kind:str)->None:
+        self.stats[kind] += 1
+        self.faults.append((self.offset + len(self._out), kind))
+
+    def _inject(self, packet:bytes)->None:
+        rng = self.random
+        self.stats['packets'] += 1
+        if rng.random() < self.drop:
+            self._fault('dropped')
+            return
+        if rng.random() < self.garbage:
+            self._fault('garbage')
+            self._out += bytes(rng.choice(_GARBAGE) for _ in range(rng.randint(1, 16)))
+        copies = 1
+        if rng.random() < self.duplicate:
+            self.stats['duplicated'] += 1 # a duplicate is a valid packet, not a fault of the framer
+            copies = 2
+        for _ in range(copies):
+            if rng.random() < self.corrupt:
+                self._fault('corrupted')
+                corrupted = bytearray(packet)
+                corrupted[rng.randrange(len(corrupted))] ^= rng.randint(1, 255)
+                self._out += corrupted
+                continue
+            self._out += packet
+            if self.delivered is not None:
+                self.delivered.append(packet)
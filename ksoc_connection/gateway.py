@@ -0,0 +1,281 @@
+import socket
+import time
+from queue import Empty
+from threading import Thread, Lock, Event
+from typing import Any, Optional, Dict, List, Set, Tuple
+from .connection import KKTConnection
+from .fanout import FrameSubscriber
+from .packet import Command, Direction, Packet
+from .logger import log
+
+__all__ = ['KKTGateway', 'split_requests']
+
+MULTI_RESULTS = Command.GET_COLLECTION_OF_MULTI_RESULTS.value
+SWITCH_COLLECTION = Command.SWITCH_COLLECTION_OF_MULTI_RESULTS.value
+
+def split_requests(buffer:bytes)->Tuple[List[bytes], bytes]:
+    '''split CDC request packets ($K>) out of received bytes
+
+    Returns:
+        Tuple[List[bytes], bytes]: complete packets, and remaining bytes of an incomplete packet.
+    '''
+    packets = []
+    start = 0
+    while True:
+        offset = buffer.find(b'$K>', start)
+        if offset == -1:
+            return packets, buffer[len(buffer) - 2:] if buffer.endswith(b'$K') else b''
+        if offset > start:
+            log.debug('gateway drop %d bytes in front of start frame', offset - start)
+        if len(buffer) - offset < 7:
+            return packets, buffer[offset:]
+        end = offset + 8 + int.from_bytes(buffer[offset + 5:offset + 7], byteorder='big')
+        if len(buffer) < end:
+            return packets, buffer[offset:]
+        packets.append(buffer[offset:end])
+        start = end
+
+class GatewayClient:
+    '''One TCP client of KKTGateway, a reader thread for requests and a sender thread for frames.'''
+    def __init__(self, gateway:'KKTGateway', sock:socket.socket, address:Tuple[str, int]):
+        self.gateway = gateway
+        self.sock = sock
+        self.address = address
+        self.write_lock = Lock() # responses (reader thread) and frames (sender thread) share the socket
+        self.subscriber:Optional[FrameSubscriber] = None
+        self.closed = False
+        self.requests = 0
+        self.frames_sent = 0
+        self.dropped = 0 # frames dropped by closed subscribers, see stats
+        self.reader = Thread(target=self._read, daemon=True)
+
+    def start(self):
+        self.reader.start()
+
+    def write(self, data:bytes)->None:
+        with self.write_lock:
+            self.sock.sendall(data)
+
+    def _read(self):
+        buffer = b''
+        try:
+            while not self.closed:
+                try:
+                    data = self.sock.recv(4096)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                packets, buffer = split_requests(buffer + data)
+                for packet in packets:
+                    self._request(packet)
+        except OSError as error:
+            if not self.closed:
+                log.warning(f'gateway client {self.address}: {error}')
+        self.close()
+
+    def _request(self, packet:bytes)->None:
+        self.requests += 1
+        if packet[3] == SWITCH_COLLECTION and len(packet) >= 12:
+            response = self.gateway.switch(self, packet)
+        else:
+            response = self.gateway.request(packet)
+        if response is not None:
+            self.write(response)
+
+    def subscribe(self)->None:
+        if self.subscriber is None:
+            self.subscriber = self.gateway.engine.subscribe(commands={MULTI_RESULTS})
+            Thread(target=self._send_frames, args=(self.subscriber,), daemon=True).start()
+
+    def unsubscribe(self)->None:
+        subscriber, self.subscriber = self.subscriber, None
+        if subscriber is not None:
+            subscriber.close()
+            self.dropped += subscriber.dropped
+
+    def _send_frames(self, subscriber:FrameSubscriber):
+        '''multicast frames to this client, a slow client only loses its own oldest frames (subscriber.dropped)'''
+        batch_size = self.gateway.batch_size
+        try:
+            while not subscriber.closed:
+                try:
+                    frames = [subscriber.get(timeout=0.5)]
+                except Empty:
+                    continue
+                while len(frames) < batch_size and subscriber.lag: # send queued frames in one write
+                    try:
+                        frames.append(subscriber.get(timeout=0))
+                    except Empty:
+                        break
+                self.write(b''.join(frames))
+                self.frames_sent += len(frames)
+        except OSError as error:
+            if not self.closed:
+                log.warning(f'gateway client {self.address} too slow or gone: {error}')
+                self.close()
+
+    def close(self)->None:
+        if self.closed:
+            return
+        self.closed = True
+        self.gateway.release(self)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.gateway.remove(self)
+        log.info(f'gateway client {self.address} disconnected')
+
+    def stats(self)->Dict[str, Any]:
+        subscriber = self.subscriber
+        return {'address': self.address, 'requests': self.requests, 'frames_sent': self.frames_sent,
+                'dropped': self.dropped + (subscriber.dropped if subscriber is not None else 0),
+                'lag': subscriber.lag if subscriber is not None else 0}
+
+class KKTGateway(Thread):
+    '''Share one connected KKT device with many TCP clients speaking CDC framing (e.g. KKTWIFIConnection).
+
+    Requests of all clients are serialized on the device, each response goes back to the requesting client only.
+    MULTI_RESULTS frames are multicast to every client which switched collection on (actions != 0), through
+    the engine FrameBus, so a slow client drops its own oldest frames and never stalls the device or other
+    clients. Collection settings are device-wide, the last switch request wins. Switching off (actions == 0)
+    only reaches the device when the last streaming client leaves, the others keep their frames.
+    '''
+    def __init__(self, connection:KKTConnection, host:str='127.0.0.1', port:int=7000, *,
+                 send_timeout:float=5.0, response_timeout:float=5.0, batch_size:int=16):
+        '''
+        Args:
+            connection (KKTConnection): connected device, owned by gateway while it runs.
+            host (str, optional): bind address. Defaults to localhost only.
+            port (int, optional): bind port, 0 for any free port. Defaults to 7000.
+            send_timeout (float, optional): client not accepting data for this many seconds is disconnected. Defaults to 5.
+            response_timeout (float, optional): seconds to wait for device response of a request. Defaults to 5.
+            batch_size (int, optional): max frames sent to a client in one write. Defaults to 16.
+        '''
+        super().__init__(daemon=True)
+        self.connection = connection
+        self.engine = connection.engine
+        self.send_timeout = send_timeout
+        self.response_timeout = response_timeout
+        self.batch_size = batch_size
+        self.clients:List[GatewayClient] = []
+        self.streaming:Set[GatewayClient] = set() # clients which switched collection on, guarded by device_lock
+        self.device_lock = Lock() # one request in flight on device
+        self.active = Event()
+        self.requests = 0
+        self.timeouts = 0
+        self._queue_response_only = self.engine.queue_response_only # restored by stop
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.5)
+
+    @property
+    def address(self)->Tuple[str, int]:
+        '''bound (host, port), useful when port=0'''
+        return self.server.getsockname()[:2]
+
+    def start(self):
+        '''start accepting clients'''
+        self.active.set()
+        self._queue_response_only = self.engine.queue_response_only
+        self.engine.queue_response_only = False # frames are consumed by clients through frame bus only
+        super().start()
+
+    def run(self):
+        log.info(f'gateway listen on {self.address}')
+        while self.active.is_set():
+            try:
+                sock, address = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError: # server closed by stop
+                break
+            sock.settimeout(self.send_timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = GatewayClient(self, sock, address[:2])
+            self.clients.append(client)
+            client.start()
+            log.info(f'gateway client {client.address} connected')
+
+    def request(self, packet:bytes)->Optional[bytes]:
+        '''send request of a client to device and wait for its response, None if device did not answer'''
+        with self.device_lock:
+            return self._request(packet)
+
+    def _request(self, packet:bytes)->Optional[bytes]:
+        '''send packet to device and wait for its response, called with device_lock held'''
+        command = packet[3]
+        self.requests += 1
+        queue = self.engine.get_recv_queue(response_only=False)
+        self.engine.send(packet, cmd=command)
+        deadline = time.monotonic() + self.response_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                response = queue.get(timeout=max(remaining, 0))
+            except Empty:
+                self.timeouts += 1
+                log.warning('gateway: no response of command %#x', command)
+                return None
+            if response[3] == command:
+                return response
+            log.debug('gateway drop stale response of command %#x', response[3]) # answer of a timed out request
+
+    def switch(self, client:GatewayClient, packet:bytes)->Optional[bytes]:
+        '''collection switch request of a client, reference counted over streaming clients
+
+        Switching on is always sent to the device (last setting wins). Switching off is sent only by the last
+        streaming client, the others get a response composed here and the device keeps streaming.
+        '''
+        with self.device_lock:
+            if int.from_bytes(packet[8:12], byteorder='big'):
+                client.subscribe()
+                self.streaming.add(client)
+                return self._request(packet)
+            client.unsubscribe()
+            self.streaming.discard(client)
+            if self.streaming:
+                log.debug('gateway keep collection on for %d clients', len(self.streaming))
+                response = Packet(Direction.RESPONSE.value, SWITCH_COLLECTION, len(packet) - 8, packet[7:-1])
+                response.update_checksum() # device echoes the switch payload
+                return bytes(response.CDC_packet)
+            return self._request(packet)
+
+    def release(self, client:GatewayClient)->None:
+        '''drop subscription of a closed client, switch collection off if it was the last streaming client'''
+        with self.device_lock:
+            client.unsubscribe()
+            if client not in self.streaming:
+                return
+            self.streaming.discard(client)
+            if self.streaming:
+                return
+            request = Packet(Direction.REQUEST.value, SWITCH_COLLECTION, 5, bytes(5))
+            request.update_checksum()
+            self._request(bytes(request.CDC_packet))
+
+    def remove(self, client:GatewayClient)->None:
+        if client in self.clients:
+            self.clients.remove(client)
+
+    def stats(self)->Dict[str, Any]:
+        return {'requests': self.requests, 'timeouts': self.timeouts,
+                'clients': [client.stats() for client in list(self.clients)]}
+
+    def stop(self):
+        '''disconnect clients and stop accepting, the device connection stays open'''
+        self.active.clear()
+        self.server.close()
+        if self.is_alive():
+            self.join()
+        for client in list(self.clients):
+            client.close()
+        self.engine.queue_response_only = self._queue_response_only
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
@@ -0,0 +1,43 @@
+import time
+
+__all__ = ['IdleStrategy', 'IDLE_MODES']
+
+IDLE_MODES = ('busy', 'blocking', 'hybrid')
+
+class IdleStrategy:
+    '''Wait of engine read loop, the time_out given to every porto.recv.
+
+    busy: poll without waiting, lowest wake-up latency, but one core is busy even when idle.
+    blocking: wait in porto up to block_timeout, no CPU when idle, wake-up latency of the porto wait
+        (select for TCP, condition for simulator, 1 ms comm timeout for the serial port).
+    hybrid: poll for `spin` seconds after the last received bytes, then block, so back-to-back packets
+        of a stream are picked up at once and an idle link costs no CPU.
+    '''
+    def __init__(self, mode:str='blocking', *, spin:float=0.002, block_timeout:float=0.1):
+        '''
+        Args:
+            mode (str, optional): 'busy', 'blocking' or 'hybrid'. Defaults to 'blocking'.
+            spin (float, optional): seconds of polling after traffic in hybrid mode. Defaults to 0.002.
+            block_timeout (float, optional): max seconds of a blocking read, bounds engine stop time. Defaults to 0.1.
+        '''
+        assert mode in IDLE_MODES, f'mode must be one of {IDLE_MODES}, but got {mode}'
+        self.mode = mode
+        self.spin = spin
+        self.block_timeout = block_timeout
+        self._last = 0.0 # time.monotonic() of last non-empty read
+
+    def timeout(self)->float:
+        '''time_out of next porto.recv, 0 to poll'''
+        if self.mode == 'busy':
+            return 0
+        if self.mode == 'hybrid' and time.monotonic() - self._last < self.spin:
+            return 0
+        return self.block_timeout
+
+    def on_traffic(self)->None:
+        '''called after a non-empty read'''
+        if self.mode == 'hybrid':
+            self._last = time.monotonic()
+
+    def __repr__(self)->str:
+        return f'IdleStrategy({self.mode!r}, spin={self.spin}, block_timeout={self.block_timeout})'
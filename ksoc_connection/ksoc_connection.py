@@ -1,9 +1,20 @@
 import time
+from contextlib import contextmanager
 from enum import Enum
-from typing import Any, Union, Optional, Tuple, Dict, Callable, TypeVar, Generic, Type, cast, NewType, Sequence
-from .packet import Packet, Command, Direction, get_CDC_packet
-from .connection import KKTVComPortConnection,KKTWIFIConnection, KKTConnection
+from typing import TYPE_CHECKING, Any, Union, Optional, Tuple, Dict, Callable, TypeVar, Generic, Type, cast, NewType, Sequence, Iterable, Iterator, List, Mapping
+from .packet import Packet, Command, Direction, get_CDC_packet, parse_multi_results
+from .connection import KKTVComPortConnection,KKTWIFIConnection, KKTConnection, KKTConnectionException
 from .logger import log
+from .trace import TraceEvent
+from .tx import TxPriority
+from .registers import RegisterCache
+from .profile import RegisterProfile, ProfileResult
+if TYPE_CHECKING:
+    import numpy as np
+    from .subscription import RegisterSubscription, RegisterSeries
+    from .burst import BurstTiming
+
+REG_ADDRESS_ACTION = 2 # action number of register values block in multi results (actions bit 0b100)
 
 class KKTClassStatus(Enum):
     KKT_SUCCESS = 0
@@ -59,8 +70,13 @@ class KKTClassStatus(Enum):
 
 class KKTIntegration:
     '''API layer for KKT device.'''
+    max_registers_per_packet = 64 # registers packed in one bulk read/write request
     def __init__(self, connection:KKTConnection):
         self.connection = connection
+        self.register_cache:Optional[RegisterCache] = None # shadow registers, see enableRegisterCache
+        self.register_subscription:Optional['RegisterSubscription'] = None # registers read out with every frame
+        self.collection_config:Dict[str, Any] = {'actions': 0} # last switchCollectionOfMultiResults arguments
+        self.collection_reg_address:List[int] = [] # reg_address list sent to device, order of register block
 
     def __enter__(self):
         return self
@@ -79,6 +95,7 @@ class KKTIntegration:
             log.warning(e)
             return KKTClassStatus.KKT_ERROR_DRIVER_INIT_FAILED
 
+        self.invalidateRegisterCache() # device may be reset or replaced
         self.switchSPIChannel(1)
 
         return KKTClassStatus.KKT_SUCCESS
@@ -109,7 +126,9 @@ class KKTIntegration:
 
         request = Packet(direction=direction.decode(), command=int.from_bytes(command, byteorder='big'),
                          payload_length=int.from_bytes(payload_len, byteorder='big'), payload=payload)
-        response = self.connection.sendCDCPacketWithResponse(request)
+        if request.command in (Command.REG_WRITE.value, Command.REG_WRITE_COMPARE.value):
+            self.invalidateRegisterCache() # registers written behind the cache
+        response = self.connection.sendCDCPacketWithResponse(request, priority=TxPriority.BULK)
         if response.command != request.command:
             return KKTClassStatus.KKT_ERROR_REQUEST_FAILED, b''
         return KKTClassStatus.KKT_SUCCESS, response.CDC_packet
@@ -165,6 +184,7 @@ class KKTIntegration:
         request = Packet(direction=Direction.REQUEST.value, command=Command.SET_POWER_SAVING_MODE.value, payload_length=1, payload=bytes([mode]), checksum=0xF7)
         request.update_checksum()
         response = self.connection.sendCDCPacketWithResponse(request)
+        self.invalidateRegisterCache() # power mode change may reload registers
         if response.command != request.command:
             return KKTClassStatus.KKT_ERROR_REQUEST_FAILED
         return KKTClassStatus.KKT_SUCCESS
@@ -212,7 +232,14 @@ class KKTIntegration:
             Tuple[KKTClassStatus, int]: KKTClassStatus, register value
 
             register value will be 4 bytes like 0x0000_0000
+            If register cache is enabled, non-volatile cached value is returned without request.
         '''
+        cache = self.register_cache
+        if cache is not None and not cache.is_volatile(addr):
+            value = cache.get(addr)
+            if value is not None:
+                return KKTClassStatus.KKT_SUCCESS, value
+
         payload = bytearray(8)
         payload[:4] = addr.to_bytes(4, byteorder='big') # register address
         payload[4:] = 0x01.to_bytes(4, byteorder='big') # number of register to read
@@ -221,7 +248,10 @@ class KKTIntegration:
         response = self.connection.sendCDCPacketWithResponse(request)
         if response.command != request.command:
             return KKTClassStatus.KKT_ERROR_REQUEST_FAILED, 0
-        return KKTClassStatus.KKT_SUCCESS, int.from_bytes(response.payload, byteorder='big')
+        value = int.from_bytes(response.payload, byteorder='big')
+        if cache is not None:
+            cache.update(addr, value)
+        return KKTClassStatus.KKT_SUCCESS, value
 
     def writeHWRegister(self, addr:int, value:int)->KKTClassStatus:
         '''Write hardware register.
@@ -235,9 +265,272 @@ class KKTIntegration:
         request = Packet(direction=Direction.REQUEST.value, command=Command.REG_WRITE.value, payload_length=8, payload=addr.to_bytes(4, byteorder='little') + value.to_bytes(4, byteorder='little'), checksum=0xF7)
         response = self.connection.sendCDCPacketWithResponse(request)
         if response.command != request.command:
+            if self.register_cache is not None:
+                self.register_cache.invalidate(addr)
             return KKTClassStatus.KKT_ERROR_REQUEST_FAILED
+        if self.register_cache is not None:
+            self.register_cache.update(addr, value)
         return KKTClassStatus.KKT_SUCCESS
 
+    def readHWRegisters(self, addr:int, count:int)->Tuple[KKTClassStatus, List[int]]:
+        '''Read contiguous hardware registers in bulk.
+
+        Args:
+            addr (int): Start register address.
+            count (int): Number of registers, read in packets of `max_registers_per_packet` registers.
+
+        Returns:
+            Tuple[KKTClassStatus, List[int]]: KKTClassStatus, register values of addr, addr+4, ...
+        '''
+        values:List[int] = []
+        for first in range(0, count, self.max_registers_per_packet):
+            n = min(self.max_registers_per_packet, count - first)
+            payload = (addr + 4 * first).to_bytes(4, byteorder='big') + n.to_bytes(4, byteorder='big')
+            request = Packet(direction=Direction.REQUEST.value, command=Command.REG_READ.value, payload_length=8, payload=payload)
+            response = self.connection.sendCDCPacketWithResponse(request, priority=TxPriority.BULK)
+            if response.command != request.command or response.payload_length != 4 * n:
+                return KKTClassStatus.KKT_ERROR_REQUEST_FAILED, values
+            values.extend(int.from_bytes(response.payload[4*i:4*i+4], byteorder='big') for i in range(n))
+
+        if self.register_cache is not None:
+            for i, value in enumerate(values):
+                self.register_cache.update(addr + 4 * i, value)
+        return KKTClassStatus.KKT_SUCCESS, values
+
+    def writeHWRegisters(self, values:Union[Mapping[int, int], Sequence[Tuple[int, int]]])->KKTClassStatus:
+        '''Write many hardware registers, packed `max_registers_per_packet` registers per request.
+
+        Args:
+            values (Union[Mapping[int, int], Sequence[Tuple[int, int]]]): address -> value, or (address, value) pairs in write order.
+        '''
+        status, _, _ = self._writeRegisterBatches(Command.REG_WRITE.value, values, cache=self.register_cache)
+        return status
+
+    def writeHWRegistersCompare(self, values:Union[Mapping[int, int], Sequence[Tuple[int, int]]])->Tuple[KKTClassStatus, List[int]]:
+        '''Write many hardware registers by REG_WRITE_COMPARE, device reads back and compares every register.
+
+        Response payload of REG_WRITE_COMPARE carries one status byte per register in request order, 0 for equal.
+
+        Args:
+            values (Union[Mapping[int, int], Sequence[Tuple[int, int]]]): address -> value, or (address, value) pairs in write order.
+
+        Returns:
+            Tuple[KKTClassStatus, List[int]]: KKTClassStatus (KKT_ERROR_COMPARE_ERROR if any differs), mismatched addresses
+        '''
+        status, mismatched, _ = self._writeRegisterBatches(Command.REG_WRITE_COMPARE.value, values, cache=self.register_cache)
+        return status, mismatched
+
+    def _writeRegisterBatches(self, command:int, values:Union[Mapping[int, int], Sequence[Tuple[int, int]]], *,
+                              width:int=4, cache:Optional[RegisterCache]=None)->Tuple[KKTClassStatus, List[int], int]:
+        '''write (address, value) pairs of `width` bytes each by a write or write-compare command,
+        return status, mismatched addresses, round trips'''
+        pairs = list(values.items()) if isinstance(values, Mapping) else list(values)
+        compare = command in (Command.REG_WRITE_COMPARE.value, Command.RFIC_REG_WRITE_COMPARE.value)
+        mismatched:List[int] = []
+        round_trips = 0
+        for first in range(0, len(pairs), self.max_registers_per_packet):
+            batch = pairs[first:first + self.max_registers_per_packet]
+            payload = b''.join(addr.to_bytes(width, byteorder='little') + value.to_bytes(width, byteorder='little') for addr, value in batch)
+            request = Packet(direction=Direction.REQUEST.value, command=command, payload_length=len(payload), payload=payload)
+            response = self.connection.sendCDCPacketWithResponse(request, priority=TxPriority.BULK)
+            round_trips += 1
+            if response.command != request.command:
+                if cache is not None:
+                    for addr, _ in batch:
+                        cache.invalidate(addr)
+                return KKTClassStatus.KKT_ERROR_REQUEST_FAILED, mismatched, round_trips
+            for i, (addr, value) in enumerate(batch):
+                if compare and (i >= response.payload_length or response.payload[i] != 0):
+                    mismatched.append(addr)
+                    if cache is not None:
+                        cache.invalidate(addr)
+                elif cache is not None:
+                    cache.update(addr, value)
+        if mismatched:
+            return KKTClassStatus.KKT_ERROR_COMPARE_ERROR, mismatched, round_trips
+        return KKTClassStatus.KKT_SUCCESS, mismatched, round_trips
+
+    def readRFICRegisters(self, addrs:Sequence[int])->Tuple[KKTClassStatus, Dict[int, int]]:
+        '''Read RFIC registers in bulk, `max_registers_per_packet` addresses per RFIC_REG_READ request.
+
+        RFIC address and value are 2 bytes little-endian. Request payload is the address list, response
+        payload is the values in the same order.
+
+        Args:
+            addrs (Sequence[int]): RFIC register addresses, need not be contiguous.
+
+        Returns:
+            Tuple[KKTClassStatus, Dict[int, int]]: KKTClassStatus, address -> value
+        '''
+        values:Dict[int, int] = {}
+        for first in range(0, len(addrs), self.max_registers_per_packet):
+            batch = addrs[first:first + self.max_registers_per_packet]
+            payload = b''.join(addr.to_bytes(2, byteorder='little') for addr in batch)
+            request = Packet(direction=Direction.REQUEST.value, command=Command.RFIC_REG_READ.value, payload_length=len(payload), payload=payload)
+            response = self.connection.sendCDCPacketWithResponse(request, priority=TxPriority.BULK)
+            if response.command != request.command or response.payload_length != len(payload):
+                return KKTClassStatus.KKT_ERROR_REQUEST_FAILED, values
+            for i, addr in enumerate(batch):
+                values[addr] = int.from_bytes(response.payload[2*i:2*i+2], byteorder='little')
+        return KKTClassStatus.KKT_SUCCESS, values
+
+    def readRFICRegister(self, addr:int)->Tuple[KKTClassStatus, int]:
+        '''Read RFIC register.
+
+        Args:
+            addr (int): RFIC register address.
+
+        Returns:
+            Tuple[KKTClassStatus, int]: KKTClassStatus, register value (2 bytes)
+        '''
+        status, values = self.readRFICRegisters([addr])
+        return status, values.get(addr, 0)
+
+    def writeRFICRegisters(self, values:Union[Mapping[int, int], Sequence[Tuple[int, int]]], *, verify:bool=True)->Tuple[KKTClassStatus, List[int]]:
+        '''Write RFIC registers in bulk, `max_registers_per_packet` registers per request.
+
+        With verify, RFIC_REG_WRITE_COMPARE makes the device read back and compare every register, so no extra
+        read round trip is needed. Its response payload carries one status byte per register, 0 for equal.
+
+        Args:
+            values (Union[Mapping[int, int], Sequence[Tuple[int, int]]]): address -> value, or (address, value) pairs in write order.
+            verify (bool, optional): compare on device by RFIC_REG_WRITE_COMPARE. Defaults to True.
+
+        Returns:
+            Tuple[KKTClassStatus, List[int]]: KKTClassStatus (KKT_ERROR_COMPARE_ERROR if any differs), mismatched addresses
+        '''
+        command = Command.RFIC_REG_WRITE_COMPARE.value if verify else Command.RFIC_REG_WRITE.value
+        status, mismatched, _ = self._writeRegisterBatches(command, values, width=2)
+        return status, mismatched
+
+    def writeRFICRegister(self, addr:int, value:int, *, verify:bool=True)->KKTClassStatus:
+        '''Write RFIC register.
+
+        Args:
+            addr (int): RFIC register address.
+            value (int): Register value (2 bytes).
+            verify (bool, optional): compare on device by RFIC_REG_WRITE_COMPARE. Defaults to True.
+        '''
+        status, _ = self.writeRFICRegisters([(addr, value)], verify=verify)
+        return status
+
+    def subscribeRegisters(self, addrs:Iterable[int], *, capacity:int=1024)->'RegisterSubscription':
+        '''Subscribe registers read out by device with every MULTI_RESULTS frame instead of polling readHWRegister.
+
+        Values are decoded by getMultiResults into per-register NumPy rings (`getRegisterSeries`).
+        If collection is on, it is reconfigured with the new reg_address list.
+
+        Args:
+            addrs (Iterable[int]): register addresses.
+            capacity (int, optional): values kept per register. Defaults to 1024.
+        '''
+        if self.register_subscription is None:
+            from .subscription import RegisterSubscription
+            self.register_subscription = RegisterSubscription(capacity)
+        if self.register_subscription.add(addrs):
+            self._reconfigureCollection()
+        return self.register_subscription
+
+    def unsubscribeRegisters(self, addrs:Optional[Iterable[int]]=None)->None:
+        '''Unsubscribe registers, all if addrs is None, and reconfigure collection if it is on.'''
+        if self.register_subscription is None:
+            return
+        if self.register_subscription.remove(self.register_subscription.addresses if addrs is None else addrs):
+            self._reconfigureCollection()
+
+    def getRegisterSeries(self, addr:int)->'RegisterSeries':
+        '''Get time series of subscribed register, `values`, `frames` and `timestamps` are NumPy arrays.'''
+        assert self.register_subscription is not None and addr in self.register_subscription.series, f'{hex(addr)} is not subscribed'
+        return self.register_subscription.series[addr]
+
+    def _reconfigureCollection(self)->KKTClassStatus:
+        '''re-send last collection config so device picks up subscription changes'''
+        if not self.collection_config['actions']:
+            return KKTClassStatus.KKT_SUCCESS
+        return self.switchCollectionOfMultiResults(**self.collection_config)
+
+    def applyRegisterProfile(self, profile:Union[RegisterProfile, Mapping[int, int], str], *, verify:bool=False, max_gap:int=8)->Tuple[KKTClassStatus, ProfileResult]:
+        '''Apply register profile with the minimum number of round trips.
+
+        Current values are taken from register cache (if enabled) or read back in bulk, then only the registers
+        whose value differs from the profile are written, packed in batches.
+
+        Args:
+            profile (Union[RegisterProfile, Mapping[int, int], str]): profile object, address -> value mapping or profile file path.
+            verify (bool, optional): write by REG_WRITE_COMPARE so device verifies every written register. Defaults to False.
+            max_gap (int, optional): unneeded registers allowed between two profile registers to read them in one request.
+
+        Returns:
+            Tuple[KKTClassStatus, ProfileResult]: KKTClassStatus, written/mismatched registers and round trips
+        '''
+        if isinstance(profile, str):
+            profile = RegisterProfile.load(profile)
+        elif not isinstance(profile, RegisterProfile):
+            profile = RegisterProfile(profile)
+        result = ProfileResult()
+        cache = self.register_cache
+
+        current:Dict[int, int] = {}
+        runs:List[List[int]] = [] # [start address, number of registers] to read
+        for addr in profile:
+            if cache is not None and not cache.is_volatile(addr):
+                value = cache.get(addr)
+                if value is not None:
+                    current[addr] = value
+                    continue
+            if runs and addr - (runs[-1][0] + 4 * runs[-1][1]) <= 4 * max_gap \
+                    and (addr - runs[-1][0]) // 4 < self.max_registers_per_packet:
+                runs[-1][1] = (addr - runs[-1][0]) // 4 + 1
+            else:
+                runs.append([addr, 1])
+
+        for start, count in runs:
+            status, values = self.readHWRegisters(start, count)
+            result.round_trips += 1
+            if status != KKTClassStatus.KKT_SUCCESS:
+                return status, result
+            for i, value in enumerate(values):
+                current[start + 4 * i] = value
+
+        for addr in profile:
+            target = profile.apply_to(addr, current[addr])
+            if target != current[addr]:
+                result.written[addr] = target
+        log.info('apply %s: %d of %d registers changed', profile, len(result.written), len(profile))
+        if not result.written:
+            return KKTClassStatus.KKT_SUCCESS, result
+
+        command = Command.REG_WRITE_COMPARE.value if verify else Command.REG_WRITE.value
+        status, result.mismatched, round_trips = self._writeRegisterBatches(command, result.written, cache=cache)
+        result.round_trips += round_trips
+        return status, result
+
+    def enableRegisterCache(self, volatile:Iterable[Tuple[int, int]]=())->RegisterCache:
+        '''Enable shadow register cache for readHWRegister/writeHWRegister.
+
+        Args:
+            volatile (Iterable[Tuple[int, int]], optional): address ranges (start, end) always read from device,
+                e.g. status or interrupt registers. More ranges can be added by `register_cache.mark_volatile`.
+
+        Returns:
+            RegisterCache: cache object, `stats()` for hit/miss counters.
+        '''
+        if self.register_cache is None:
+            self.register_cache = RegisterCache(volatile)
+        else:
+            for start, end in volatile:
+                self.register_cache.mark_volatile(start, end)
+        return self.register_cache
+
+    def disableRegisterCache(self)->None:
+        '''Disable shadow register cache, every read goes to device.'''
+        self.register_cache = None
+
+    def invalidateRegisterCache(self, start:Optional[int]=None, end:Optional[int]=None)->None:
+        '''Drop cached register values, all if start is None, else range [start, end) or a single register.'''
+        if self.register_cache is not None:
+            self.register_cache.invalidate(start, end)
+
     def switchCollectionOfMultiResults(self,
                                        actions:int,
                                        *,
@@ -261,7 +554,16 @@ class KKTIntegration:
             ch_of_RBank (int): channel of RBank, pull up bit for RX(0b000)
             reg_address (Optional[Sequence[int]], optional): list of register address.
             frame_setting (int, optional): frame for sniff mode buffered.
+
+            Subscribed registers (subscribeRegisters) are appended to reg_address while collection is on.
         '''
+        config = dict(actions=actions, read_interrupt=read_interrupt, clear_interrupt=clear_interrupt, raw_size=raw_size,
+                      ch_of_RBank=ch_of_RBank, reg_address=list(reg_address or []), frame_setting=frame_setting)
+        reg_address = list(reg_address or []) if actions & 0b100 else []
+        if actions and self.register_subscription is not None and self.register_subscription.addresses:
+            reg_address += [addr for addr in self.register_subscription.addresses if addr not in reg_address]
+            actions |= 0b100
+
         payload_length = 5
         if actions & 0b1 == 1:
             payload_length += 2
@@ -302,43 +604,117 @@ class KKTIntegration:
         response = self.connection.sendCDCPacketWithResponse(request)
         if response.command != request.command:
             return KKTClassStatus.KKT_ERROR_REQUEST_FAILED
+        self.collection_config = config
+        self.collection_reg_address = reg_address
+        # frames of the previous setting still queued are of an older epoch, getMultiResults drops them
+        if not actions: # nobody reads them any more, release them now
+            self.connection.engine.drop_stale()
+        return KKTClassStatus.KKT_SUCCESS
 
-        if actions == 0: # clear queue
-            q = self.connection.getQueue(recv_only=True)
-            self.connection.clearQueue(q=q)
+    @property
+    def collection_epoch(self)->int:
+        '''Epoch of current collection setting, advanced by every switchCollectionOfMultiResults.'''
+        return self.connection.engine.epoch
 
-        return KKTClassStatus.KKT_SUCCESS
+    @contextmanager
+    def collection_session(self, config:Mapping[str, Any])->Iterator[int]:
+        '''Collect with config inside the with block, then switch back to the previous setting.
+
+        Each switch is one round trip, the device goes from one setting to the next without being stopped,
+        frames of the previous setting are never returned by getMultiResults inside the block.
+
+        Args:
+            config (Mapping[str, Any]): arguments of switchCollectionOfMultiResults, e.g. dict(actions=0b1, raw_size=4100).
 
-    def getMultiResults(self)->Union[KKTClassStatus, Tuple[KKTClassStatus, Dict[int, bytes]]]:
+        Yields:
+            int: collection epoch of the session.
+        '''
+        previous = dict(self.collection_config)
+        if self.switchCollectionOfMultiResults(**config) != KKTClassStatus.KKT_SUCCESS:
+            raise KKTConnectionException(f'switch collection failed, config = {dict(config)}')
+        try:
+            yield self.collection_epoch
+        finally:
+            self.switchCollectionOfMultiResults(**previous)
+
+    def getMultiResults(self, *, with_timestamp:bool=False)->Union[KKTClassStatus, Tuple[KKTClassStatus, Dict[int, bytes]], Tuple[KKTClassStatus, Dict[int, bytes], int]]:
         '''Get multi results.
 
+        Args:
+            with_timestamp (bool, optional): also return receive time of frame. Defaults to False.
+
         Returns:
-            Union[KKTClassStatus, Tuple[KKTClassStatus, Dict[int, bytes]]]: KKTClassStatus, data dict
+            Union[KKTClassStatus, Tuple[KKTClassStatus, Dict[int, bytes]]]: KKTClassStatus, data dict (, timestamp)
 
             data dict key is action number, value is parsed data in byte array.
+            timestamp is time.monotonic_ns() when engine composed the frame, frame period, jitter and gaps
+            of the stream are in `connection.engine.metrics.snapshot()['streams']`.
 
         '''
-        response = self.connection.receiveCDCPacket(cmd=Command.GET_COLLECTION_OF_MULTI_RESULTS.value, response_only=True)
-        response = get_CDC_packet(response)
+        packet = self.connection.receiveCDCPacket(cmd=Command.GET_COLLECTION_OF_MULTI_RESULTS.value, response_only=True)
+        response = get_CDC_packet(packet)
 
         if response.command != Command.GET_COLLECTION_OF_MULTI_RESULTS.value:
             return KKTClassStatus.KKT_ERROR_REQUEST_FAILED
 
         # parsing
         actions = int.from_bytes(response.payload[1:4], byteorder='big')
-        log.debug(f'actions : {bin(actions)}')
-        offset = 5
-        data_dict:Dict[int, bytes] = {}
-        while offset < len(response.payload):
-            action_num = int.from_bytes(response.payload[offset+1:offset+2], byteorder='big', signed=True)
-            data_length = int.from_bytes(response.payload[offset+2:offset+4], byteorder='big', signed=True)
-            log.debug(f'action_num : {action_num}, data_length : {data_length}')
-            data = response.payload[offset+4:offset+4+data_length]
-            data_dict.update({action_num: data})
-            offset += 4 + data_length
-
+        log.debug('actions : %s', bin(actions))
+        data_dict = parse_multi_results(response.payload)
+        timestamp = packet.timestamp
+
+        if self.register_subscription is not None and REG_ADDRESS_ACTION in data_dict:
+            self.register_subscription.decode(data_dict[REG_ADDRESS_ACTION], self.collection_reg_address, timestamp)
+
+        trace = self.connection.engine.trace
+        if trace is not None:
+            trace.record(TraceEvent.PARSE, response.command, response.payload_length)
+        if with_timestamp:
+            return KKTClassStatus.KKT_SUCCESS, data_dict, timestamp
         return KKTClassStatus.KKT_SUCCESS, data_dict
 
+    def drainBurst(self, frames:int, *, config:Optional[Mapping[str, Any]]=None, out:Optional['np.ndarray']=None,
+                   timeout:float=1.0, gap:float=0.05)->Tuple[KKTClassStatus, 'np.ndarray', 'BurstTiming']:
+        '''Drain a burst of frames buffered in sniff mode (frame_setting) into one array.
+
+        Raw samples of every frame are copied by the engine thread straight into a row of out, instead of
+        one getMultiResults round per frame. Frames arriving after the burst go to the response only queue.
+
+        Args:
+            frames (int): max frames of the burst.
+            config (Optional[Mapping[str, Any]], optional): switchCollectionOfMultiResults arguments sent after the
+                drain is armed, e.g. dict(actions=0b1001, raw_size=4100, frame_setting=16), None if the burst is
+                triggered by the current collection setting.
+            out (Optional[np.ndarray], optional): preallocated (frames, samples) uint16 array, reuse it between bursts.
+                Allocated from raw_size if None.
+            timeout (float, optional): seconds to wait for the first frame. Defaults to 1.0.
+            gap (float, optional): seconds without a frame that end a burst shorter than frames. Defaults to 0.05.
+
+        Returns:
+            Tuple[KKTClassStatus, np.ndarray, BurstTiming]: status, out[:frames received], burst timing.
+        '''
+        import numpy as np
+        from .burst import BurstDrain
+        from .stages import HEADER_WORDS
+        if out is None:
+            raw_size = (config if config is not None else self.collection_config).get('raw_size', 0)
+            assert raw_size > 2 * HEADER_WORDS, f'raw_size must be set to allocate out, but got {raw_size}'
+            out = np.empty((frames, raw_size // 2 - HEADER_WORDS), dtype=np.uint16)
+        engine = self.connection.engine
+        drain = BurstDrain(engine, out[:frames], epoch=engine.epoch + 1 if config is not None else None) # frames after switch
+        if config is not None:
+            status = self.switchCollectionOfMultiResults(**config)
+            if status != KKTClassStatus.KKT_SUCCESS:
+                drain.close()
+                return status, out[:0], drain.timing
+        count = drain.wait(timeout, gap=gap)
+        if drain.error is not None:
+            log.warning(drain.error)
+            return KKTClassStatus.KKT_ERROR_REQUEST_FAILED, out[:count], drain.timing
+        if not count:
+            return KKTClassStatus.KKT_ERROR_IO_TIMEOUT, out[:0], drain.timing
+        return KKTClassStatus.KKT_SUCCESS, out[:count], drain.timing
+
 
 if __name__ == '__main__':
     integration = KKTIntegration(KKTVComPortConnection(timeout=1))
@@ -1,9 +1,11 @@
 import logging
+import logging.handlers
+from queue import SimpleQueue
+from typing import Optional
 
-__all__ = ['log']
+__all__ = ['log', 'enable_async_logging', 'disable_async_logging']
 
-log = logging.getLogger(name='Lib')
-log.setLevel(logging.DEBUG)
+log = logging.getLogger(name='Lib') # level is left to the application, e.g. log.setLevel(logging.INFO)
 handler = logging.StreamHandler()
 
 class CustomFormatter(logging.Formatter):
@@ -24,11 +26,44 @@ class CustomFormatter(logging.Formatter):
             logging.ERROR: f"{self.Magenta} {self.fmt} {self.reset}",
             logging.CRITICAL: f"{self.red} {self.fmt} {self.reset}"
         }
+        # formatter of each level is built once, not per record
+        self.formatters = {level: logging.Formatter(log_fmt) for level, log_fmt in self.FORMATS.items()}
+        self.default_formatter = logging.Formatter(fmt)
 
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
-        return formatter.format(record)
+        return self.formatters.get(record.levelno, self.default_formatter).format(record)
 
 handler.setFormatter(CustomFormatter())
-log.addHandler(handler)
\ No newline at end of file
+log.addHandler(handler)
+
+_listener:Optional[logging.handlers.QueueListener] = None
+
+def enable_async_logging()->logging.handlers.QueueListener:
+    '''Move log I/O off the calling threads (e.g. engine thread).
+
+    Handlers of `log` are replaced by a QueueHandler, and a QueueListener thread runs the original handlers.
+    Call `disable_async_logging` to flush and restore the handlers.
+    '''
+    global _listener
+    if _listener is not None:
+        return _listener
+    handlers = list(log.handlers)
+    for h in handlers:
+        log.removeHandler(h)
+    log.addHandler(logging.handlers.QueueHandler(SimpleQueue()))
+    _listener = logging.handlers.QueueListener(log.handlers[0].queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def disable_async_logging()->None:
+    '''Stop the QueueListener started by `enable_async_logging`, flush pending records and restore handlers.'''
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for h in list(log.handlers):
+        if isinstance(h, logging.handlers.QueueHandler):
+            log.removeHandler(h)
+    for h in _listener.handlers:
+        log.addHandler(h)
+    _listener = None
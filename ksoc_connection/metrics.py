@@ -0,0 +1,341 @@
+import time
+from bisect import bisect_left
+from threading import Thread, Lock
+from typing import Any, Optional, Dict, List, Tuple, Sequence
+from .logger import log
+
+__all__ = ['Histogram', 'QueueGauge', 'StreamStats', 'EngineMetrics', 'MetricsServer']
+
+# latency bucket bounds in seconds (100us ... 10s)
+LATENCY_BUCKETS:Tuple[float, ...] = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                                     0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    '''Fixed bucket histogram, cheap enough to observe on every packet.'''
+    def __init__(self, buckets:Sequence[float]=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets) # upper bounds of buckets, last bucket is +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value:float)->None:
+        '''add one sample to histogram'''
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q:float)->float:
+        '''estimate quantile by upper bound of bucket, return 0.0 if histogram is empty'''
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        accumulate = 0
+        for i, count in enumerate(self.counts):
+            accumulate += count
+            if accumulate >= rank and count:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self)->Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+        }
+
+class QueueGauge:
+    '''Depth and high-watermark of one engine queue.'''
+    def __init__(self):
+        self.depth = 0
+        self.high_watermark = 0
+
+    def update(self, depth:int)->None:
+        self.depth = depth
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+
+class StreamStats:
+    '''Arrival statistics of a periodic stream of response only packets (e.g. MULTI_RESULTS frames).
+
+    Frame period is the median of the first `warmup` intervals, then tracked by EWMA of intervals that are not gaps.
+    An interval longer than `gap_factor` periods is a gap, frames missing in it are counted by `missing`.
+    Jitter is the smoothed absolute deviation of interval from period (RFC 3550 style).
+    '''
+    def __init__(self, gap_factor:float=1.5, warmup:int=8, alpha:float=1 / 16):
+        self.gap_factor = gap_factor
+        self.warmup = warmup
+        self.alpha = alpha
+        self.frames = 0
+        self.first = 0 # monotonic_ns of first frame
+        self.last = 0 # monotonic_ns of last frame
+        self.period = 0.0 # ns, 0 until warmup is done
+        self.jitter = 0.0 # ns
+        self.max_jitter = 0.0 # ns, largest deviation of a non gap interval
+        self.max_interval = 0 # ns
+        self.gaps = 0
+        self.missing = 0 # estimated frames lost in gaps
+        self._intervals:List[int] = []
+
+    def observe(self, timestamp:int)->None:
+        '''add arrival time (monotonic_ns) of one frame'''
+        self.frames += 1
+        if self.frames == 1:
+            self.first = self.last = timestamp
+            return
+        interval = timestamp - self.last
+        self.last = timestamp
+        if interval > self.max_interval:
+            self.max_interval = interval
+        period = self.period
+        if not period:
+            self._intervals.append(interval)
+            if len(self._intervals) >= self.warmup:
+                self.period = float(sorted(self._intervals)[len(self._intervals) // 2]) or 1.0
+                self._intervals = []
+            return
+        if interval > self.gap_factor * period:
+            self.gaps += 1
+            self.missing += max(round(interval / period) - 1, 1)
+            return
+        deviation = abs(interval - period)
+        self.period = period + (interval - period) * self.alpha
+        self.jitter += (deviation - self.jitter) * self.alpha
+        if deviation > self.max_jitter:
+            self.max_jitter = deviation
+
+    def snapshot(self)->Dict[str, Any]:
+        '''statistics with times in seconds'''
+        return {
+            'frames': self.frames,
+            'period': self.period / 1e9,
+            'jitter': self.jitter / 1e9,
+            'max_jitter': self.max_jitter / 1e9,
+            'max_interval': self.max_interval / 1e9,
+            'gaps': self.gaps,
+            'missing': self.missing,
+        }
+
+class EngineMetrics:
+    '''Always-on counters of event loop engine and CDC packet composer.
+
+    Counters are plain integers updated by the engine thread only, so no lock on the hot path.
+    Readers take a consistent enough view by `snapshot()`.
+    '''
+    def __init__(self, *, gap_factor:float=1.5):
+        '''
+        Args:
+            gap_factor (float, optional): interval of stream frames longer than this many periods is a gap. Defaults to 1.5.
+        '''
+        self.start_time = time.monotonic()
+        self.bytes_received = 0 # bytes read from porto
+        self.bytes_sent = 0 # bytes written to porto
+        self.frames_received = 0 # complete CDC packets composed
+        self.frames_sent = 0 # CDC packets written to porto
+        self.discarded_bytes = 0 # bytes dropped by composer while searching start frame
+        self.resync_events = 0 # times composer lost sync and searched start frame again
+        self.checksum_checked = 0 # packets validated by checksum policy
+        self.checksum_errors = 0 # packets dropped for wrong checksum
+        self.stale_frames = 0 # stream frames of a previous collection epoch dropped on receive
+        self.reads = 0 # porto.recv calls of event loop
+        self.empty_reads = 0 # reads that returned nothing, polls or timed out waits
+        self.loop_cpu = 0.0 # CPU seconds used by event loop thread
+        self.queues:Dict[str, QueueGauge] = {}
+        self.latency:Dict[int, Histogram] = {} # request->response latency per command
+        self._pending:Dict[int, int] = {} # send time (ns) of outstanding request per command
+        self.tx_writes = 0 # porto writes, lower than frames_sent when packets are coalesced
+        self.tx_delay:Dict[str, Histogram] = {} # queue delay of outgoing packets per priority class
+        self.gap_factor = gap_factor
+        self.streams:Dict[int, StreamStats] = {} # arrival statistics of response only packets per command
+        self._last:Tuple[float, int, int, float] = (self.start_time, 0, 0, 0.0) # time, bytes, frames, loop CPU of last snapshot
+        self._lock = Lock() # guard rate window only, taken by readers
+
+    # ---- hooks called by engine / composer ----
+    def on_recv(self, size:int)->None:
+        self.bytes_received += size
+
+    def on_read(self, size:int, cpu:float)->None:
+        self.reads += 1
+        if not size:
+            self.empty_reads += 1
+        self.loop_cpu = cpu
+
+    def on_frame(self, cmd:int)->None:
+        self.frames_received += 1
+        sent = self._pending.pop(cmd, None)
+        if sent is not None:
+            histogram = self.latency.get(cmd)
+            if histogram is None:
+                histogram = self.latency[cmd] = Histogram()
+            histogram.observe((time.perf_counter_ns() - sent) / 1e9)
+
+    def on_send(self, size:int, cmd:Optional[int]=None)->None:
+        self.bytes_sent += size
+        self.frames_sent += 1
+        if cmd is not None:
+            self._pending[cmd] = time.perf_counter_ns()
+
+    def on_tx_write(self)->None:
+        self.tx_writes += 1
+
+    def on_tx_delay(self, priority:str, delay:float)->None:
+        histogram = self.tx_delay.get(priority)
+        if histogram is None:
+            histogram = self.tx_delay[priority] = Histogram()
+        histogram.observe(delay)
+
+    def on_stream_frame(self, cmd:int, timestamp:int)->None:
+        stream = self.streams.get(cmd)
+        if stream is None:
+            stream = self.streams[cmd] = StreamStats(self.gap_factor)
+        stream.observe(timestamp)
+
+    def on_discard(self, size:int)->None:
+        self.discarded_bytes += size
+
+    def on_resync(self)->None:
+        self.resync_events += 1
+
+    def on_checksum_error(self)->None:
+        self.checksum_errors += 1
+
+    def on_stale_frame(self, count:int=1)->None:
+        self.stale_frames += count
+
+    def on_queue(self, name:str, depth:int)->None:
+        gauge = self.queues.get(name)
+        if gauge is None:
+            gauge = self.queues[name] = QueueGauge()
+        gauge.update(depth)
+
+    # ---- readers ----
+    def snapshot(self)->Dict[str, Any]:
+        '''Get metrics as dict. Rates are averaged over the interval since previous snapshot.'''
+        now = time.monotonic()
+        bytes_received, frames_received, loop_cpu = self.bytes_received, self.frames_received, self.loop_cpu
+        with self._lock:
+            last_time, last_bytes, last_frames, last_cpu = self._last
+            self._last = (now, bytes_received, frames_received, loop_cpu)
+        interval = max(now - last_time, 1e-9)
+        return {
+            'uptime': now - self.start_time,
+            'bytes_received': bytes_received,
+            'bytes_sent': self.bytes_sent,
+            'frames_received': frames_received,
+            'frames_sent': self.frames_sent,
+            'bytes_per_second': (bytes_received - last_bytes) / interval,
+            'frames_per_second': (frames_received - last_frames) / interval,
+            'discarded_bytes': self.discarded_bytes,
+            'resync_events': self.resync_events,
+            'checksum_checked': self.checksum_checked,
+            'checksum_errors': self.checksum_errors,
+            'stale_frames': self.stale_frames,
+            'loop': {'reads': self.reads, 'empty_reads': self.empty_reads, 'cpu_seconds': loop_cpu,
+                     'cpu_utilization': (loop_cpu - last_cpu) / interval},
+            'queues': {name: {'depth': gauge.depth, 'high_watermark': gauge.high_watermark}
+                       for name, gauge in list(self.queues.items())},
+            'latency': {cmd: histogram.snapshot() for cmd, histogram in list(self.latency.items())},
+            'tx': {'writes': self.tx_writes,
+                   'delay': {priority: histogram.snapshot() for priority, histogram in list(self.tx_delay.items())}},
+            'streams': {cmd: stream.snapshot() for cmd, stream in list(self.streams.items())},
+        }
+
+    def to_prometheus(self, prefix:str='ksoc')->str:
+        '''Render metrics in Prometheus text exposition format.'''
+        lines:List[str] = []
+        def metric(name:str, kind:str, help_text:str, samples:List[Tuple[str, float]]):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{prefix}_{name}{labels} {value}')
+
+        metric('bytes_received_total', 'counter', 'Bytes read from transport.', [('', self.bytes_received)])
+        metric('bytes_sent_total', 'counter', 'Bytes written to transport.', [('', self.bytes_sent)])
+        metric('frames_received_total', 'counter', 'CDC packets composed.', [('', self.frames_received)])
+        metric('frames_sent_total', 'counter', 'CDC packets sent.', [('', self.frames_sent)])
+        metric('discarded_bytes_total', 'counter', 'Bytes dropped while searching start frame.', [('', self.discarded_bytes)])
+        metric('resync_events_total', 'counter', 'Times composer lost packet sync.', [('', self.resync_events)])
+        metric('checksum_checked_total', 'counter', 'Packets validated by checksum.', [('', self.checksum_checked)])
+        metric('checksum_errors_total', 'counter', 'Packets dropped for wrong checksum.', [('', self.checksum_errors)])
+        metric('loop_reads_total', 'counter', 'Transport reads of event loop.', [('', self.reads)])
+        metric('loop_empty_reads_total', 'counter', 'Transport reads returning nothing.', [('', self.empty_reads)])
+        metric('loop_cpu_seconds_total', 'counter', 'CPU time of event loop thread.', [('', self.loop_cpu)])
+        metric('stale_frames_total', 'counter', 'Stream frames of previous collection epoch dropped.', [('', self.stale_frames)])
+        queues = list(self.queues.items())
+        metric('queue_depth', 'gauge', 'Current depth of engine queue.',
+               [(f'{{queue="{name}"}}', gauge.depth) for name, gauge in queues])
+        metric('queue_high_watermark', 'gauge', 'Highest depth of engine queue.',
+               [(f'{{queue="{name}"}}', gauge.high_watermark) for name, gauge in queues])
+
+        streams = list(self.streams.items())
+        metric('stream_period_seconds', 'gauge', 'Estimated frame period of stream.',
+               [(f'{{cmd="{hex(cmd)}"}}', stream.period / 1e9) for cmd, stream in streams])
+        metric('stream_jitter_seconds', 'gauge', 'Smoothed frame interval jitter of stream.',
+               [(f'{{cmd="{hex(cmd)}"}}', stream.jitter / 1e9) for cmd, stream in streams])
+        metric('stream_gaps_total', 'counter', 'Frame intervals longer than gap factor periods.',
+               [(f'{{cmd="{hex(cmd)}"}}', stream.gaps) for cmd, stream in streams])
+        metric('stream_missing_frames_total', 'counter', 'Frames estimated lost in gaps.',
+               [(f'{{cmd="{hex(cmd)}"}}', stream.missing) for cmd, stream in streams])
+
+        def histograms(name:str, help_text:str, label:str, items:List[Tuple[str, Histogram]]):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} histogram')
+            for value, histogram in items:
+                labels = f'{label}="{value}"'
+                accumulate = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    accumulate += count
+                    lines.append(f'{prefix}_{name}_bucket{{{labels},le="{bound}"}} {accumulate}')
+                lines.append(f'{prefix}_{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'{prefix}_{name}_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'{prefix}_{name}_count{{{labels}}} {histogram.count}')
+
+        histograms('response_latency_seconds', 'Request to response latency per command.', 'cmd',
+                   [(hex(cmd), histogram) for cmd, histogram in list(self.latency.items())])
+        metric('tx_writes_total', 'counter', 'Transport writes, packets may be coalesced.', [('', self.tx_writes)])
+        histograms('tx_queue_delay_seconds', 'Queue delay of outgoing packets per priority class.', 'priority',
+                   list(self.tx_delay.items()))
+        return '\n'.join(lines) + '\n'
+
+class MetricsServer(Thread):
+    '''Serve EngineMetrics in Prometheus text format on a local HTTP endpoint (GET /metrics).'''
+    def __init__(self, metrics:EngineMetrics, host:str='127.0.0.1', port:int=9464):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        super().__init__(daemon=True)
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] not in ('/', '/metrics'):
+                    handler.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                log.debug('metrics server: ' + format % args)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def address(self)->Tuple[str, int]:
+        '''bound (host, port), useful when port=0'''
+        return self.httpd.server_address[:2]
+
+    def run(self):
+        log.info(f'metrics server listen on {self.address}')
+        self.httpd.serve_forever()
+
+    def stop(self):
+        '''stop http server'''
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -87,12 +87,31 @@ class Packet:
         '''Validate checksum of response CDC packet. True if checksum is correct, False if checksum is incorrect.'''
         return self.checksum == calculate_checksum(self.CDC_packet)
 
+class StampedPacket(bytes):
+    '''Received CDC packet bytes tagged with `timestamp`, time.monotonic_ns() when the packet was composed,
+    and `epoch`, collection epoch of engine when a stream packet arrived.'''
+    def __new__(cls, data:Union[bytes, bytearray, memoryview], timestamp:int, epoch:int=0):
+        packet = super().__new__(cls, data)
+        packet.timestamp = timestamp
+        packet.epoch = epoch
+        return packet
+
+    def __reduce__(self):
+        return (StampedPacket, (bytes(self), self.timestamp, self.epoch))
+
 def calculate_checksum(packet:Union[bytes, bytearray])->int:
     '''Calculate checksum of CDC packet.'''
     payload_length = int.from_bytes(packet[5:7], byteorder='big', signed=False)
     return ~(sum(packet[3:-1]))+1 & 0xFF # 2 complement of sum of bytes from command to payload
 
 
+def packet_checksum(packet:Union[bytes, bytearray, memoryview])->int:
+    '''Checksum of composed CDC packet, computed in place (no copy), vectorized by NumPy for large packets.'''
+    if len(packet) < 256:
+        return -sum(memoryview(packet)[3:-1]) & 0xFF
+    import numpy as np
+    return -int(np.frombuffer(packet, dtype=np.uint8, count=len(packet) - 4, offset=3).sum(dtype=np.uint64)) & 0xFF
+
 def get_CDC_packet(packet:Union[bytes, bytearray])->Packet:
     '''Get CDC packet object from bytes.'''
     packet = bytes(packet)
@@ -105,6 +124,20 @@ def get_CDC_packet(packet:Union[bytes, bytearray])->Packet:
     checksum = packet[-1]
     return Packet(direction, command, payload_length, payload, checksum)
 
+def parse_multi_results(payload:Union[bytes, bytearray])->Dict[int, bytes]:
+    '''Parse payload of MULTI_RESULTS packet into dict of action number -> data.
+
+    Payload is 5 bytes header (actions) then blocks of [reserved, action number, data length (2 bytes), data].
+    '''
+    offset = 5
+    data_dict:Dict[int, bytes] = {}
+    while offset < len(payload):
+        action_num = int.from_bytes(payload[offset+1:offset+2], byteorder='big', signed=True)
+        data_length = int.from_bytes(payload[offset+2:offset+4], byteorder='big', signed=True)
+        data_dict[action_num] = payload[offset+4:offset+4+data_length]
+        offset += 4 + data_length
+    return data_dict
+
 
 if __name__ == '__main__':
     packet = Packet(direction=Direction.RESPONSE.value, command=0xab, payload_length=(8192+2)*2, payload=bytearray((8192+2)*2), checksum=0x08)
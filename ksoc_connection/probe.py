@@ -0,0 +1,183 @@
+'''Command latency and streaming throughput probe of a KKT device, link or firmware.
+
+usage: ksoc-probe [--transport sim|vcom|wifi] [--host HOST] [--port PORT] [--count 200] [--stream-seconds 3] [--json out.json]
+'''
+import argparse
+import json
+import sys
+import time
+from typing import Any, Optional, Dict, List, Callable, Sequence
+from .connection import KKTConnection
+from .ksoc_connection import KKTIntegration, KKTClassStatus
+from .logger import log
+
+__all__ = ['main', 'probe', 'percentiles']
+
+def percentiles(samples:Sequence[float])->Dict[str, float]:
+    '''summary of RTT samples in seconds'''
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    def rank(q:float)->float:
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    elapsed = sum(ordered)
+    return {
+        'count': len(ordered),
+        'mean': elapsed / len(ordered),
+        'p50': rank(0.5),
+        'p90': rank(0.9),
+        'p99': rank(0.99),
+        'max': ordered[-1],
+        'rate': len(ordered) / elapsed if elapsed else 0.0, # requests per second, one in flight
+    }
+
+def _measure(request:Callable[[], Any], count:int)->Dict[str, Any]:
+    samples:List[float] = []
+    errors = 0
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            result = request()
+        except Exception:
+            errors += 1
+            continue
+        status = result[0] if isinstance(result, tuple) else result
+        if status != KKTClassStatus.KKT_SUCCESS:
+            errors += 1
+            continue
+        samples.append(time.perf_counter() - start)
+    summary = percentiles(samples)
+    summary['errors'] = errors
+    return summary
+
+def _stream(integration:KKTIntegration, seconds:float, raw_size:int)->Dict[str, Any]:
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=raw_size)
+    frames = 0
+    size = 0
+    start = time.perf_counter()
+    try:
+        while time.perf_counter() - start < seconds:
+            result = integration.getMultiResults()
+            if result[0] == KKTClassStatus.KKT_SUCCESS:
+                frames += 1
+                size += sum(len(data) for data in result[1].values())
+    finally:
+        elapsed = time.perf_counter() - start
+        integration.switchCollectionOfMultiResults(actions=0)
+    stream = integration.connection.engine.metrics.snapshot()['streams'].get(0xab, {})
+    return {
+        'seconds': elapsed,
+        'frames': frames,
+        'frames_per_second': frames / elapsed,
+        'MB_per_second': size / elapsed / 1e6,
+        'period': stream.get('period', 0.0),
+        'jitter': stream.get('jitter', 0.0),
+        'gaps': stream.get('gaps', 0),
+        'missing': stream.get('missing', 0),
+    }
+
+def probe(integration:KKTIntegration, *, count:int=200, addr:int=0x50000504,
+          payload_pairs:Sequence[int]=(1, 16, 64, 256), stream_seconds:float=3.0,
+          raw_size:int=(8192 + 2) * 2)->Dict[str, Any]:
+    '''sweep commands and streaming on connected device
+
+    Args:
+        integration (KKTIntegration): connected device.
+        count (int, optional): requests per command. Defaults to 200.
+        addr (int, optional): register read, and written back with its own value. If it cannot be read, write sweeps
+            are skipped and reported with count 0 and all requests as errors. Defaults to 0x50000504.
+        payload_pairs (Sequence[int], optional): custom REG_WRITE packets with this many (addr, value) pairs,
+            all rewriting addr with its current value, 8 bytes payload per pair.
+        stream_seconds (float, optional): seconds of MULTI_RESULTS streaming, 0 to skip. Defaults to 3.
+        raw_size (int, optional): raw size of streaming. Defaults to (8192 + 2) * 2.
+
+    Returns:
+        Dict[str, Any]: {'commands': name -> RTT summary (seconds), 'stream': throughput summary}
+    '''
+    status, value = integration.readHWRegister(addr)
+    commands:Dict[str, Dict[str, Any]] = {}
+    commands['GET_CHIP_ID'] = _measure(integration.getChipID, count)
+    commands['REG_READ'] = _measure(lambda: integration.readHWRegister(addr), count)
+    if status == KKTClassStatus.KKT_SUCCESS:
+        commands['REG_WRITE'] = _measure(lambda: integration.writeHWRegister(addr, value), count)
+        pair = addr.to_bytes(4, byteorder='little') + value.to_bytes(4, byteorder='little')
+        for pairs in payload_pairs:
+            payload = pair * pairs
+            summary = _measure(lambda: integration.setCustomCDCPacket(direction=b'>', command=b'\x10',
+                               payload_len=len(payload).to_bytes(2, byteorder='big'), payload=payload), count)
+            summary['payload'] = len(payload)
+            commands[f'CUSTOM_{len(payload)}B'] = summary
+    else: # never write back a value that was not read from the device
+        log.warning('ksoc-probe: read of %#x failed (%s), write sweeps skipped', addr, status)
+        commands['REG_WRITE'] = {'count': 0, 'errors': count}
+        for pairs in payload_pairs:
+            commands[f'CUSTOM_{8 * pairs}B'] = {'count': 0, 'errors': count, 'payload': 8 * pairs}
+    result:Dict[str, Any] = {'commands': commands}
+    if stream_seconds > 0:
+        result['stream'] = _stream(integration, stream_seconds, raw_size)
+    return result
+
+def format_table(result:Dict[str, Any])->str:
+    lines = [f'{"command":<16}{"count":>7}{"err":>5}{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}{"max ms":>9}{"req/s":>9}']
+    for name, summary in result['commands'].items():
+        if not summary['count']:
+            lines.append(f'{name:<16}{0:>7}{summary["errors"]:>5}')
+            continue
+        lines.append(f'{name:<16}{summary["count"]:>7}{summary["errors"]:>5}'
+                     + ''.join(f'{summary[key] * 1e3:>9.3f}' for key in ('p50', 'p90', 'p99', 'max'))
+                     + f'{summary["rate"]:>9.0f}')
+    stream = result.get('stream')
+    if stream is not None:
+        lines.append(f'stream: {stream["frames"]} frames in {stream["seconds"]:.1f} s, {stream["frames_per_second"]:.1f} frames/s, '
+                     f'{stream["MB_per_second"]:.3f} MB/s, period {stream["period"] * 1e3:.2f} ms, '
+                     f'jitter {stream["jitter"] * 1e3:.3f} ms, gaps {stream["gaps"]} ({stream["missing"]} frames)')
+    return '\n'.join(lines)
+
+def _connection(args:argparse.Namespace)->KKTConnection:
+    if args.transport == 'vcom':
+        from .connection import KKTVComPortConnection
+        return KKTVComPortConnection()
+    if args.transport == 'wifi':
+        from .connection import KKTWIFIConnection
+        return KKTWIFIConnection()
+    from .connection import KKTSimulatorConnection
+    return KKTSimulatorConnection()
+
+def main(argv:Optional[Sequence[str]]=None)->int:
+    parser = argparse.ArgumentParser(prog='ksoc-probe', description=__doc__.splitlines()[0])
+    parser.add_argument('--transport', choices=('sim', 'vcom', 'wifi'), default='sim')
+    parser.add_argument('--host', default='127.0.0.1', help='device or gateway address (wifi)')
+    parser.add_argument('--port', type=int, default=7000, help='device or gateway port (wifi)')
+    parser.add_argument('--count', type=int, default=200, help='requests per command')
+    parser.add_argument('--addr', type=lambda value: int(value, 0), default=0x50000504, help='register probed')
+    parser.add_argument('--payload-pairs', type=lambda value: [int(n) for n in value.split(',')], default=[1, 16, 64, 256],
+                        help='comma separated register pairs of custom REG_WRITE packets')
+    parser.add_argument('--stream-seconds', type=float, default=3.0, help='0 to skip streaming')
+    parser.add_argument('--raw-size', type=int, default=(8192 + 2) * 2)
+    parser.add_argument('--json', help='write result as JSON to path, "-" for stdout')
+    args = parser.parse_args(argv)
+
+    integration = KKTIntegration(_connection(args))
+    connect_args = (args.host, args.port) if args.transport == 'wifi' else ()
+    if integration.connectDevice(*connect_args) != KKTClassStatus.KKT_SUCCESS:
+        print(f'ksoc-probe: cannot connect ({args.transport})', file=sys.stderr)
+        return 1
+    try:
+        result = probe(integration, count=args.count, addr=args.addr, payload_pairs=args.payload_pairs,
+                       stream_seconds=args.stream_seconds, raw_size=args.raw_size)
+    finally:
+        integration.disconnectDevice()
+    result['transport'] = args.transport
+
+    if args.json == '-':
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_table(result))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+from dataclasses import dataclass, field
+from typing import Any, Union, Optional, Dict, List, Tuple, Mapping, Iterator
+
+__all__ = ['RegisterProfile', 'ProfileResult', 'FULL_MASK']
+
+FULL_MASK = 0xFFFF_FFFF
+
+def _int(value:Union[int, str])->int:
+    return value if isinstance(value, int) else int(value, 0)
+
+class RegisterProfile:
+    '''Declarative register configuration, address -> (value, mask).
+
+    Only bits set in mask are owned by the profile, other bits keep the current device value.
+
+    Profile file formats (`RegisterProfile.load`):
+        JSON (*.json): {"0x50000504": "0x1234", "0x50000508": {"value": "0x10", "mask": "0xF0"}}
+        text: one register per line "address value [mask]", '#' starts a comment.
+    '''
+    def __init__(self, registers:Optional[Mapping[int, Union[int, Tuple[int, int]]]]=None, name:str=''):
+        '''
+        Args:
+            registers (Mapping[int, Union[int, Tuple[int, int]]], optional): address -> value or (value, mask).
+            name (str, optional): profile name for logging.
+        '''
+        self.name = name
+        self.registers:Dict[int, Tuple[int, int]] = {}
+        for addr, value in (registers or {}).items():
+            if isinstance(value, tuple):
+                self.set(addr, *value)
+            else:
+                self.set(addr, value)
+
+    def set(self, addr:int, value:int, mask:int=FULL_MASK)->None:
+        assert addr % 4 == 0, f'register address must be 4 bytes aligned, but got {hex(addr)}'
+        self.registers[addr] = (value & mask, mask)
+
+    def __len__(self)->int:
+        return len(self.registers)
+
+    def __iter__(self)->Iterator[int]:
+        return iter(sorted(self.registers))
+
+    def __repr__(self):
+        return f'RegisterProfile(name="{self.name}", registers={len(self.registers)})'
+
+    def apply_to(self, addr:int, current:int)->int:
+        '''target value of addr given current device value'''
+        value, mask = self.registers[addr]
+        return (current & ~mask & FULL_MASK) | value
+
+    def is_full(self, addr:int)->bool:
+        '''True if profile owns every bit of addr'''
+        return self.registers[addr][1] == FULL_MASK
+
+    @classmethod
+    def from_dict(cls, data:Mapping[str, Any], name:str='')->'RegisterProfile':
+        profile = cls(name=name)
+        for addr, value in data.items():
+            if isinstance(value, Mapping):
+                profile.set(_int(addr), _int(value['value']), _int(value.get('mask', FULL_MASK)))
+            else:
+                profile.set(_int(addr), _int(value))
+        return profile
+
+    @classmethod
+    def load(cls, path:str)->'RegisterProfile':
+        '''Load profile from JSON (*.json) or text file.'''
+        with open(path) as f:
+            if path.endswith('.json'):
+                import json
+                return cls.from_dict(json.load(f), name=path)
+            profile = cls(name=path)
+            for number, line in enumerate(f, 1):
+                fields = line.split('#', 1)[0].split()
+                if not fields:
+                    continue
+                assert len(fields) in (2, 3), f'{path}:{number}: expect "address value [mask]", but got {line.strip()}'
+                profile.set(*(int(value, 0) for value in fields))
+            return profile
+
+@dataclass
+class ProfileResult:
+    '''Result of KKTIntegration.applyRegisterProfile.
+
+    Attributes:
+        written (Dict[int, int]): registers written, address -> value.
+        mismatched (List[int]): addresses whose verified value differs from written value.
+        round_trips (int): number of CDC requests used.
+    '''
+    written:Dict[int, int] = field(default_factory=dict)
+    mismatched:List[int] = field(default_factory=list)
+    round_trips:int = 0
@@ -0,0 +1,76 @@
+from bisect import bisect_right
+from typing import Any, Optional, Dict, List, Tuple, Iterable
+
+__all__ = ['RegisterCache']
+
+class RegisterCache:
+    '''Shadow copy of device registers for KKTIntegration.
+
+    Values are updated write-through by register writes and filled by register reads. Reads of cached,
+    non-volatile addresses are served locally without a CDC round trip. Volatile ranges (status,
+    interrupt registers) are never cached and always read from device.
+    '''
+    def __init__(self, volatile:Iterable[Tuple[int, int]]=()):
+        '''
+        Args:
+            volatile (Iterable[Tuple[int, int]], optional): volatile address ranges as (start, end), end is exclusive.
+        '''
+        self.values:Dict[int, int] = {}
+        self._starts:List[int] = [] # sorted start of volatile ranges
+        self._ends:List[int] = [] # end of volatile ranges, same order as _starts
+        self.hits = 0
+        self.misses = 0
+        for start, end in volatile:
+            self.mark_volatile(start, end)
+
+    def mark_volatile(self, start:int, end:Optional[int]=None)->None:
+        '''mark address range [start, end) volatile, a single register if end is None'''
+        end = start + 4 if end is None else end
+        assert end > start, f'end must be greater than start, but got {hex(start)} {hex(end)}'
+        ranges = sorted(zip(self._starts + [start], self._ends + [end]))
+        merged:List[Tuple[int, int]] = []
+        for s, e in ranges: # merge overlapped ranges, so lookup is one bisect
+            if merged and s <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((s, e))
+        self._starts = [s for s, _ in merged]
+        self._ends = [e for _, e in merged]
+        self.invalidate(start, end)
+
+    def is_volatile(self, addr:int)->bool:
+        i = bisect_right(self._starts, addr) - 1
+        return i >= 0 and addr < self._ends[i]
+
+    def get(self, addr:int)->Optional[int]:
+        '''cached value of addr, None for miss (volatile addresses are never cached)'''
+        value = self.values.get(addr)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def update(self, addr:int, value:int)->None:
+        '''store value of addr after write or read, volatile address is ignored'''
+        if not self.is_volatile(addr):
+            self.values[addr] = value
+
+    def invalidate(self, start:Optional[int]=None, end:Optional[int]=None)->None:
+        '''drop cached values, all if start is None, [start, end) or a single register if end is None'''
+        if start is None:
+            self.values.clear()
+            return
+        end = start + 4 if end is None else end
+        for addr in [addr for addr in self.values if start <= addr < end]:
+            del self.values[addr]
+
+    def stats(self)->Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'cached': len(self.values),
+            'volatile': list(zip(self._starts, self._ends)),
+        }
@@ -0,0 +1,235 @@
+import math
+import time
+from array import array
+from threading import Thread, Condition, Event, Lock
+from typing import Any, Optional, Dict, List, Callable
+from .packet import Packet, Command, Direction, calculate_checksum
+from .logger import log
+
+__all__ = ['KKTSimulator']
+
+class KKTSimulator:
+    '''In-process KKT device, injectable as porto of engine (connect/send/recv/close).
+
+    Answers requests with CDC response packets and streams MULTI_RESULTS frames after
+    `SWITCH_COLLECTION_OF_MULTI_RESULTS`, so the whole stack can run without hardware.
+
+    Attributes:
+        registers (Dict[int, int]): hardware register file.
+        command_counts (Dict[int, int]): number of requests received per command, for counting round trips.
+    '''
+    chip_id = 'K60168 00'
+    firmware_version = 'k60168-00000-000-v0.0.1'
+
+    def __init__(self, *, frame_period:float=0.01, chunk_size:int=4096, max_wait:float=0.05):
+        '''
+        Args:
+            frame_period (float, optional): seconds between MULTI_RESULTS frames. Defaults to 0.01.
+            chunk_size (int, optional): max bytes returned by one recv, like the UART driver. Defaults to 4096.
+            max_wait (float, optional): max seconds recv blocks regardless of time_out, keeps engine stop responsive.
+        '''
+        self.frame_period = frame_period
+        self.chunk_size = chunk_size
+        self.max_wait = max_wait
+        self.registers:Dict[int, int] = {}
+        self.write_masks:Dict[int, int] = {} # writable bits of register, all bits if absent
+        self.rfic_registers:Dict[int, int] = {} # RFIC register file, 2 bytes address and value
+        self.rfic_write_masks:Dict[int, int] = {}
+        self.command_counts:Dict[int, int] = {}
+        self.power_saving_mode = 0
+        self.frame_count = 0
+        self.collection:Dict[str, Any] = {'actions': 0}
+        self._out = bytearray() # bytes waiting to be read by recv
+        self._cond = Condition()
+        self._streaming = Event() # cleared to stop current stream thread, a new thread gets a new event
+        self._stream_thread:Optional[Thread] = None
+        self._frame_lock = Lock() # a response and the collection change it reports are atomic against stream frames
+        self._connected = False
+        self._wave:Optional[bytes] = None # cached samples of raw_data
+        self.handlers:Dict[int, Callable[[Packet], bytes]] = {
+            Command.GET_FIRMWARE_VERSION.value: lambda request: self.firmware_version.encode('utf-8'),
+            Command.GET_CHIP_ID.value: lambda request: self.chip_id.encode('utf-8'),
+            Command.REG_WRITE.value: self._reg_write,
+            Command.REG_WRITE_COMPARE.value: self._reg_write_compare,
+            Command.REG_READ.value: self._reg_read,
+            Command.RFIC_REG_WRITE.value: self._rfic_write,
+            Command.RFIC_REG_WRITE_COMPARE.value: self._rfic_write_compare,
+            Command.RFIC_REG_READ.value: self._rfic_read,
+            Command.SWITCH_SPI_CHANNEL.value: lambda request: bytes(request.payload),
+            Command.STOP_POWER_STATE_MACHINE.value: lambda request: bytes(request.payload),
+            Command.SET_POWER_SAVING_MODE.value: self._set_power_saving_mode,
+            Command.GET_POWER_SAVING_MODE.value: lambda request: bytes([self.power_saving_mode]),
+            Command.SWITCH_COLLECTION_OF_MULTI_RESULTS.value: self._switch_collection,
+        }
+
+    # ---- porto interface ----
+    def connect(self, *args, **kwargs):
+        self._connected = True
+        log.info('simulator connected')
+
+    def close(self):
+        self._streaming.clear()
+        if self._stream_thread is not None:
+            self._stream_thread.join()
+            self._stream_thread = None
+        self._connected = False
+        with self._cond:
+            self._out.clear()
+            self._cond.notify_all()
+
+    def send(self, data:bytes):
+        data = bytes(data)
+        start = 0
+        while True:
+            start = data.find(b'$K>', start)
+            if start == -1 or len(data) - start < 8:
+                return
+            payload_length = int.from_bytes(data[start+5:start+7], byteorder='big')
+            end = start + 8 + payload_length
+            self._handle(Packet(Direction.REQUEST.value, data[start+3], payload_length, data[start+7:end - 1], data[end - 1]))
+            start = end
+
+    def recv(self, size:int=4096, time_out:Optional[float]=None)->bytes:
+        '''read up to size bytes, wait up to time_out (None for max_wait, 0 to poll), b'' if nothing arrived'''
+        with self._cond:
+            if not self._out and time_out != 0:
+                self._cond.wait(self.max_wait if time_out is None else min(time_out, self.max_wait))
+            size = min(size, self.chunk_size, len(self._out))
+            data = bytes(self._out[:size])
+            del self._out[:size]
+        return data
+
+    # ---- device ----
+    def response(self, command:int, payload:bytes)->bytes:
+        '''compose response CDC packet with checksum'''
+        packet = Packet(Direction.RESPONSE.value, command, len(payload), payload).CDC_packet
+        return packet[:-1] + bytes([calculate_checksum(packet)])
+
+    def write_out(self, data:bytes)->None:
+        '''append bytes to the read side, as if the device sent them'''
+        with self._cond:
+            self._out += data
+            self._cond.notify_all()
+
+    def _handle(self, request:Packet)->None:
+        self.command_counts[request.command] = self.command_counts.get(request.command, 0) + 1
+        handler = self.handlers.get(request.command)
+        with self._frame_lock:
+            payload = handler(request) if handler is not None else b''
+            self.write_out(self.response(request.command, payload))
+
+    def _write_pairs(self, payload:bytes)->List[bool]:
+        '''write (address, value) pairs in little-endian, return if each register reads back equal'''
+        equal = []
+        for offset in range(0, len(payload) - 7, 8):
+            addr = int.from_bytes(payload[offset:offset+4], byteorder='little')
+            value = int.from_bytes(payload[offset+4:offset+8], byteorder='little')
+            mask = self.write_masks.get(addr, 0xFFFF_FFFF)
+            self.registers[addr] = (self.registers.get(addr, 0) & ~mask) | (value & mask)
+            equal.append(self.registers[addr] == value)
+        return equal
+
+    def _reg_write(self, request:Packet)->bytes:
+        self._write_pairs(bytes(request.payload))
+        return b''
+
+    def _reg_write_compare(self, request:Packet)->bytes:
+        return bytes(0 if equal else 1 for equal in self._write_pairs(bytes(request.payload)))
+
+    def _reg_read(self, request:Packet)->bytes:
+        addr = int.from_bytes(request.payload[:4], byteorder='big')
+        count = int.from_bytes(request.payload[4:8], byteorder='big')
+        return b''.join(self.registers.get(addr + 4 * i, 0).to_bytes(4, byteorder='big') for i in range(count))
+
+    def _rfic_write(self, request:Packet)->bytes:
+        self._rfic_write_compare(request)
+        return b''
+
+    def _rfic_write_compare(self, request:Packet)->bytes:
+        '''write (address, value) pairs of 2 bytes little-endian, return one compare status byte per register'''
+        payload = bytes(request.payload)
+        status = bytearray()
+        for offset in range(0, len(payload) - 3, 4):
+            addr = int.from_bytes(payload[offset:offset+2], byteorder='little')
+            value = int.from_bytes(payload[offset+2:offset+4], byteorder='little')
+            mask = self.rfic_write_masks.get(addr, 0xFFFF)
+            self.rfic_registers[addr] = (self.rfic_registers.get(addr, 0) & ~mask) | (value & mask)
+            status.append(0 if self.rfic_registers[addr] == value else 1)
+        return bytes(status)
+
+    def _rfic_read(self, request:Packet)->bytes:
+        payload = bytes(request.payload)
+        addrs = [int.from_bytes(payload[offset:offset+2], byteorder='little') for offset in range(0, len(payload) - 1, 2)]
+        return b''.join(self.rfic_registers.get(addr, 0).to_bytes(2, byteorder='little') for addr in addrs)
+
+    def _set_power_saving_mode(self, request:Packet)->bytes:
+        self.power_saving_mode = request.payload[0]
+        return b''
+
+    def _switch_collection(self, request:Packet)->bytes:
+        payload = bytes(request.payload)
+        actions = int.from_bytes(payload[1:5], byteorder='big')
+        collection:Dict[str, Any] = {'actions': actions, 'raw_size': 0, 'reg_address': []}
+        offset = 5
+        if actions & 0b1:
+            collection['raw_size'] = int.from_bytes(payload[offset:offset+2], byteorder='big')
+            offset += 2
+        if actions & 0b10:
+            collection['ch_of_RBank'] = payload[offset]
+            offset += 1
+        if actions & 0b100:
+            count = int.from_bytes(payload[offset:offset+2], byteorder='big')
+            offset += 4
+            collection['reg_address'] = [int.from_bytes(payload[offset+4*i:offset+4*i+4], byteorder='big') for i in range(count)]
+            offset += 4 * count
+        if actions & 0b1000:
+            collection['frame_setting'] = int.from_bytes(payload[offset:offset+2], byteorder='big')
+        self.collection = collection
+
+        # frames of the new setting follow the response, stream thread is not joined here as it waits for _frame_lock
+        if actions and self._stream_thread is None:
+            self._streaming = Event()
+            self._streaming.set()
+            self._stream_thread = Thread(target=self._stream, args=(self._streaming,), daemon=True)
+            self._stream_thread.start()
+        elif not actions and self._stream_thread is not None:
+            self._streaming.clear()
+            self._stream_thread = None
+        return payload
+
+    def frame(self)->bytes:
+        '''compose next MULTI_RESULTS packet of current collection setting'''
+        collection = self.collection
+        self.frame_count += 1
+        payload = bytearray(b'\x00') + collection['actions'].to_bytes(4, byteorder='big')
+        if collection['raw_size']:
+            payload += bytes([0, 0]) + collection['raw_size'].to_bytes(2, byteorder='big')
+            payload += self.raw_data(collection['raw_size'])
+        if collection['reg_address']:
+            values = b''.join(self.registers.get(addr, 0).to_bytes(4, byteorder='big') for addr in collection['reg_address'])
+            payload += bytes([0, 2]) + len(values).to_bytes(2, byteorder='big') + values
+        return self.response(Command.GET_COLLECTION_OF_MULTI_RESULTS.value, bytes(payload))
+
+    def raw_data(self, size:int)->bytes:
+        '''synthetic uint16 little-endian ADC samples, a tone that drifts with frame count'''
+        n = size // 2
+        if self._wave is None or len(self._wave) < 2 * (n + 256):
+            self._wave = array('H', (int(2048 + 1000 * math.sin(0.05 * i)) for i in range(n + 256))).tobytes()
+        shift = 2 * (self.frame_count % 256)
+        return self._wave[shift:shift + 2 * n] + bytes(size - 2 * n)
+
+    def _stream(self, streaming:Event):
+        # the switch response is written before any frame, as this thread is started while _handle holds _frame_lock.
+        # first frame is measured one period after switch, in sniff mode (frame_setting) frames are buffered
+        # and a burst of frame_setting frames is sent back-to-back when the last of them is measured
+        next_time = time.monotonic()
+        while streaming.is_set():
+            frames = max(self.collection.get('frame_setting', 0), 1)
+            next_time += frames * self.frame_period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self._frame_lock:
+                if not streaming.is_set():
+                    break
+                self.write_out(b''.join(self.frame() for _ in range(frames)))
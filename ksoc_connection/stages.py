@@ -0,0 +1,152 @@
+from typing import Any, Union, Optional, Dict, List, Callable, Sequence
+import numpy as np
+from .packet import Command
+from .logger import log
+
+__all__ = ['StageFrame', 'ReceivePipeline', 'Decimate', 'ChirpAverage', 'SelectChannel', 'Threshold', 'RAW_ACTION']
+
+RAW_ACTION = 0 # action number of raw data block in multi results (actions bit 0b1)
+HEADER_WORDS = 2 # uint16 words in front of raw samples, raw_size = (chirps * samples + 2) * 2
+
+class StageFrame:
+    '''Multi results packet split into payload header and action blocks, passed through pipeline stages.
+
+    Blocks are zero-copy memoryviews of the received packet until a stage replaces them.
+    '''
+    def __init__(self, packet:bytes):
+        view = memoryview(packet)
+        payload_length = int.from_bytes(packet[5:7], byteorder='big')
+        payload = view[7:7 + payload_length]
+        self.packet = packet
+        self.header = payload[:5]
+        self.blocks:Dict[int, Any] = {}
+        self.modified = False
+        offset = 5
+        while offset + 4 <= len(payload):
+            action_num = payload[offset + 1]
+            data_length = int.from_bytes(payload[offset + 2:offset + 4], byteorder='big')
+            self.blocks[action_num] = payload[offset + 4:offset + 4 + data_length]
+            offset += 4 + data_length
+
+    def raw(self, action:int=RAW_ACTION)->np.ndarray:
+        '''raw block as uint16 array (header words included), read only view when not replaced'''
+        block = self.blocks[action]
+        return block if isinstance(block, np.ndarray) else np.frombuffer(block, dtype=np.uint16)
+
+    def set_raw(self, data:np.ndarray, action:int=RAW_ACTION)->None:
+        self.blocks[action] = np.ascontiguousarray(data, dtype=np.uint16)
+        self.modified = True
+
+    def to_packet(self)->bytes:
+        '''compose CDC packet, the original packet is returned if no stage modified blocks'''
+        if not self.modified:
+            return self.packet
+        parts = [bytes(self.header)]
+        for action_num, block in self.blocks.items():
+            data = block.tobytes() if isinstance(block, np.ndarray) else bytes(block)
+            parts.append(bytes([0, action_num]) + len(data).to_bytes(2, byteorder='big'))
+            parts.append(data)
+        payload = b''.join(parts)
+        packet = bytearray(self.packet[:5]) + len(payload).to_bytes(2, byteorder='big') + payload + b'\x00'
+        packet[-1] = (-int(np.frombuffer(packet, dtype=np.uint8)[3:-1].sum(dtype=np.uint64))) & 0xFF
+        return bytes(packet)
+
+Stage = Callable[[StageFrame], Optional[StageFrame]]
+
+class ReceivePipeline:
+    '''Stages run by engine thread on multi results packets before they are queued.
+
+    A stage takes a StageFrame and returns it (modified or not), or None to drop the frame.
+    A stage raising an exception drops the frame too, it is counted in `errors` and the engine thread goes on.
+    '''
+    def __init__(self, stages:Sequence[Stage]=()):
+        self.stages:List[Stage] = list(stages)
+        self.frames_in = 0
+        self.frames_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors = 0 # frames dropped by a failing stage
+
+    def __call__(self, packet:bytes)->Optional[bytes]:
+        if packet[3] != Command.GET_COLLECTION_OF_MULTI_RESULTS.value or not self.stages:
+            return packet
+        self.frames_in += 1
+        self.bytes_in += len(packet)
+        stage:Any = StageFrame
+        try:
+            frame:Optional[StageFrame] = StageFrame(packet)
+            for stage in self.stages:
+                frame = stage(frame)
+                if frame is None:
+                    return None
+            packet = frame.to_packet()
+        except Exception as error:
+            self.errors += 1
+            log.warning('receive stage %r failed, frame dropped: %s', stage, error)
+            return None
+        self.frames_out += 1
+        self.bytes_out += len(packet)
+        return packet
+
+    def stats(self)->Dict[str, int]:
+        return {'frames_in': self.frames_in, 'frames_out': self.frames_out,
+                'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out, 'errors': self.errors}
+
+class Decimate:
+    '''Keep every n-th frame.'''
+    def __init__(self, n:int):
+        assert n >= 1, f'n must be >= 1, but got {n}'
+        self.n = n
+        self.count = 0
+
+    def __call__(self, frame:StageFrame)->Optional[StageFrame]:
+        self.count += 1
+        return frame if (self.count - 1) % self.n == 0 else None
+
+class ChirpAverage:
+    '''Average raw samples over chirps, raw block becomes header words + `samples` averaged samples.'''
+    def __init__(self, chirps:int, samples:int, *, header_words:int=HEADER_WORDS, action:int=RAW_ACTION):
+        self.chirps = chirps
+        self.samples = samples
+        self.header_words = header_words
+        self.action = action
+
+    def __call__(self, frame:StageFrame)->Optional[StageFrame]:
+        if self.action not in frame.blocks:
+            return frame
+        raw = frame.raw(self.action)
+        data = raw[self.header_words:self.header_words + self.chirps * self.samples].reshape(self.chirps, -1)
+        averaged = data.mean(axis=0, dtype=np.float32).round().astype(np.uint16)
+        frame.set_raw(np.concatenate((raw[:self.header_words], averaged)), self.action)
+        return frame
+
+class SelectChannel:
+    '''Keep one RX channel of raw samples interleaved by RBank channel (ch_of_RBank with several RX enabled).'''
+    def __init__(self, channel:int, channels:int, *, header_words:int=HEADER_WORDS, action:int=RAW_ACTION):
+        assert 0 <= channel < channels, f'channel must be in [0, {channels}), but got {channel}'
+        self.channel = channel
+        self.channels = channels
+        self.header_words = header_words
+        self.action = action
+
+    def __call__(self, frame:StageFrame)->Optional[StageFrame]:
+        if self.action not in frame.blocks:
+            return frame
+        raw = frame.raw(self.action)
+        frame.set_raw(np.concatenate((raw[:self.header_words], raw[self.header_words + self.channel::self.channels])), self.action)
+        return frame
+
+class Threshold:
+    '''Drop frames whose raw samples deviate from their mean by less than `threshold` (no target / idle).'''
+    def __init__(self, threshold:float, *, header_words:int=HEADER_WORDS, action:int=RAW_ACTION):
+        self.threshold = threshold
+        self.header_words = header_words
+        self.action = action
+
+    def __call__(self, frame:StageFrame)->Optional[StageFrame]:
+        if self.action not in frame.blocks:
+            return frame
+        data = frame.raw(self.action)[self.header_words:]
+        if data.size == 0 or np.abs(data - data.mean(dtype=np.float64)).max() < self.threshold:
+            return None
+        return frame
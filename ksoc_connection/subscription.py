@@ -0,0 +1,92 @@
+import time
+from typing import Optional, Dict, List, Iterable, Sequence
+import numpy as np
+
+__all__ = ['RegisterSeries', 'RegisterSubscription']
+
+class RegisterSeries:
+    '''Time series of one register in a NumPy ring, oldest values are overwritten.'''
+    def __init__(self, addr:int, capacity:int=1024):
+        self.addr = addr
+        self.capacity = capacity
+        self._values = np.zeros(capacity, dtype=np.uint32)
+        self._frames = np.zeros(capacity, dtype=np.int64) # index of multi results frame
+        self._timestamps = np.zeros(capacity, dtype=np.int64) # monotonic_ns when decoded
+        self.count = 0 # total number of values appended
+
+    def append(self, frame:int, value:int, timestamp:int)->None:
+        i = self.count % self.capacity
+        self._values[i] = value
+        self._frames[i] = frame
+        self._timestamps[i] = timestamp
+        self.count += 1
+
+    def __len__(self)->int:
+        return min(self.count, self.capacity)
+
+    def _ordered(self, ring:np.ndarray)->np.ndarray:
+        if self.count <= self.capacity:
+            return ring[:self.count].copy()
+        i = self.count % self.capacity
+        return np.concatenate((ring[i:], ring[:i]))
+
+    @property
+    def values(self)->np.ndarray:
+        '''register values from oldest to newest'''
+        return self._ordered(self._values)
+
+    @property
+    def frames(self)->np.ndarray:
+        '''frame index of each value'''
+        return self._ordered(self._frames)
+
+    @property
+    def timestamps(self)->np.ndarray:
+        '''monotonic_ns of each value'''
+        return self._ordered(self._timestamps)
+
+    @property
+    def latest(self)->Optional[int]:
+        if self.count == 0:
+            return None
+        return int(self._values[(self.count - 1) % self.capacity])
+
+class RegisterSubscription:
+    '''Registers read out by device with every MULTI_RESULTS frame (reg_address list of collection).'''
+    def __init__(self, capacity:int=1024):
+        self.capacity = capacity
+        self.series:Dict[int, RegisterSeries] = {}
+        self.frames = 0 # number of frames decoded
+
+    @property
+    def addresses(self)->List[int]:
+        return list(self.series)
+
+    def add(self, addrs:Iterable[int])->bool:
+        '''subscribe addresses, True if subscription changed'''
+        changed = False
+        for addr in addrs:
+            if addr not in self.series:
+                self.series[addr] = RegisterSeries(addr, self.capacity)
+                changed = True
+        return changed
+
+    def remove(self, addrs:Iterable[int])->bool:
+        '''unsubscribe addresses, True if subscription changed'''
+        changed = False
+        for addr in addrs:
+            changed = self.series.pop(addr, None) is not None or changed
+        return changed
+
+    def decode(self, block:bytes, order:Sequence[int], timestamp:Optional[int]=None)->bool:
+        '''decode register block of a frame (4 bytes big-endian per register in `order`), False if layout differs'''
+        if len(block) != 4 * len(order):
+            return False
+        timestamp = time.monotonic_ns() if timestamp is None else timestamp
+        values = np.frombuffer(block, dtype='>u4')
+        for addr, value in zip(order, values.tolist()):
+            series = self.series.get(addr)
+            if series is not None:
+                series.append(self.frames, value, timestamp)
+        self.frames += 1
+        return True
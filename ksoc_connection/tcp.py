@@ -0,0 +1,58 @@
+import socket
+import select
+from typing import Optional, Tuple
+from .logger import log
+
+__all__ = ['KKTSocket']
+
+class KKTSocket:
+    '''TCP transport of CDC packets, porto of engine (connect/send/recv/close) for KKTWIFIConnection.
+
+    Works with KKT devices on network and with KKTGateway.
+    '''
+    def __init__(self, *, max_wait:float=0.1):
+        '''
+        Args:
+            max_wait (float, optional): max seconds recv blocks regardless of time_out, keeps engine stop responsive.
+        '''
+        self.max_wait = max_wait
+        self.sock:Optional[socket.socket] = None
+
+    @property
+    def address(self)->Optional[Tuple[str, int]]:
+        return self.sock.getpeername()[:2] if self.sock is not None else None
+
+    def connect(self, host:str, port:int, *, timeout:float=5.0):
+        '''
+        Args:
+            host (str): IP address of device or gateway.
+            port (int): TCP port.
+            timeout (float, optional): connect timeout in seconds. Defaults to 5.
+        '''
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # requests are small, do not wait to coalesce
+        log.info(f'socket connected to {host}:{port}')
+
+    def send(self, data:bytes):
+        self.sock.sendall(data)
+
+    def recv(self, size:int=4096, time_out:Optional[float]=None)->bytes:
+        '''read up to size bytes, b'' if nothing arrived in time, raise ConnectionError if peer closed'''
+        wait = self.max_wait if time_out is None else min(time_out, self.max_wait)
+        readable, _, _ = select.select([self.sock], [], [], wait)
+        if not readable:
+            return b''
+        data = self.sock.recv(size)
+        if not data:
+            raise ConnectionError('socket closed by peer')
+        return data
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError: # already disconnected
+                pass
+            self.sock.close()
+            self.sock = None
@@ -0,0 +1,106 @@
+import time
+from array import array
+from enum import IntEnum
+from typing import Any, Optional, Dict, List, Tuple
+
+__all__ = ['TraceEvent', 'TraceRing']
+
+class TraceEvent(IntEnum):
+    '''Event id of per-packet trace record.'''
+    TX_WRITE = 1 # request written to porto (engine.send)
+    RX_FIRST_BYTE = 2 # first bytes of a packet read by CDCCollection
+    FRAME_COMPLETE = 3 # CDCCollection composed a complete packet
+    ENQUEUE = 4 # engine put packet into recv queue
+    DEQUEUE = 5 # receiveCDCPacket got packet from recv queue
+    PARSE = 6 # getMultiResults parsed packet
+
+# (name of span, start event, end event) drawn as complete events in trace viewer
+SPANS:Tuple[Tuple[str, TraceEvent, TraceEvent], ...] = (
+    ('round trip', TraceEvent.TX_WRITE, TraceEvent.FRAME_COMPLETE),
+    ('receive', TraceEvent.RX_FIRST_BYTE, TraceEvent.FRAME_COMPLETE),
+    ('queued', TraceEvent.ENQUEUE, TraceEvent.DEQUEUE),
+    ('parse', TraceEvent.DEQUEUE, TraceEvent.PARSE),
+)
+SPAN_TID = 100 # lanes of spans start after lanes of events
+
+class TraceRing:
+    '''Fixed-size ring of (timestamp, event id, command, length) records.
+
+    Storage is preallocated typed arrays, `record` only overwrites slots so tracing never grows memory.
+    When the ring is full the oldest records are overwritten.
+    '''
+    def __init__(self, capacity:int=1 << 16):
+        assert capacity > 0 and capacity & (capacity - 1) == 0, f'capacity must be power of 2, but got {capacity}'
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self.timestamps = array('q', bytes(8 * capacity)) # perf_counter_ns
+        self.events = array('B', bytes(capacity))
+        self.commands = array('B', bytes(capacity))
+        self.lengths = array('L', bytes(array('L').itemsize * capacity))
+        self.index = 0 # total number of records, next slot is index & mask
+
+    def record(self, event:int, command:int=0, length:int=0)->None:
+        '''record one event, called on hot path'''
+        i = self.index & self._mask
+        self.index += 1
+        self.timestamps[i] = time.perf_counter_ns()
+        self.events[i] = event
+        self.commands[i] = command
+        self.lengths[i] = length
+
+    def clear(self)->None:
+        self.index = 0
+
+    def __len__(self)->int:
+        return min(self.index, self.capacity)
+
+    def records(self)->List[Tuple[int, int, int, int]]:
+        '''Get records from oldest to newest as (timestamp_ns, event, command, length).'''
+        end = self.index
+        start = max(0, end - self.capacity)
+        result = []
+        for n in range(start, end):
+            i = n & self._mask
+            result.append((self.timestamps[i], self.events[i], self.commands[i], self.lengths[i]))
+        return result
+
+    def to_chrome_trace(self, pid:int=0)->Dict[str, Any]:
+        '''Convert records to Chrome/Perfetto trace event JSON object.
+
+        Every record is an instant event on the lane of its event id. Consecutive stages of the same
+        command are paired into complete events ("round trip", "receive", "queued", "parse").
+        '''
+        records = self.records()
+        base = records[0][0] if records else 0
+        trace_events:List[Dict[str, Any]] = []
+        for event in TraceEvent:
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': int(event),
+                                 'args': {'name': event.name}})
+        for n, (name, _, _) in enumerate(SPANS):
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': SPAN_TID + n,
+                                 'args': {'name': name}})
+
+        opened:Dict[Tuple[TraceEvent, int], List[int]] = {} # (start event, command) -> start timestamps
+        for timestamp, event, command, length in records:
+            ts = (timestamp - base) / 1000
+            trace_events.append({'name': TraceEvent(event).name, 'ph': 'i', 's': 't', 'ts': ts,
+                                 'pid': pid, 'tid': event, 'args': {'cmd': hex(command), 'length': length}})
+            for n, (name, start, end) in enumerate(SPANS):
+                if event == start:
+                    opened.setdefault((start, command), []).append(timestamp)
+                elif event == end:
+                    starts = opened.get((start, command))
+                    if not starts and start == TraceEvent.RX_FIRST_BYTE:
+                        starts = opened.get((start, 0)) # first bytes may not contain command yet
+                    if starts:
+                        begin = starts.pop(0)
+                        trace_events.append({'name': name, 'ph': 'X', 'ts': (begin - base) / 1000,
+                                             'dur': (timestamp - begin) / 1000, 'pid': pid, 'tid': SPAN_TID + n,
+                                             'args': {'cmd': hex(command), 'length': length}})
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ns'}
+
+    def dump(self, path:str, pid:int=0)->None:
+        '''Write Chrome trace JSON file, open it by chrome://tracing or https://ui.perfetto.dev'''
+        import json
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(pid=pid), f)
@@ -0,0 +1,120 @@
+import time
+from collections import deque
+from enum import IntEnum
+from threading import Thread, Condition, Lock
+from typing import Any, Optional, Dict, List, Tuple, Deque, Callable
+from .logger import log
+
+__all__ = ['TxPriority', 'TxScheduler']
+
+class TxPriority(IntEnum):
+    '''Priority class of outgoing packet, lower value is written first.'''
+    CONTROL = 0 # single register access, mode switches, collection switch
+    BULK = 1 # batched register transfers, profiles, scripted custom packets
+
+# queued packet: data, command, priority, enqueue time (perf_counter_ns)
+TxItem = Tuple[bytes, Optional[int], TxPriority, int]
+
+class TxScheduler(Thread):
+    '''Single writer of porto, so packets of concurrent callers never interleave.
+
+    Queued packets are written in priority order (strict, CONTROL before BULK), back-to-back small packets are
+    coalesced into one write of at most `coalesce_bytes`. Before `start` and after `stop`, `submit` writes
+    synchronously under the same lock and a failed write raises to the caller. A write failing on the writer
+    thread is kept in `error` and raised by the next `submit` or `check`.
+    '''
+    def __init__(self, write:Callable[[bytes], Any], *, coalesce_bytes:int=1024,
+                 on_write:Optional[Callable[[List[TxItem]], None]]=None):
+        '''
+        Args:
+            write (Callable[[bytes], Any]): porto.send.
+            coalesce_bytes (int, optional): max bytes of packets coalesced into one write. Defaults to 1024.
+            on_write (Callable[[List[TxItem]], None], optional): called by writer thread after each write, for metrics and trace.
+        '''
+        super().__init__(daemon=True)
+        self.write = write
+        self.coalesce_bytes = coalesce_bytes
+        self.on_write = on_write
+        self.queues:List[Deque[TxItem]] = [deque() for _ in TxPriority]
+        self._cond = Condition()
+        self._write_lock = Lock()
+        self.running = False
+        self.writes = 0 # porto writes
+        self.packets = 0 # packets written
+        self.errors = 0 # failed writes, their packets are lost
+        self.error:Optional[Exception] = None # first failed write of writer thread not reported yet, see check
+
+    def submit(self, data:bytes, cmd:Optional[int]=None, priority:TxPriority=TxPriority.CONTROL)->None:
+        '''queue packet for writer thread, or write it now if scheduler is not running'''
+        self.check()
+        item = (data, cmd, priority, time.perf_counter_ns())
+        with self._cond:
+            if self.running:
+                self.queues[priority].append(item)
+                self._cond.notify()
+                return
+        self._write([item])
+
+    def check(self)->None:
+        '''raise error of a failed write of writer thread once, its packets were lost'''
+        error = self.error
+        if error is not None:
+            self.error = None
+            raise error
+
+    def pending(self)->Dict[str, int]:
+        '''number of queued packets per priority class'''
+        return {priority.name.lower(): len(self.queues[priority]) for priority in TxPriority}
+
+    def start(self):
+        self.running = True
+        super().start()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self.running and not any(self.queues):
+                    self._cond.wait()
+                if not any(self.queues): # stopped and drained
+                    break
+                batch = self._take()
+            try:
+                self._write(batch)
+            except Exception as error:
+                if self.error is None: # keep first error, later ones are usually caused by it
+                    self.error = error
+
+    def _take(self)->List[TxItem]:
+        '''pop next batch, highest priority first, called with lock held'''
+        batch:List[TxItem] = []
+        size = 0
+        for queue in self.queues:
+            while queue and (not batch or size + len(queue[0][0]) <= self.coalesce_bytes):
+                item = queue.popleft()
+                batch.append(item)
+                size += len(item[0])
+            if size >= self.coalesce_bytes or queue:
+                break
+        return batch
+
+    def _write(self, batch:List[TxItem])->None:
+        data = batch[0][0] if len(batch) == 1 else b''.join(item[0] for item in batch)
+        with self._write_lock:
+            try:
+                self.write(data)
+            except Exception as error:
+                self.errors += 1
+                log.warning('tx write of %d packets failed: %s', len(batch), error)
+                raise
+            self.writes += 1
+            self.packets += len(batch)
+        if self.on_write is not None:
+            self.on_write(batch)
+
+    def stop(self)->None:
+        '''write queued packets and stop writer thread'''
+        with self._cond:
+            self.running = False
+            self._cond.notify()
+        if self.is_alive():
+            self.join()
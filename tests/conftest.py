@@ -0,0 +1,10 @@
+import pytest
+from ksoc_connection import KKTIntegration, KKTSimulatorConnection
+
+@pytest.fixture
+def integration():
+    '''KKTIntegration connected to simulated device, `integration.connection.device` is the simulator.'''
+    integration = KKTIntegration(KKTSimulatorConnection(frame_period=0.005))
+    integration.connectDevice()
+    yield integration
+    integration.disconnectDevice()
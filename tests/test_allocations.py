@@ -0,0 +1,54 @@
+from ksoc_connection import AllocationProfiler, KKTSimulator
+from ksoc_connection.engine import CDCCollection
+import pytest
+
+# bytes still held per frame after a window of frames, a leak of one packet per frame is hundreds of bytes
+BUDGET = 16
+
+def _held(report, *, exclude=('simulator',))->float:
+    return sum(size for stage, (size, count) in report.stages.items() if stage not in exclude) / report.frames
+
+@pytest.mark.finished
+def test_framer_budget_on_replayed_stream():
+    device = KKTSimulator()
+    device.collection = {'actions': 0b1, 'raw_size': 1024, 'reg_address': []}
+    stream = b''.join(device.frame() for _ in range(300))
+    collection = CDCCollection()
+    collection.set_checksum_policy('full')
+    def replay(data:bytes, read:int=1000):
+        for offset in range(0, len(data), read):
+            packet = collection.collect(data[offset:offset + read])
+            while packet is not None:
+                packet = collection.collect(b'')
+    replay(stream[:len(stream) // 3]) # warm up
+    profiler = AllocationProfiler()
+    profiler.start()
+    replay(stream[len(stream) // 3:])
+    report = profiler.stop(frames=200)
+    assert _held(report) <= BUDGET, report.format()
+
+@pytest.mark.finished
+def test_stream_budget(integration):
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=256)
+    for _ in range(20):
+        integration.getMultiResults()
+    with AllocationProfiler(integration.connection.engine) as profiler:
+        for _ in range(100):
+            integration.getMultiResults()
+    integration.switchCollectionOfMultiResults(actions=0)
+    report = profiler.report
+    assert report.frames >= 100
+    assert _held(report) <= BUDGET, report.format()
+
+@pytest.mark.finished
+def test_leak_attributed_to_stage(integration):
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=256)
+    integration.getMultiResults()
+    kept = []
+    with AllocationProfiler(integration.connection.engine) as profiler:
+        for _ in range(50):
+            kept.append(integration.getMultiResults()) # caller keeps parsed dicts
+    integration.switchCollectionOfMultiResults(actions=0)
+    per_frame = profiler.report.per_frame()
+    assert per_frame['parse']['bytes'] * profiler.report.frames / len(kept) >= 256
+    assert _held(profiler.report) > BUDGET
@@ -0,0 +1,51 @@
+import os
+import numpy as np
+from ksoc_connection.archive import ArchiveWriter, ArchiveReader
+import pytest
+
+def _frames(count:int):
+    rng = np.random.default_rng(0)
+    for n in range(count):
+        raw = rng.integers(0, 1 << 16, size=34, dtype=np.uint16).tobytes()
+        yield {0: raw, 2: n.to_bytes(4, byteorder='big')}
+
+@pytest.mark.finished
+@pytest.mark.parametrize('codec', ['zlib', 'lzma', 'none'])
+def test_round_trip(tmp_path, codec):
+    path = str(tmp_path / 'capture.ksa')
+    frames = list(_frames(50))
+    with ArchiveWriter(path, codec=codec, frames_per_chunk=8) as writer:
+        for n, frame in enumerate(frames):
+            writer.write(frame, timestamp=1000 + n)
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 50
+        assert len(reader.index) == 7
+        assert list(reader) == frames
+        assert reader.read(13, 21) == frames[13:21]
+        assert reader[-1] == frames[-1]
+        assert [timestamp for timestamp, _ in reader.records(6, 10)] == [1006, 1007, 1008, 1009]
+
+@pytest.mark.finished
+def test_range_read_decodes_only_needed_chunks(tmp_path):
+    path = str(tmp_path / 'capture.ksa')
+    with ArchiveWriter(path, frames_per_chunk=10, background=False) as writer:
+        for frame in _frames(100):
+            writer.write(frame)
+    with ArchiveReader(path) as reader:
+        decoded = []
+        chunk = reader._chunk
+        reader._chunk = lambda i: decoded.append(i) or chunk(i)
+        reader.read(35, 45)
+        assert decoded == [3, 4]
+
+@pytest.mark.finished
+def test_recover_without_index(tmp_path):
+    path = str(tmp_path / 'capture.ksa')
+    frames = list(_frames(20))
+    writer = ArchiveWriter(path, frames_per_chunk=8, background=False)
+    for frame in frames:
+        writer.write(frame)
+    writer.file.flush() # capture process died before close
+    with ArchiveReader(path) as reader:
+        assert reader.read() == frames[:16]
+    writer.file.close()
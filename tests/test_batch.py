@@ -0,0 +1,58 @@
+import time
+from queue import Empty
+import numpy as np
+from ksoc_connection import BatchProcessor, KKTClassStatus
+import pytest
+
+CHIRPS, SAMPLES = 4, 32
+
+def range_profile(batch:np.ndarray)->np.ndarray:
+    '''mean range FFT magnitude over chirps, per frame'''
+    return np.abs(np.fft.rfft(batch.astype(np.float32), axis=-1)).mean(axis=1)
+
+def slow_sum(batch:np.ndarray)->np.ndarray:
+    time.sleep(0.2)
+    return batch.sum(axis=1, dtype=np.int64)
+
+def _raw(n:int)->bytes:
+    samples = (np.arange(CHIRPS * SAMPLES) * (n + 1)) % 4096
+    return np.concatenate(([0, 0], samples)).astype('<u2').tobytes() # 2 header words
+
+@pytest.mark.finished
+def test_results_in_frame_order():
+    frames = [{0: _raw(n)} for n in range(21)]
+    with BatchProcessor(range_profile, batch_frames=4, workers=2, frame_shape=(CHIRPS, SAMPLES)) as processor:
+        for frame in frames:
+            assert processor.feed(frame)
+        processor.flush()
+        results = [processor.get(timeout=10) for _ in range(processor.pending)]
+        with pytest.raises(Empty):
+            processor.get(timeout=0)
+    assert [first for first, _ in results] == list(range(0, 21, 4))
+    profiles = np.concatenate([result for _, result in results])
+    expected = range_profile(np.stack([np.frombuffer(frame[0], dtype='<u2')[2:].reshape(CHIRPS, SAMPLES) for frame in frames]))
+    assert np.allclose(profiles, expected)
+
+@pytest.mark.finished
+def test_backpressure_drops_after_timeout():
+    with BatchProcessor(slow_sum, batch_frames=2, workers=1, max_batches=1) as processor:
+        assert processor.feed(_raw(0)) and processor.feed(_raw(1)) # block submitted
+        assert not processor.feed(_raw(2), timeout=0.01) # no free block while worker runs
+        assert processor.feed(_raw(3), timeout=10) # waits for block
+        assert processor.dropped == 1 and processor.frames == 3
+        first, sums = processor.get(timeout=10)
+        assert first == 0 and sums.tolist() == [np.frombuffer(_raw(n), dtype='<u2')[2:].sum() for n in (0, 1)]
+        with pytest.raises(ValueError):
+            processor.feed(b'\x00' * 8)
+
+@pytest.mark.finished
+def test_stream_to_processor(integration):
+    raw_size = (CHIRPS * SAMPLES + 2) * 2
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=raw_size)
+    with BatchProcessor(range_profile, batch_frames=8, workers=2, frame_shape=(CHIRPS, SAMPLES)) as processor:
+        for _ in range(16):
+            status, frame = integration.getMultiResults()
+            assert status == KKTClassStatus.KKT_SUCCESS
+            processor.feed(frame)
+        assert [processor.get(timeout=10)[1].shape for _ in range(2)] == [(8, SAMPLES // 2 + 1)] * 2
+    integration.switchCollectionOfMultiResults(actions=0)
@@ -0,0 +1,89 @@
+from threading import Thread, Event
+import numpy as np
+from ksoc_connection import KKTClassStatus, KKTSimulator, BurstDrain
+import pytest
+
+SAMPLES = 64
+SNIFF = dict(actions=0b1001, raw_size=(SAMPLES + 2) * 2, frame_setting=8)
+
+def _expected(device, frame_count:int)->np.ndarray:
+    '''raw samples the simulator sent in frame number frame_count'''
+    count = device.frame_count
+    device.frame_count = frame_count
+    raw = np.frombuffer(device.raw_data(SNIFF['raw_size']), dtype=np.uint16)[2:]
+    device.frame_count = count
+    return raw
+
+@pytest.mark.finished
+def test_drain_burst(integration):
+    device = integration.connection.device
+    status, frames, timing = integration.drainBurst(8, config=SNIFF)
+    integration.switchCollectionOfMultiResults(actions=0)
+    assert status == KKTClassStatus.KKT_SUCCESS and frames.shape == (8, SAMPLES)
+    assert timing.frames == 8 and timing.duration < timing.wait # back-to-back burst after 8 buffered frame periods
+    for row, frame in enumerate(frames):
+        assert np.array_equal(frame, _expected(device, row + 1))
+
+@pytest.mark.finished
+def test_drain_burst_reuses_out(integration):
+    out = np.zeros((20, SAMPLES), dtype=np.uint16)
+    status, frames, timing = integration.drainBurst(20, config=SNIFF, out=out, gap=0.02) # burst shorter than out
+    assert status == KKTClassStatus.KKT_SUCCESS and len(frames) == 8 and np.shares_memory(frames, out)
+    status, frames, timing = integration.drainBurst(8, out=out) # next burst of current setting
+    integration.switchCollectionOfMultiResults(actions=0)
+    assert status == KKTClassStatus.KKT_SUCCESS and len(frames) == 8 and timing.wait > timing.duration
+
+@pytest.mark.finished
+def test_drain_burst_errors(integration):
+    status, frames, timing = integration.drainBurst(4, out=np.empty((4, SAMPLES), dtype=np.uint16), timeout=0.05)
+    assert status == KKTClassStatus.KKT_ERROR_IO_TIMEOUT and len(frames) == 0 and timing.frames == 0
+    status, frames, timing = integration.drainBurst(4, config=SNIFF, out=np.empty((4, SAMPLES + 1), dtype=np.uint16))
+    integration.switchCollectionOfMultiResults(actions=0)
+    assert status == KKTClassStatus.KKT_ERROR_REQUEST_FAILED
+    assert not integration.connection.engine.handlers # drain unregistered
+
+@pytest.mark.finished
+def test_full_drain_unregisters_before_wait(integration):
+    engine = integration.connection.engine
+    integration.switchCollectionOfMultiResults(**SNIFF)
+    drain = BurstDrain(engine, np.empty((8, SAMPLES), dtype=np.uint16))
+    assert drain.done.wait(1)
+    assert not engine.handlers # unregistered on engine thread when out is full, wait was never called
+    integration.switchCollectionOfMultiResults(actions=0)
+
+class FakeEngine:
+    '''engine.on/off stand-in, frames are fed by the test'''
+    epoch = 0
+    def on(self, command, handler):
+        return handler
+    def off(self, registration):
+        pass
+
+class PausedDrain(BurstDrain):
+    '''drain whose engine thread stops inside the first frame copy, after its done check'''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.copying = Event()
+        self.resume = Event()
+
+    def _find(self, packet:bytes)->int:
+        self.copying.set()
+        self.resume.wait(1)
+        return super()._find(packet)
+
+@pytest.mark.finished
+def test_close_waits_for_frame_being_copied():
+    device = KKTSimulator()
+    device.collection = {'actions': 0b1, 'raw_size': SNIFF['raw_size'], 'reg_address': []}
+    drain = PausedDrain(FakeEngine(), np.zeros((4, SAMPLES), dtype=np.uint16))
+    engine_thread = Thread(target=drain._on_frame, args=(device.frame(),))
+    engine_thread.start()
+    assert drain.copying.wait(1)
+    closer = Thread(target=drain.close) # caller ends the burst while the engine thread copies
+    closer.start()
+    closer.join(0.05)
+    assert closer.is_alive() # close waits for the copy
+    drain.resume.set()
+    closer.join(1)
+    engine_thread.join(1)
+    assert drain.frames == drain.timing.frames == 1 # counted before finishing, not after
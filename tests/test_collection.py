@@ -0,0 +1,67 @@
+import time
+from ksoc_connection import KKTClassStatus, KKTSimulator, Packet
+import pytest
+
+SWITCH = 0xAA
+
+@pytest.mark.finished
+def test_stale_frames_dropped(integration):
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+    time.sleep(0.1) # frames of first setting pile up unread
+    epoch = integration.collection_epoch
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=128)
+    assert integration.collection_epoch == epoch + 1
+    for _ in range(3):
+        status, data = integration.getMultiResults()
+        assert status == KKTClassStatus.KKT_SUCCESS and len(data[0]) == 128
+    assert integration.connection.engine.metrics.stale_frames >= 5
+
+    time.sleep(0.1) # frames of second setting pile up unread
+    integration.switchCollectionOfMultiResults(actions=0)
+    assert integration.connection.engine.CDC_response_only.empty() # released at switch off
+    assert integration.connection.engine.metrics.stale_frames >= 10
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=256)
+    status, data = integration.getMultiResults()
+    assert len(data[0]) == 256
+    integration.switchCollectionOfMultiResults(actions=0)
+
+@pytest.mark.finished
+def test_collection_session(integration):
+    device = integration.connection.device
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+    switches = device.command_counts[SWITCH]
+    with integration.collection_session(dict(actions=0b1, raw_size=512)) as epoch:
+        assert device.command_counts[SWITCH] == switches + 1 # one round trip, collection is not stopped between
+        assert epoch == integration.collection_epoch
+        for _ in range(3):
+            status, data, timestamp = integration.getMultiResults(with_timestamp=True)
+            assert len(data[0]) == 512
+    assert device.command_counts[SWITCH] == switches + 2
+    assert integration.collection_config['raw_size'] == 64 and integration.collection_epoch == epoch + 1
+    assert len(integration.getMultiResults()[1][0]) == 64
+    integration.switchCollectionOfMultiResults(actions=0)
+
+    with integration.collection_session(dict(actions=0b1, raw_size=128)):
+        assert len(integration.getMultiResults()[1][0]) == 128
+    assert device.collection['actions'] == 0
+
+@pytest.mark.finished
+def test_switch_response_before_first_frame():
+    device = KKTSimulator(frame_period=0) # no period between switch and first frame
+    device.connect()
+    try:
+        for _ in range(20):
+            payload = bytearray(7)
+            payload[1:5] = (0b1).to_bytes(4, byteorder='big')
+            payload[5:7] = (64).to_bytes(2, byteorder='big')
+            request = Packet('>', SWITCH, len(payload), payload)
+            request.update_checksum()
+            device.send(request.CDC_packet)
+            assert device.recv(4096, time_out=1)[3] == SWITCH
+            off = Packet('>', SWITCH, 5, bytes(5))
+            off.update_checksum()
+            device.send(off.CDC_packet)
+            while device.recv(4096, time_out=0.01): # frames in front of switch off response
+                pass
+    finally:
+        device.close()
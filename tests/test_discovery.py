@@ -0,0 +1,78 @@
+import os
+import time
+from ksoc_connection import PortDiscovery, PortInfo
+import pytest
+
+IDS = {(0x0416, 0xDC02): 'Nu_Dongle', (0x152D, 0x0581): 'Nu_Dongle'}
+
+class FakeSysfs:
+    '''/sys/class/tty with USB devices as symlinks to interface directories, like the kernel lays them out'''
+    def __init__(self, root):
+        self.tty = root / 'class' / 'tty'
+        self.usb = root / 'devices' / 'usb1'
+        self.tty.mkdir(parents=True)
+        self.usb.mkdir(parents=True)
+        (self.tty / 'ttyS0').mkdir() # not USB, no device link
+
+    def plug(self, name:str, bus:str, vid:int, pid:int, product:str='Nu_Dongle'):
+        device = self.usb / bus
+        interface = device / f'{bus}:1.0'
+        interface.mkdir(parents=True, exist_ok=True)
+        (device / 'idVendor').write_text(f'{vid:04x}\n')
+        (device / 'idProduct').write_text(f'{pid:04x}\n')
+        (device / 'product').write_text(product + '\n')
+        (self.tty / name).mkdir()
+        os.symlink(interface, self.tty / name / 'device')
+
+    def unplug(self, name:str):
+        os.unlink(self.tty / name / 'device')
+        os.rmdir(self.tty / name)
+
+@pytest.mark.finished
+def test_discovery_cache_and_events(tmp_path):
+    sysfs = FakeSysfs(tmp_path)
+    sysfs.plug('ttyACM0', '1-1', 0x0416, 0xDC02)
+    sysfs.plug('ttyACM1', '1-2', 0x1234, 0x5678, 'other') # not a KKT device
+    discovery = PortDiscovery(IDS, sysfs=str(sysfs.tty), dev='/dev')
+    events = []
+    discovery.add_listener(lambda event, port: events.append((event, port.device)))
+
+    assert discovery.get_ports() == [PortInfo('/dev/ttyACM0', 0x0416, 0xDC02, 'Nu_Dongle', 'Nu_Dongle')]
+    assert events == [('attach', '/dev/ttyACM0')]
+
+    sysfs.plug('ttyACM2', '1-3', 0x152D, 0x0581)
+    sysfs.unplug('ttyACM0')
+    assert discovery.refresh() == ([PortInfo('/dev/ttyACM2', 0x152D, 0x0581, 'Nu_Dongle', 'Nu_Dongle')],
+                                   [PortInfo('/dev/ttyACM0', 0x0416, 0xDC02, 'Nu_Dongle', 'Nu_Dongle')])
+    assert events[1:] == [('attach', '/dev/ttyACM2'), ('detach', '/dev/ttyACM0')]
+    assert [port.device for port in discovery.get_ports()] == ['/dev/ttyACM2']
+
+@pytest.mark.finished
+def test_discovery_watcher(tmp_path):
+    sysfs = FakeSysfs(tmp_path)
+    discovery = PortDiscovery(IDS, sysfs=str(sysfs.tty))
+    events = []
+    discovery.add_listener(lambda event, port: events.append((event, port.device)))
+    discovery.start(interval=0.01)
+    try:
+        sysfs.plug('ttyACM0', '1-1', 0x0416, 0xDC02)
+        deadline = time.monotonic() + 2
+        while not events and time.monotonic() < deadline:
+            time.sleep(0.01)
+        scans = discovery.scans
+        assert [port.device for port in discovery.get_ports()] == ['/dev/ttyACM0']
+        assert discovery.scans - scans <= 1 # watcher keeps the cache, get_ports does not rescan
+    finally:
+        discovery.stop()
+    assert events == [('attach', '/dev/ttyACM0')]
+    assert not discovery.watching
+
+@pytest.mark.finished
+def test_ports_in_natural_order(tmp_path):
+    sysfs = FakeSysfs(tmp_path)
+    for n, name in enumerate(('ttyACM10', 'ttyACM2')):
+        sysfs.plug(name, f'1-{n + 1}', 0x0416, 0xDC02)
+    discovery = PortDiscovery(IDS, sysfs=str(sysfs.tty), dev='/dev')
+    assert [port.device for port in discovery.get_ports()] == ['/dev/ttyACM2', '/dev/ttyACM10']
+    discovery.ports = {device: PortInfo(device, 0x0416, 0xDC02) for device in ('COM10', 'COM3', 'COM1')}
+    assert [port.device for port in discovery.get_ports(refresh=False)] == ['COM1', 'COM3', 'COM10'] # connect opens COM1
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from ksoc_connection import Command, FrameHandler
+import pytest
+
+MULTI_RESULTS = Command.GET_COLLECTION_OF_MULTI_RESULTS.value
+
+def payload_length(packet:bytes)->int:
+    return int.from_bytes(packet[5:7], byteorder='big')
+
+def _wait(condition, timeout:float=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+@pytest.mark.finished
+def test_handler_stats():
+    handler = FrameHandler(MULTI_RESULTS, lambda packet: 1 // packet[0])
+    handler(b'\x01')
+    handler(b'\x00') # ZeroDivisionError counted, not raised
+    stats = handler.stats()
+    assert (stats['calls'], stats['errors'], stats['pending']) == (2, 1, 0)
+    assert stats['time']['count'] == 2
+
+@pytest.mark.finished
+def test_submit_to_shut_down_pool():
+    pool = ThreadPoolExecutor(1)
+    pool.shutdown()
+    handler = FrameHandler(MULTI_RESULTS, payload_length, executor=pool)
+    handler(b'\x01') # RuntimeError counted, not raised
+    stats = handler.stats()
+    assert (stats['calls'], stats['errors'], stats['pending']) == (1, 1, 0)
+
+@pytest.mark.finished
+def test_inline_and_pool_handlers(integration):
+    engine = integration.connection.engine
+    inline, pooled = [], []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = engine.on(MULTI_RESULTS, inline.append)
+        second = engine.on(MULTI_RESULTS, pooled.append, executor=pool)
+        integration.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+        assert _wait(lambda: len(inline) >= 10 and len(pooled) >= 10)
+        assert engine.get_recv_queue(response_only=True).empty() # handled packets are not queued
+
+        engine.off(first)
+        engine.off(second)
+        integration.getMultiResults() # queue path again
+        integration.switchCollectionOfMultiResults(actions=0)
+    assert engine.handlers == {}
+    assert all(packet[3] == MULTI_RESULTS and len(packet) == 8 + payload_length(packet) for packet in inline)
+    assert first.stats()['calls'] == len(inline) and second.stats()['pending'] == 0
+
+@pytest.mark.finished
+def test_process_pool_handler(integration):
+    engine = integration.connection.engine
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        handler = engine.on(MULTI_RESULTS, payload_length, executor=pool)
+        integration.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+        assert _wait(lambda: handler.time.count >= 5, timeout=10)
+        integration.switchCollectionOfMultiResults(actions=0)
+        engine.off(handler)
+    assert handler.stats()['errors'] == 0
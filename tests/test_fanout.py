@@ -0,0 +1,56 @@
+from queue import Empty
+from ksoc_connection import FrameBus, Command
+import pytest
+
+def _frame(command:int, n:int)->bytes:
+    return b'$K<' + bytes([command, 1, 0, 1, n, 0])
+
+@pytest.mark.finished
+def test_fanout_shares_frames():
+    bus = FrameBus(capacity=8)
+    fast, slow = bus.subscribe(), bus.subscribe()
+    frames = [_frame(0xab, n) for n in range(4)]
+    for frame in frames:
+        bus.publish(frame)
+    received = [fast.get(timeout=0) for _ in frames]
+    assert received == frames
+    assert all(a is b for a, b in zip(received, frames)) # same object, no copy
+    assert slow.lag == 4
+    with pytest.raises(Empty):
+        fast.get(timeout=0.01)
+
+@pytest.mark.finished
+def test_slow_subscriber_drops_oldest():
+    bus = FrameBus(capacity=4)
+    slow = bus.subscribe()
+    only_aa = bus.subscribe(commands={0xaa})
+    for n in range(10):
+        bus.publish(_frame(0xab if n % 2 else 0xaa, n))
+    assert slow.get(timeout=0)[7] == 6
+    assert slow.stats() == {'received': 1, 'dropped': 6, 'lag': 3}
+    assert [only_aa.get(timeout=0)[7] for _ in range(2)] == [6, 8]
+
+@pytest.mark.finished
+def test_engine_subscribers(integration):
+    engine = integration.connection.engine
+    with engine.subscribe(commands={Command.GET_COLLECTION_OF_MULTI_RESULTS.value}) as first, engine.subscribe() as second:
+        integration.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+        frames = [first.get(timeout=1) for _ in range(5)]
+        assert [second.get(timeout=1) for _ in range(5)] == frames
+        assert integration.getMultiResults()[0].name == 'KKT_SUCCESS' # queue path still served
+        integration.switchCollectionOfMultiResults(actions=0)
+    assert engine.frame_bus.subscribers == []
+
+@pytest.mark.finished
+def test_exclusive_subscriber_stops_queueing(integration):
+    engine = integration.connection.engine
+    with engine.subscribe(commands={Command.GET_COLLECTION_OF_MULTI_RESULTS.value}, exclusive=True) as recorder:
+        integration.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+        frames = [recorder.get(timeout=1) for _ in range(10)]
+        assert len(frames) == 10 and engine.CDC_response_only.empty() # consumed through the bus only
+        integration.switchCollectionOfMultiResults(actions=0)
+    assert engine.frame_bus.exclusive == 0
+    with engine.subscribe() as viewer: # not exclusive, queue path served again
+        integration.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+        assert viewer.get(timeout=1) and integration.getMultiResults()[0].name == 'KKT_SUCCESS'
+        integration.switchCollectionOfMultiResults(actions=0)
@@ -0,0 +1,90 @@
+import random
+from typing import List
+from ksoc_connection import FaultyPorto, KKTSimulator, KKTClassStatus
+from ksoc_connection.engine import CDCCollection
+from ksoc_connection.packet import calculate_checksum
+import pytest
+
+def _packets(rng:random.Random, count:int)->List[bytes]:
+    '''MULTI_RESULTS frames and short responses of random size, as the device would send them'''
+    device = KKTSimulator()
+    packets = []
+    for _ in range(count):
+        if rng.random() < 0.3:
+            packets.append(device.response(rng.choice((0x01, 0x10, 0x11)), bytes(rng.randrange(256) for _ in range(rng.randint(0, 12)))))
+            continue
+        device.collection = {'actions': 0b1, 'raw_size': rng.randint(1, 600) * 2, 'reg_address': []}
+        packets.append(device.frame())
+    return packets
+
+def _frame(packets:List[bytes], seed:int, **faults)->tuple:
+    '''pass packets through FaultyPorto and CDCCollection with full checksum validation'''
+    device = KKTSimulator(max_wait=0, chunk_size=1 << 20)
+    device.write_out(b''.join(packets))
+    porto = FaultyPorto(device, seed=seed, record=True, **faults)
+    collection = CDCCollection()
+    collection.set_checksum_policy('full')
+    out = []
+    def collect(data:bytes):
+        packet = collection.collect(data)
+        while packet is not None:
+            out.append(bytes(packet))
+            packet = collection.collect(b'')
+    data = porto.recv(4096)
+    while data:
+        collect(data)
+        data = porto.recv(4096)
+    collect(bytes(65536 + 8)) # flush, a corrupted length field can make the framer wait for up to 64 KiB
+    return porto, collection, out
+
+def _is_subsequence(items:List[bytes], sequence:List[bytes])->bool:
+    iterator = iter(sequence)
+    return all(any(item == other for other in iterator) for item in items)
+
+@pytest.mark.finished
+@pytest.mark.parametrize('fragment', [1, 2, 3, 5, 7, 8, (1, 64), (1, 4096)])
+def test_fragmented_reads(fragment):
+    packets = _packets(random.Random(0), 40)
+    porto, collection, out = _frame(packets, 0, fragment=fragment)
+    assert out == packets
+    assert collection.metrics.discarded_bytes == 65536 + 8 # only the flush
+
+@pytest.mark.finished
+def test_framer_properties():
+    '''random fault mixes from fixed seeds: framer never returns a bad packet and never loses an intact one'''
+    for seed in range(30):
+        rng = random.Random(seed)
+        packets = _packets(rng, 60)
+        faults = {
+            'fragment': (1, rng.choice((8, 64, 1024))),
+            'drop': rng.choice((0.0, 0.1)),
+            'duplicate': rng.choice((0.0, 0.1)),
+            'garbage': rng.choice((0.0, 0.2)),
+            'corrupt': rng.choice((0.0, 0.1, 0.3)),
+        }
+        porto, collection, out = _frame(packets, seed, **faults)
+        assert all(packet[:3] == b'$K<' and calculate_checksum(packet) == packet[-1] for packet in out), (seed, faults)
+        if not faults['corrupt']:
+            assert out == porto.delivered, (seed, faults)
+        else:
+            assert _is_subsequence(porto.delivered, out), (seed, faults)
+        if faults['garbage'] or faults['corrupt']:
+            assert collection.metrics.resync_events > 0
+
+@pytest.mark.finished
+def test_reproducible():
+    packets = _packets(random.Random(1), 30)
+    first = _frame(packets, 7, fragment=(1, 100), corrupt=0.2, drop=0.1)[0]
+    second = _frame(packets, 7, fragment=(1, 100), corrupt=0.2, drop=0.1)[0]
+    assert first.faults == second.faults and first.delivered == second.delivered
+
+@pytest.mark.finished
+def test_engine_over_fragmented_link(integration):
+    engine = integration.connection.engine
+    engine.porto = FaultyPorto(engine.porto, seed=3, fragment=(1, 16), latency=(0, 0.0005))
+    integration.writeHWRegister(0x50000504, 0x1234)
+    assert integration.readHWRegister(0x50000504) == (KKTClassStatus.KKT_SUCCESS, 0x1234)
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=256)
+    for _ in range(5):
+        assert integration.getMultiResults()[0] == KKTClassStatus.KKT_SUCCESS
+    integration.switchCollectionOfMultiResults(actions=0)
@@ -0,0 +1,95 @@
+import socket
+import time
+from ksoc_connection import KKTIntegration, KKTClassStatus, KKTGateway, KKTWIFIConnection, Packet, Command
+from ksoc_connection.gateway import split_requests
+import pytest
+
+def _request(command:int, payload:bytes=b'')->bytes:
+    request = Packet('>', command, len(payload), payload)
+    request.update_checksum()
+    return bytes(request.CDC_packet)
+
+@pytest.mark.finished
+def test_split_requests():
+    first, second = _request(0x50), _request(0x20, b'\x01\x02')
+    packets, rest = split_requests(b'xx' + first + second[:5])
+    assert packets == [first] and rest == second[:5]
+    packets, rest = split_requests(rest + second[5:] + b'$K')
+    assert packets == [second] and rest == b'$K'
+
+@pytest.fixture
+def gateway(integration):
+    gateway = KKTGateway(integration.connection, port=0)
+    gateway.start()
+    yield gateway
+    gateway.stop()
+
+def _client(gateway:KKTGateway)->KKTIntegration:
+    client = KKTIntegration(KKTWIFIConnection())
+    assert client.connectDevice(*gateway.address) == KKTClassStatus.KKT_SUCCESS
+    return client
+
+@pytest.mark.finished
+def test_gateway_shares_device(integration, gateway):
+    device = integration.connection.device
+    device.registers[0x50000600] = 0x1234
+    first, second = _client(gateway), _client(gateway)
+    try:
+        assert first.readHWRegister(0x50000600) == (KKTClassStatus.KKT_SUCCESS, 0x1234)
+        assert second.getChipID()[1] == device.chip_id
+
+        first.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+        status, frame = first.getMultiResults()
+        assert status == KKTClassStatus.KKT_SUCCESS and len(frame[0]) == 64
+        assert second.connection.engine.CDC_response_only.empty() # second never switched, gets no frames
+        second.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+        assert second.getMultiResults()[0] == KKTClassStatus.KKT_SUCCESS
+        assert second.readHWRegister(0x50000600)[1] == 0x1234 # control served while streaming
+        stats = gateway.stats()
+        assert len(stats['clients']) == 2 and all(client['frames_sent'] > 0 for client in stats['clients'])
+        second.switchCollectionOfMultiResults(actions=0)
+    finally:
+        first.disconnectDevice()
+        second.disconnectDevice()
+    deadline = time.monotonic() + 2
+    while gateway.clients and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert gateway.clients == []
+
+@pytest.mark.finished
+def test_slow_client_does_not_stall(integration, gateway):
+    # raw client switches collection on and never reads
+    slow = socket.create_connection(gateway.address)
+    slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    payload = bytearray(7)
+    payload[1:5] = (0b1).to_bytes(4, byteorder='big')
+    payload[5:7] = (4096).to_bytes(2, byteorder='big')
+    slow.sendall(_request(Command.SWITCH_COLLECTION_OF_MULTI_RESULTS.value, bytes(payload)))
+    client = _client(gateway)
+    try:
+        time.sleep(0.5)
+        start = time.monotonic()
+        for _ in range(20):
+            assert client.readHWRegister(0x50000600)[0] == KKTClassStatus.KKT_SUCCESS
+        assert time.monotonic() - start < 1
+    finally:
+        client.disconnectDevice()
+        slow.close()
+
+@pytest.mark.finished
+def test_switch_off_by_last_streaming_client(integration, gateway):
+    device = integration.connection.device
+    first, second = _client(gateway), _client(gateway)
+    try:
+        first.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+        second.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+        assert first.switchCollectionOfMultiResults(actions=0) == KKTClassStatus.KKT_SUCCESS # answered by gateway
+        assert device.collection['actions'] == 0b1
+        assert second.getMultiResults()[0] == KKTClassStatus.KKT_SUCCESS
+    finally:
+        first.disconnectDevice()
+        second.disconnectDevice() # last streaming client gone, device switched off
+    deadline = time.monotonic() + 2
+    while device.collection['actions'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert device.collection['actions'] == 0 and gateway.streaming == set()
@@ -0,0 +1,35 @@
+import time
+from ksoc_connection import IdleStrategy, KKTClassStatus
+import pytest
+
+@pytest.mark.finished
+def test_idle_strategy_timeouts():
+    assert IdleStrategy('busy').timeout() == 0
+    assert IdleStrategy('blocking', block_timeout=0.2).timeout() == 0.2
+    hybrid = IdleStrategy('hybrid', spin=0.05, block_timeout=0.2)
+    assert hybrid.timeout() == 0.2
+    hybrid.on_traffic()
+    assert hybrid.timeout() == 0 # polls right after traffic
+    time.sleep(0.06)
+    assert hybrid.timeout() == 0.2
+    with pytest.raises(AssertionError):
+        IdleStrategy('sleepy')
+
+@pytest.mark.finished
+@pytest.mark.parametrize('mode', ['busy', 'blocking', 'hybrid'])
+def test_engine_idle_modes(integration, mode):
+    engine = integration.connection.engine
+    engine.set_idle_strategy(mode)
+    integration.writeHWRegister(0x50000504, 0x55)
+    assert integration.readHWRegister(0x50000504) == (KKTClassStatus.KKT_SUCCESS, 0x55)
+    time.sleep(0.05) # hybrid spin is over
+    engine.metrics.snapshot()
+    reads = engine.metrics.reads
+    time.sleep(0.3)
+    loop = engine.metrics.snapshot()['loop']
+    if mode == 'busy':
+        assert loop['empty_reads'] and loop['reads'] - reads > 300 # polls all the time
+    else:
+        assert loop['reads'] - reads < 30 # one wait per block_timeout or porto max_wait
+        assert loop['cpu_utilization'] < 0.2
+    assert 'ksoc_loop_cpu_seconds_total' in engine.metrics.to_prometheus()
@@ -0,0 +1,31 @@
+import subprocess
+import sys
+import pytest
+
+IMPORT_BUDGET_US = 300_000 # cumulative import time of ksoc_connection modules in microseconds
+
+def _run(code:str)->subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+
+@pytest.mark.finished
+def test_import_is_lazy():
+    result = _run('import sys, ksoc_connection;'
+                  'from ksoc_connection import KKTIntegration, KKTVComPortConnection, KKTWIFIConnection;'
+                  'print(",".join(m for m in ("numpy", "serial", "win32file", "http.server") if m in sys.modules))')
+    assert result.stdout.strip() == ''
+
+@pytest.mark.finished
+def test_star_import():
+    result = _run('from ksoc_connection import *; print(KKTIntegration.__name__, KKTVComPortConnection.__name__)')
+    assert result.stdout.split() == ['KKTIntegration', 'KKTVComPortConnection']
+
+@pytest.mark.finished
+def test_import_time_budget():
+    result = _run('import ksoc_connection; from ksoc_connection import KKTIntegration')
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package (indented by nesting level)
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].startswith(' ksoc_connection'):
+            cumulative += int(fields[1])
+    assert 0 < cumulative < IMPORT_BUDGET_US, result.stderr
@@ -0,0 +1,46 @@
+import logging
+from ksoc_connection.logger import log, CustomFormatter, enable_async_logging, disable_async_logging
+import pytest
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+@pytest.mark.finished
+def test_no_forced_level():
+    assert log.level == logging.NOTSET
+
+@pytest.mark.finished
+def test_formatter_cached(monkeypatch):
+    formatter = CustomFormatter()
+    cached = formatter.formatters[logging.INFO]
+    built = []
+    init = logging.Formatter.__init__
+    monkeypatch.setattr(logging.Formatter, '__init__', lambda self, *args, **kwargs: built.append(self) or init(self, *args, **kwargs))
+    for word in ('world', 'again'):
+        record = logging.LogRecord('Lib', logging.INFO, __file__, 0, 'hello %s', (word,), None)
+        assert f'hello {word}' in formatter.format(record)
+    assert built == [] # no formatter built per record
+    assert formatter.formatters[logging.INFO] is cached
+
+@pytest.mark.finished
+def test_async_logging():
+    handler = ListHandler()
+    log.addHandler(handler)
+    level = log.level
+    log.setLevel(logging.INFO)
+    try:
+        listener = enable_async_logging()
+        assert enable_async_logging() is listener
+        assert handler not in log.handlers
+        log.info('from %s', 'queue')
+        disable_async_logging()
+        assert handler in log.handlers
+        assert [r.getMessage() for r in handler.records] == ['from queue']
+    finally:
+        log.removeHandler(handler)
+        log.setLevel(level)
@@ -0,0 +1,117 @@
+import random
+from ksoc_connection import KKTClassStatus
+from ksoc_connection.engine import CDCCollection
+from ksoc_connection.metrics import EngineMetrics, Histogram, StreamStats
+from ksoc_connection.packet import Packet, StampedPacket
+import pytest
+
+def _packet(command:int, payload:bytes)->bytes:
+    return Packet(direction='<', command=command, payload_length=len(payload), payload=payload).CDC_packet
+
+@pytest.mark.finished
+def test_histogram():
+    histogram = Histogram(buckets=(0.001, 0.01, 0.1))
+    for value in (0.0005, 0.005, 0.005, 0.05, 1.0):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.count == 5
+    assert histogram.quantile(0.5) == 0.01
+    assert histogram.quantile(1.0) == 1.0
+
+@pytest.mark.finished
+def test_collection_counts_discarded_bytes():
+    metrics = EngineMetrics()
+    collection = CDCCollection(metrics)
+    assert collection.collect(b'garbage') is None
+    assert metrics.discarded_bytes == 7
+    assert metrics.resync_events == 1
+
+    packet = _packet(0x12, b'\x00' * 4)
+    assert collection.collect(b'xyz' + packet) == packet
+    assert metrics.discarded_bytes == 10
+    assert metrics.resync_events == 2
+
+@pytest.mark.finished
+def test_checksum_policy():
+    good = bytearray(_packet(0x12, bytes(range(4))))
+    good[-1] = (-sum(good[3:-1])) & 0xFF
+    good = bytes(good)
+    bad = good[:7] + b'\xff' + good[8:]
+    collection = CDCCollection()
+    assert collection.collect(bad) == bad # off, delivered as is
+
+    collection.set_checksum_policy('full')
+    assert collection.collect(bad) is None
+    assert collection.collect(bad + b'$K' + good) == good # resync after corrupt packet
+    assert collection.collect(b'') is None
+    assert (collection.metrics.checksum_errors, collection.metrics.checksum_checked) == (2, 3)
+
+    collection.set_checksum_policy('sampled', sample_every=4)
+    delivered = [collection.collect(bad) for _ in range(8)]
+    assert delivered.count(None) == 2 and collection.metrics.checksum_errors == 4
+    with pytest.raises(AssertionError):
+        collection.set_checksum_policy('strict')
+
+@pytest.mark.finished
+def test_latency_and_snapshot():
+    metrics = EngineMetrics()
+    metrics.on_send(12, cmd=0x12)
+    metrics.on_recv(20)
+    metrics.on_frame(0x12)
+    metrics.on_frame(0xab)
+    metrics.on_queue('response_only', 3)
+    metrics.on_queue('response_only', 1)
+
+    snapshot = metrics.snapshot()
+    assert snapshot['frames_received'] == 2
+    assert snapshot['bytes_received'] == 20
+    assert snapshot['latency'][0x12]['count'] == 1
+    assert 0xab not in snapshot['latency']
+    assert snapshot['queues']['response_only'] == {'depth': 1, 'high_watermark': 3}
+
+    text = metrics.to_prometheus()
+    assert 'ksoc_frames_received_total 2' in text
+    assert 'ksoc_response_latency_seconds_count{cmd="0x12"} 1' in text
+    assert 'ksoc_queue_high_watermark{queue="response_only"} 3' in text
+
+@pytest.mark.finished
+def test_stream_gaps_and_jitter():
+    stream = StreamStats(gap_factor=1.5)
+    rng = random.Random(0)
+    timestamp = 0
+    for n in range(100):
+        timestamp += 10_000_000 # 10 ms
+        if n in (40, 41, 42, 70): # lost frames
+            continue
+        stream.observe(timestamp + rng.randint(-300_000, 300_000))
+    snapshot = stream.snapshot()
+    assert snapshot['frames'] == 96
+    assert snapshot['gaps'] == 2 and snapshot['missing'] == 4
+    assert abs(snapshot['period'] - 0.01) < 0.0003
+    assert 0 < snapshot['jitter'] < 0.0006
+
+@pytest.mark.finished
+def test_frames_are_stamped(integration):
+    collection = CDCCollection()
+    packet = _packet(0x12, b'\x00' * 4)
+    stamped = collection.collect(packet)
+    assert isinstance(stamped, StampedPacket) and stamped == packet and stamped.timestamp > 0
+
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+    timestamps = [integration.getMultiResults(with_timestamp=True)[2] for _ in range(20)]
+    integration.switchCollectionOfMultiResults(actions=0)
+    assert timestamps == sorted(timestamps)
+    stream = integration.connection.engine.metrics.snapshot()['streams'][0xab]
+    assert stream['frames'] >= 20 and 0.002 < stream['period'] < 0.02 # simulator frame period 5 ms
+    assert 'ksoc_stream_period_seconds{cmd="0xab"}' in integration.connection.engine.metrics.to_prometheus()
+
+@pytest.mark.finished
+def test_engine_checksum_full(integration):
+    engine = integration.connection.engine
+    engine.set_checksum_policy('full')
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=(64 * 16 + 2) * 2)
+    for _ in range(10):
+        assert integration.getMultiResults()[0] == KKTClassStatus.KKT_SUCCESS
+    integration.switchCollectionOfMultiResults(actions=0)
+    snapshot = engine.metrics.snapshot()
+    assert snapshot['checksum_checked'] >= 11 and snapshot['checksum_errors'] == 0
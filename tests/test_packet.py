@@ -1,4 +1,4 @@
-from ksoc_connection.packet import Packet, get_CDC_packet, calculate_checksum
+from ksoc_connection.packet import Packet, get_CDC_packet, calculate_checksum, packet_checksum
 import pytest
 
 @pytest.mark.unfinished
@@ -30,3 +30,10 @@ def test_get_CDC_packet():
     assert packet.command == 0x10
     assert packet.CDC_packet == b'$K>\x10\x01\x00\x03\xa4\xa5\xa6\x08'
     assert get_CDC_packet(packet.CDC_packet) == packet
+
+@pytest.mark.finished
+def test_packet_checksum():
+    for size in (0, 3, 255, 256, 16388):
+        packet = b'$K<\xab\x01' + size.to_bytes(2, byteorder='big') + bytes(n * 7 & 0xFF for n in range(size)) + b'\x00'
+        assert packet_checksum(packet) == calculate_checksum(packet)
+        assert packet_checksum(memoryview(packet)) == calculate_checksum(packet)
@@ -0,0 +1,32 @@
+import json
+from ksoc_connection import KKTClassStatus, Command
+from ksoc_connection.probe import main, probe, percentiles, format_table
+import pytest
+
+@pytest.mark.finished
+def test_percentiles():
+    summary = percentiles([0.001 * n for n in range(1, 101)])
+    assert summary['count'] == 100
+    assert summary['p50'] == pytest.approx(0.051) and summary['max'] == pytest.approx(0.1)
+    assert percentiles([]) == {'count': 0}
+
+@pytest.mark.finished
+def test_probe_simulator(tmp_path, capsys):
+    path = tmp_path / 'probe.json'
+    assert main(['--count', '10', '--payload-pairs', '1,64', '--stream-seconds', '0.3', '--raw-size', '1024',
+                 '--json', str(path)]) == 0
+    assert 'GET_CHIP_ID' in capsys.readouterr().out
+    result = json.loads(path.read_text())
+    assert set(result['commands']) == {'GET_CHIP_ID', 'REG_READ', 'REG_WRITE', 'CUSTOM_8B', 'CUSTOM_512B'}
+    assert all(summary['errors'] == 0 and summary['count'] == 10 for summary in result['commands'].values())
+    assert result['stream']['frames'] > 0 and result['stream']['MB_per_second'] > 0
+
+@pytest.mark.finished
+def test_probe_skips_writes_when_read_fails(integration, monkeypatch):
+    device = integration.connection.device
+    monkeypatch.setattr(integration, 'readHWRegister', lambda addr: (KKTClassStatus.KKT_ERROR_REQUEST_FAILED, 0))
+    result = probe(integration, count=5, payload_pairs=(1, 16), stream_seconds=0)
+    assert Command.REG_WRITE.value not in device.command_counts # nothing written to the device
+    assert result['commands']['REG_WRITE'] == {'count': 0, 'errors': 5}
+    assert result['commands']['CUSTOM_128B']['errors'] == 5
+    assert 'REG_WRITE' in format_table(result)
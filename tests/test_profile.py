@@ -0,0 +1,53 @@
+import json
+from ksoc_connection import KKTClassStatus, RegisterProfile, Command
+import pytest
+
+@pytest.mark.finished
+def test_load_profile(tmp_path):
+    text = tmp_path / 'radar.txt'
+    text.write_text('# address value [mask]\n0x50000504 0x1234\n0x50000508 0x30 0xF0 # nibble\n')
+    profile = RegisterProfile.load(str(text))
+    assert profile.registers == {0x50000504: (0x1234, 0xFFFFFFFF), 0x50000508: (0x30, 0xF0)}
+    assert profile.apply_to(0x50000508, 0xFFFF) == 0xFF3F
+
+    data = tmp_path / 'radar.json'
+    data.write_text(json.dumps({'0x50000504': '0x1234', '0x50000508': {'value': '0x30', 'mask': '0xF0'}}))
+    assert RegisterProfile.load(str(data)).registers == profile.registers
+
+@pytest.mark.finished
+def test_apply_minimal_delta(integration):
+    device = integration.connection.device
+    device.registers.update({0x50000500: 1, 0x50000504: 2, 0x50000510: 0xAB})
+    profile = RegisterProfile({0x50000500: 1, 0x50000504: 3, 0x50000510: (0x0C, 0x0F), 0x50000600: 0})
+
+    device.command_counts.clear()
+    status, result = integration.applyRegisterProfile(profile)
+    assert status == KKTClassStatus.KKT_SUCCESS
+    assert result.written == {0x50000504: 3, 0x50000510: 0xAC}
+    assert result.round_trips == 3 # two bulk reads, one packed write
+    assert device.command_counts == {Command.REG_READ.value: 2, Command.REG_WRITE.value: 1}
+    assert device.registers[0x50000504] == 3 and device.registers[0x50000510] == 0xAC
+
+    status, result = integration.applyRegisterProfile(profile)
+    assert result.written == {}
+
+@pytest.mark.finished
+def test_apply_with_cache_and_verify(integration):
+    device = integration.connection.device
+    device.write_masks[0x50000508] = 0x0F # upper bits are read only
+    integration.enableRegisterCache()
+    integration.writeHWRegisters({0x50000504: 5, 0x50000508: 0})
+
+    device.command_counts.clear()
+    status, result = integration.applyRegisterProfile({0x50000504: 6, 0x50000508: 0xFF}, verify=True)
+    assert status == KKTClassStatus.KKT_ERROR_COMPARE_ERROR
+    assert result.mismatched == [0x50000508]
+    assert device.command_counts == {Command.REG_WRITE_COMPARE.value: 1} # current values come from cache
+    assert integration.register_cache.values == {0x50000504: 6}
+
+@pytest.mark.finished
+def test_bulk_read_split(integration):
+    integration.max_registers_per_packet = 4
+    integration.connection.device.registers.update({0x100 + 4 * i: i for i in range(10)})
+    assert integration.readHWRegisters(0x100, 10) == (KKTClassStatus.KKT_SUCCESS, list(range(10)))
+    assert integration.connection.device.command_counts[Command.REG_READ.value] == 3
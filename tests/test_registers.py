@@ -0,0 +1,72 @@
+from ksoc_connection import KKTClassStatus, RegisterCache, Command
+import pytest
+
+@pytest.mark.finished
+def test_volatile_ranges():
+    cache = RegisterCache(volatile=[(0x100, 0x110)])
+    cache.mark_volatile(0x10c, 0x120)
+    cache.mark_volatile(0x200)
+    assert cache.stats()['volatile'] == [(0x100, 0x120), (0x200, 0x204)]
+    assert cache.is_volatile(0x100) and cache.is_volatile(0x11c) and cache.is_volatile(0x200)
+    assert not cache.is_volatile(0x120) and not cache.is_volatile(0xfc)
+
+    cache.update(0x104, 1)
+    cache.update(0x300, 2)
+    assert cache.get(0x104) is None
+    assert cache.get(0x300) == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+@pytest.mark.finished
+def test_invalidate():
+    cache = RegisterCache()
+    for addr in range(0, 0x20, 4):
+        cache.update(addr, addr)
+    cache.invalidate(0x8, 0x10)
+    assert sorted(cache.values) == [0x0, 0x4, 0x10, 0x14, 0x18, 0x1c]
+    cache.invalidate(0x0)
+    assert 0x0 not in cache.values
+    cache.invalidate()
+    assert cache.values == {}
+
+@pytest.mark.finished
+def test_integration_cache(integration):
+    device = integration.connection.device
+    cache = integration.enableRegisterCache(volatile=[(0x50000600, 0x50000610)])
+    reads = lambda: device.command_counts.get(Command.REG_READ.value, 0)
+
+    assert integration.writeHWRegister(0x50000504, 0x1234) == KKTClassStatus.KKT_SUCCESS
+    assert integration.readHWRegister(0x50000504) == (KKTClassStatus.KKT_SUCCESS, 0x1234)
+    assert reads() == 0 # served by write-through value
+
+    device.registers[0x50000600] = 7
+    assert integration.readHWRegister(0x50000600)[1] == 7
+    device.registers[0x50000600] = 8
+    assert integration.readHWRegister(0x50000600)[1] == 8
+    assert reads() == 2 # volatile always hits device
+
+    assert integration.readHWRegister(0x50000508)[1] == 0
+    assert integration.readHWRegister(0x50000508)[1] == 0
+    assert reads() == 3
+    assert cache.stats()['hits'] == 2
+
+    integration.setPowerSavingMode(0)
+    assert cache.values == {}
+
+@pytest.mark.finished
+def test_rfic_bulk(integration):
+    device = integration.connection.device
+    device.rfic_write_masks[0x21] = 0x00FF
+    integration.max_registers_per_packet = 2
+
+    status, mismatched = integration.writeRFICRegisters({0x20: 0x1234, 0x21: 0xABCD, 0x22: 0x0001})
+    assert status == KKTClassStatus.KKT_ERROR_COMPARE_ERROR
+    assert mismatched == [0x21]
+    assert device.command_counts[Command.RFIC_REG_WRITE_COMPARE.value] == 2
+    assert Command.RFIC_REG_READ.value not in device.command_counts # verified on device
+
+    status, values = integration.readRFICRegisters([0x22, 0x20, 0x21])
+    assert status == KKTClassStatus.KKT_SUCCESS
+    assert values == {0x20: 0x1234, 0x21: 0x00CD, 0x22: 0x0001}
+
+    assert integration.writeRFICRegister(0x30, 0x55, verify=False) == KKTClassStatus.KKT_SUCCESS
+    assert integration.readRFICRegister(0x30) == (KKTClassStatus.KKT_SUCCESS, 0x55)
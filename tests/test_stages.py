@@ -0,0 +1,66 @@
+import numpy as np
+from ksoc_connection.packet import calculate_checksum
+from ksoc_connection.simulator import KKTSimulator
+from ksoc_connection.stages import StageFrame, ReceivePipeline, Decimate, ChirpAverage, SelectChannel, Threshold
+import pytest
+
+CHIRPS, SAMPLES = 4, 8
+
+def _packet(raw:np.ndarray)->bytes:
+    device = KKTSimulator()
+    data = raw.astype(np.uint16).tobytes()
+    payload = b'\x00' + (0b1).to_bytes(4, byteorder='big') + bytes([0, 0]) + len(data).to_bytes(2, byteorder='big') + data
+    return device.response(0xab, payload)
+
+def _raw()->np.ndarray:
+    samples = np.arange(CHIRPS * SAMPLES).reshape(CHIRPS, SAMPLES) * 2
+    return np.concatenate(([7, 9], samples.ravel()))
+
+@pytest.mark.finished
+def test_unmodified_frame_is_not_copied():
+    packet = _packet(_raw())
+    assert ReceivePipeline([Decimate(1)])(packet) is packet
+
+@pytest.mark.finished
+def test_decimate():
+    pipeline = ReceivePipeline([Decimate(3)])
+    kept = [pipeline(_packet(_raw())) is not None for _ in range(7)]
+    assert kept == [True, False, False, True, False, False, True]
+
+@pytest.mark.finished
+def test_chirp_average_and_select():
+    pipeline = ReceivePipeline([ChirpAverage(CHIRPS, SAMPLES), SelectChannel(1, channels=2)])
+    packet = pipeline(_packet(_raw()))
+    assert packet[-1] == calculate_checksum(packet)
+    raw = StageFrame(packet).raw()
+    expected = (np.arange(CHIRPS * SAMPLES).reshape(CHIRPS, SAMPLES) * 2).mean(axis=0)[1::2]
+    assert raw[:2].tolist() == [7, 9]
+    assert raw[2:].tolist() == expected.tolist()
+    assert pipeline.stats()['bytes_out'] < pipeline.stats()['bytes_in']
+
+@pytest.mark.finished
+def test_threshold():
+    flat = np.concatenate(([0, 0], np.full(CHIRPS * SAMPLES, 100)))
+    pipeline = ReceivePipeline([Threshold(10)])
+    assert pipeline(_packet(flat)) is None
+    assert pipeline(_packet(_raw())) is not None
+
+@pytest.mark.finished
+def test_failing_stage_drops_frame():
+    pipeline = ReceivePipeline([ChirpAverage(CHIRPS + 1, SAMPLES)]) # more chirps than the frame has
+    assert pipeline(_packet(_raw())) is None
+    pipeline.stages = [ChirpAverage(CHIRPS, SAMPLES)]
+    assert pipeline(_packet(_raw())) is not None
+    assert pipeline.stats()['errors'] == 1
+
+@pytest.mark.finished
+def test_engine_stage(integration):
+    engine = integration.connection.engine
+    engine.add_stage(Decimate(2))
+    engine.add_stage(ChirpAverage(4, 8))
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=(4 * 8 + 2) * 2)
+    for _ in range(3):
+        status, data = integration.getMultiResults()
+        assert len(data[0]) == (8 + 2) * 2
+    integration.switchCollectionOfMultiResults(actions=0)
+    assert engine.pipeline.stats()['frames_in'] >= 5
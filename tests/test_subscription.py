@@ -0,0 +1,41 @@
+from ksoc_connection import KKTClassStatus, Command, RegisterSubscription
+import pytest
+
+@pytest.mark.finished
+def test_series_ring():
+    subscription = RegisterSubscription(capacity=3)
+    subscription.add([0x10, 0x14])
+    for value in range(5):
+        assert subscription.decode(bytes([0, 0, 0, value, 0, 0, 1, value]), [0x10, 0x14])
+    assert not subscription.decode(b'\x00' * 4, [0x10, 0x14]) # layout differs
+    series = subscription.series[0x14]
+    assert series.values.tolist() == [0x102, 0x103, 0x104]
+    assert series.frames.tolist() == [2, 3, 4]
+    assert series.latest == 0x104
+
+@pytest.mark.finished
+def test_subscribe_during_collection(integration):
+    device = integration.connection.device
+    device.registers[0x50000600] = 1
+    integration.switchCollectionOfMultiResults(actions=0b1, raw_size=64)
+    assert device.collection['reg_address'] == []
+
+    integration.subscribeRegisters([0x50000600])
+    assert device.collection['reg_address'] == [0x50000600] # reconfigured in place
+    assert device.collection['raw_size'] == 64
+
+    for _ in range(5):
+        integration.getMultiResults()
+    series = integration.getRegisterSeries(0x50000600)
+    assert series.latest == 1
+    device.registers[0x50000600] = 2
+    for _ in range(50): # frames already queued still carry the old value
+        integration.getMultiResults()
+        if series.latest == 2:
+            break
+    assert series.latest == 2
+    assert Command.REG_READ.value not in device.command_counts
+
+    integration.unsubscribeRegisters()
+    assert device.collection['reg_address'] == []
+    assert integration.switchCollectionOfMultiResults(actions=0) == KKTClassStatus.KKT_SUCCESS
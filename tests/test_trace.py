@@ -0,0 +1,48 @@
+import json
+import time
+from ksoc_connection.trace import TraceRing, TraceEvent
+import pytest
+
+@pytest.mark.finished
+def test_ring_overwrites_oldest():
+    ring = TraceRing(capacity=4)
+    for n in range(6):
+        ring.record(TraceEvent.ENQUEUE, 0xab, n)
+    assert len(ring) == 4
+    assert [length for _, _, _, length in ring.records()] == [2, 3, 4, 5]
+
+@pytest.mark.finished
+def test_capacity_power_of_two():
+    with pytest.raises(AssertionError):
+        TraceRing(capacity=3)
+
+@pytest.mark.finished
+def test_chrome_trace(tmp_path):
+    ring = TraceRing(capacity=16)
+    ring.record(TraceEvent.TX_WRITE, 0x12, 16)
+    ring.record(TraceEvent.RX_FIRST_BYTE, 0x12, 12)
+    ring.record(TraceEvent.FRAME_COMPLETE, 0x12, 12)
+    ring.record(TraceEvent.ENQUEUE, 0x12, 12)
+    ring.record(TraceEvent.DEQUEUE, 0x12, 12)
+
+    path = tmp_path / 'trace.json'
+    ring.dump(str(path))
+    trace = json.loads(path.read_text())
+    spans = {event['name'] for event in trace['traceEvents'] if event['ph'] == 'X'}
+    assert spans == {'round trip', 'receive', 'queued'}
+    instants = [event for event in trace['traceEvents'] if event['ph'] == 'i']
+    assert len(instants) == 5
+    assert all(event['ts'] >= 0 for event in instants)
+
+@pytest.mark.finished
+def test_trace_short_write(integration):
+    engine = integration.connection.engine
+    ring = engine.enable_trace(capacity=16)
+    try:
+        engine.send(b'\x00') # raw bytes shorter than a packet header
+        deadline = time.monotonic() + 1
+        while not len(ring) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [(command, length) for _, _, command, length in ring.records()] == [(0, 1)]
+    finally:
+        engine.disable_trace()
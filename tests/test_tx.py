@@ -0,0 +1,76 @@
+from threading import Event, Thread
+from ksoc_connection import TxScheduler, TxPriority
+import pytest
+
+def _packet(command:int, size:int=8)->bytes:
+    return b'$K>' + bytes([command]) + bytes(size - 4)
+
+class BlockingWriter:
+    '''porto.send stand-in, first write blocks until released so later packets queue up'''
+    def __init__(self):
+        self.writes = []
+        self.release = Event()
+        self.entered = Event()
+
+    def __call__(self, data:bytes):
+        self.entered.set()
+        self.release.wait(2)
+        self.writes.append(data)
+
+@pytest.mark.finished
+def test_control_before_bulk_and_coalesced():
+    writer = BlockingWriter()
+    scheduler = TxScheduler(writer, coalesce_bytes=32)
+    scheduler.start()
+    scheduler.submit(_packet(0x01), 0x01, TxPriority.BULK)
+    assert writer.entered.wait(1)
+    for n in range(4):
+        scheduler.submit(_packet(0x10 + n), 0x10 + n, TxPriority.BULK)
+    scheduler.submit(_packet(0x20, 64), 0x20, TxPriority.BULK) # larger than coalesce_bytes, written alone
+    for n in range(3):
+        scheduler.submit(_packet(0x30 + n), 0x30 + n, TxPriority.CONTROL)
+    assert scheduler.pending() == {'control': 3, 'bulk': 5}
+    writer.release.set()
+    scheduler.stop()
+
+    commands = [[write[i] for i in range(3, len(write), 8) if write[i - 3:i] == b'$K>'] for write in writer.writes]
+    assert commands == [[0x01], [0x30, 0x31, 0x32, 0x10], [0x11, 0x12, 0x13], [0x20]]
+    assert (scheduler.writes, scheduler.packets) == (4, 9)
+
+@pytest.mark.finished
+def test_concurrent_writers_do_not_interleave():
+    writes = []
+    scheduler = TxScheduler(writes.append, coalesce_bytes=0) # one packet per write
+    scheduler.start()
+    packets = [[_packet(thread, 256) for _ in range(50)] for thread in range(4)]
+    threads = [Thread(target=lambda items: [scheduler.submit(item) for item in items], args=(items,)) for items in packets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.stop()
+    assert sorted(writes) == sorted(item for items in packets for item in items)
+
+@pytest.mark.finished
+def test_engine_tx_metrics(integration):
+    integration.writeHWRegisters({0x50000600 + 4 * n: n for n in range(8)})
+    integration.readHWRegister(0x50000600)
+    metrics = integration.connection.engine.metrics.snapshot()
+    assert metrics['tx']['writes'] >= 3
+    assert metrics['tx']['delay']['bulk']['count'] >= 1 and metrics['tx']['delay']['control']['count'] >= 2
+    assert 'ksoc_tx_queue_delay_seconds_count{priority="bulk"}' in integration.connection.engine.metrics.to_prometheus()
+
+@pytest.mark.finished
+def test_write_error_reaches_caller():
+    def broken(data:bytes):
+        raise OSError('device gone')
+    scheduler = TxScheduler(broken)
+    with pytest.raises(OSError): # synchronous write before start
+        scheduler.submit(_packet(0x01))
+    scheduler.start()
+    scheduler.submit(_packet(0x02)) # queued, fails on writer thread
+    scheduler.stop()
+    assert scheduler.errors == 2
+    with pytest.raises(OSError, match='device gone'):
+        scheduler.check()
+    scheduler.check() # reported once